@@ -0,0 +1,5 @@
+from sgde_api.exceptions import PermissionDenied
+
+
+class AdminRequired(PermissionDenied):
+    DETAIL = "Admin privileges required"
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, Query
+
+from sgde_api.admin.utils import parse_jwt_admin_data, get_slow_traces
+from sgde_api.auth.utils import JWTData
+
+router = APIRouter()
+
+
+@router.get("/admin/traces", response_model=list[dict])
+async def admin_get_traces(
+    limit: int = Query(100, ge=1),
+    _: JWTData = Depends(parse_jwt_admin_data),
+):
+    """
+    Returns the span trees of the last slow requests, from the most recent.
+    """
+    return get_slow_traces(limit)
@@ -0,0 +1,29 @@
+from fastapi import Depends
+
+from sgde_api.admin.exceptions import AdminRequired
+from sgde_api.auth.utils import parse_jwt_user_data_required, JWTData
+from sgde_api.config import settings
+from sgde_api.tracing import slow_traces
+
+
+async def parse_jwt_admin_data(
+    token: JWTData = Depends(parse_jwt_user_data_required),
+) -> JWTData:
+    """
+    Parse a JWT token and return the user data. Raises AdminRequired if the user
+    is not listed in ADMIN_USERS.
+    :param token: JWT token
+    :return: JWTData object
+    """
+    if token.username not in settings.ADMIN_USERS:
+        raise AdminRequired()
+    return token
+
+
+def get_slow_traces(limit: int) -> list[dict]:
+    """
+    Get the traces of the last slow requests, from the most recent.
+    :param limit: maximum number of traces
+    :return: list of traces
+    """
+    return list(reversed(slow_traces))[:limit]
@@ -0,0 +1,67 @@
+from functools import lru_cache
+
+from cryptography.hazmat.primitives import serialization
+from jose import jwk
+from jose.backends.base import Key
+
+from sgde_api.cache import token_cache
+from sgde_api.config import settings
+
+
+def is_symmetric(algorithm: str) -> bool:
+    return algorithm.startswith("HS")
+
+
+def read_key_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@lru_cache
+def get_signing_key() -> Key:
+    """
+    Get the key signing the JWT tokens. Asymmetric algorithms (e.g. RS256 or
+    ES256) use the private key in JWT_PRIVATE_KEY_FILE; replicas that only
+    verify tokens do not need it. The key is parsed once and cached.
+    :return: signing key
+    """
+    if is_symmetric(settings.JWT_ALG):
+        return jwk.construct(settings.JWT_SECRET, settings.JWT_ALG)
+    if not settings.JWT_PRIVATE_KEY_FILE:
+        raise RuntimeError("JWT_PRIVATE_KEY_FILE is required to sign tokens")
+    return jwk.construct(
+        read_key_file(settings.JWT_PRIVATE_KEY_FILE).decode(), settings.JWT_ALG
+    )
+
+
+@lru_cache
+def get_verification_key() -> Key:
+    """
+    Get the key verifying the JWT tokens. Asymmetric algorithms use the public
+    key in JWT_PUBLIC_KEY_FILE, or the one derived from the private key. The
+    key is parsed once and cached.
+    :return: verification key
+    """
+    if is_symmetric(settings.JWT_ALG):
+        return get_signing_key()
+    if settings.JWT_PUBLIC_KEY_FILE:
+        public_key = read_key_file(settings.JWT_PUBLIC_KEY_FILE)
+    else:
+        private_key = serialization.load_pem_private_key(
+            read_key_file(settings.JWT_PRIVATE_KEY_FILE), password=None
+        )
+        public_key = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    return jwk.construct(public_key.decode(), settings.JWT_ALG)
+
+
+def clear_keys():
+    """
+    Forget the cached keys, e.g. after rotating them, along with the tokens
+    they verified, so that tokens signed by a removed key are rejected.
+    """
+    get_signing_key.cache_clear()
+    get_verification_key.cache_clear()
+    token_cache.clear()
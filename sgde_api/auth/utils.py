@@ -1,3 +1,5 @@
+import hashlib
+import time
 from datetime import timedelta, datetime
 
 import bcrypt
@@ -5,7 +7,8 @@ from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import Field
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from sgde_api.auth.exceptions import (
     EmailTaken,
@@ -15,9 +18,13 @@ from sgde_api.auth.exceptions import (
     LoginRequired,
     InvalidCredentials,
 )
+from sgde_api.auth.keys import get_signing_key, get_verification_key
+from sgde_api.cache import user_cache, token_cache
 from sgde_utils.schemas import UserCreate, UserBase, SGDEBaseModel
 from sgde_api.config import settings
-from sgde_api.database import UserTable, get_db
+from sgde_api.database import UserTable
+from sgde_api.executors import password_executor
+from sgde_api.tracing import span
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
@@ -30,46 +37,56 @@ class UserDB(UserBase):
     hashed_password: bytes
 
 
-def get_user_by_username(db: Session, username: str) -> UserDB | None:
+async def get_user_by_username(db: AsyncSession, username: str) -> UserDB | None:
     """
-    Get a user by username. Returns None if not found.
+    Get a user by username. Returns None if not found. Found users are served
+    from the user cache until they expire.
     :param db: database session
     :param username: username to search
     :return: UserDB object or None
     """
-    return db.query(UserTable).filter_by(username=username).first()
+    user = user_cache.get(username)
+    if user is None:
+        db_user = await db.scalar(
+            select(UserTable).filter_by(username=username).limit(1)
+        )
+        if db_user is None:
+            return None
+        user = UserDB.from_orm(db_user)
+        user_cache.set(username, user)
+    return user
 
 
-def get_user_by_username_required(db: Session, username: str) -> UserDB:
+async def get_user_by_username_required(db: AsyncSession, username: str) -> UserDB:
     """
     Get a user by username. Raises UserNotFound if not found.
     :param db: database session
     :param username: username to search
     :return: UserDB object
     """
-    user = get_user_by_username(db, username)
+    user = await get_user_by_username(db, username)
     if not user:
         raise UserNotFound()
     return user
 
 
-def get_user_by_email(db: Session, email: str) -> UserDB | None:
+async def get_user_by_email(db: AsyncSession, email: str) -> UserDB | None:
     """
     Get a user by email. Returns None if not found.
     :param db: database session
     :param email: email to search
     :return: UserDB object or None
     """
-    return db.query(UserTable).filter_by(email=email).first()
+    return await db.scalar(select(UserTable).filter_by(email=email).limit(1))
 
 
-def get_users(db: Session) -> list[UserDB]:
+async def get_users(db: AsyncSession) -> list[UserDB]:
     """
     Get all users.
     :param db: database session
     :return: list of UserDB objects
     """
-    return db.query(UserTable).offset(0).all()
+    return list(await db.scalars(select(UserTable)))
 
 
 def verify_password(plain_password: str, hashed_password: bytes) -> bool:
@@ -79,29 +96,57 @@ def verify_password(plain_password: str, hashed_password: bytes) -> bool:
 
 def get_password_hash(password: str) -> bytes:
     b_password = password.encode()
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(b_password, salt)
     return hashed
 
 
-def create_user(db: Session, user: UserCreate) -> UserDB:
+def needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Check whether a password hash was computed with a cost factor different
+    from the configured one.
+    :param hashed_password: bcrypt hash, e.g. b"$2b$12$..."
+    :return: True if the password must be hashed again
+    """
+    return int(hashed_password.split(b"$")[2]) != settings.BCRYPT_ROUNDS
+
+
+async def rehash_password(db: AsyncSession, user: UserDB, password: str):
+    """
+    Hash again the password of a user with the configured cost factor.
+    :param db: database session
+    :param user: user whose password was just verified
+    :param password: plain password of the user
+    """
+    hashed_password = await password_executor.run(get_password_hash, password)
+    await db.execute(
+        update(UserTable)
+        .filter_by(username=user.username)
+        .values(hashed_password=hashed_password)
+    )
+    await db.commit()
+    user_cache.invalidate(user.username)
+
+
+async def create_user(db: AsyncSession, user: UserCreate) -> UserDB:
     """
     Insert a user in the database.
     :param db: database session
     :param user: user to insert
     :return: UserDB object
     """
-    if get_user_by_username(db, user.username):
+    if await get_user_by_username(db, user.username):
         raise UsernameTaken()
-    if get_user_by_email(db, user.email):
+    if await get_user_by_email(db, user.email):
         raise EmailTaken()
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await password_executor.run(get_password_hash, user.password)
     db_user = UserTable(
         username=user.username, email=user.email, hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    user_cache.invalidate(user.username)
+    await db.refresh(db_user)
     return db_user
 
 
@@ -109,13 +154,18 @@ def create_access_token(
     user: UserDB, expires_delta: timedelta = timedelta(minutes=settings.JWT_EXP)
 ):
     """
-    Create a JWT token for a user session.
+    Create a JWT token for a user session. The token carries the claims needed
+    by the routes, so they do not have to load the user from the database.
     :param user: UserDB object
     :param expires_delta: expiration time
     :return: JWT token
     """
-    jwt_data = {"sub": user.username, "exp": datetime.utcnow() + expires_delta}
-    return jwt.encode(jwt_data, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
+    jwt_data = {
+        "sub": user.username,
+        "email": user.email,
+        "exp": datetime.utcnow() + expires_delta,
+    }
+    return jwt.encode(jwt_data, get_signing_key(), algorithm=settings.JWT_ALG)
 
 
 class JWTData(SGDEBaseModel):
@@ -124,9 +174,33 @@ class JWTData(SGDEBaseModel):
     """
 
     username: str = Field(alias="sub")
+    email: str | None = None
 
 
-def parse_jwt_user_data(token: str = Depends(oauth2_scheme)) -> JWTData | None:
+def verify_token(token: str) -> JWTData:
+    """
+    Verify a JWT token and return its claims. Verified tokens are cached by
+    their SHA-256 hash until they expire, so repeated calls skip the signature
+    check.
+    :param token: JWT token
+    :return: JWTData object
+    """
+    key = hashlib.sha256(token.encode()).hexdigest()
+    jwt_data = token_cache.get(key)
+    if jwt_data is None:
+        try:
+            payload = jwt.decode(
+                token, get_verification_key(), algorithms=[settings.JWT_ALG]
+            )
+        except JWTError as exc:
+            raise InvalidToken() from exc
+        jwt_data = JWTData(**payload)
+        if "exp" in payload:
+            token_cache.set(key, jwt_data, ttl=payload["exp"] - time.time())
+    return jwt_data
+
+
+async def parse_jwt_user_data(token: str = Depends(oauth2_scheme)) -> JWTData | None:
     """
     Parse a JWT token and return the user data. Returns None if token is None.
     :param token: JWT token
@@ -134,14 +208,11 @@ def parse_jwt_user_data(token: str = Depends(oauth2_scheme)) -> JWTData | None:
     """
     if not token:
         return None
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALG])
-    except JWTError as exc:
-        raise InvalidToken() from exc
-    return JWTData(**payload)
+    with span("verify_token"):
+        return verify_token(token)
 
 
-def parse_jwt_user_data_required(
+async def parse_jwt_user_data_required(
     token: JWTData | None = Depends(parse_jwt_user_data),
 ) -> JWTData:
     """
@@ -154,19 +225,26 @@ def parse_jwt_user_data_required(
     return token
 
 
-def authenticate_user(db: Session, username: str, password: str) -> UserDB:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> UserDB:
     """
-    Authenticate a user given a username and password.
+    Authenticate a user given a username and password. Passwords hashed with a
+    different cost factor than the configured one are hashed again.
     :param db: database session
     :param username: username to search
     :param password: password to verify
     :return: UserDB object
     """
-    user = get_user_by_username(db, username)
+    user = await get_user_by_username(db, username)
     if not user:
         raise InvalidCredentials()
-    if not verify_password(password, user.hashed_password):
+    with span("verify_password"):
+        verified = await password_executor.run(
+            verify_password, password, user.hashed_password
+        )
+    if not verified:
         raise InvalidCredentials()
+    if needs_rehash(user.hashed_password):
+        await rehash_password(db, user, password)
     return user
 
 
@@ -179,8 +257,8 @@ class Token(SGDEBaseModel):
     token_type: str = "bearer"
 
 
-def create_access_token_for_auth_user(
-    db: Session, username: str, password: str
+async def create_access_token_for_auth_user(
+    db: AsyncSession, username: str, password: str
 ) -> Token:
     """
     Create a JWT token for a user session.
@@ -189,19 +267,20 @@ def create_access_token_for_auth_user(
     :param password: password of the logged user
     :return: JWT token
     """
-    user = authenticate_user(db, username, password)
+    user = await authenticate_user(db, username, password)
     access_token = create_access_token(user)
     return Token(access_token=access_token)
 
 
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: JWTData = Depends(parse_jwt_user_data_required),
-) -> UserDB:
+async def get_user_from_token(db: AsyncSession, token: JWTData) -> UserBase:
     """
-    Get the current user given a JWT token.
+    Get the user of a JWT token from its claims, which were validated when the
+    token was issued. Tokens issued without the email claim fall back to the
+    database.
     :param db: database session
     :param token: JWT token
-    :return: UserDB object
+    :return: UserBase object
     """
-    return get_user_by_username_required(db=db, username=token.username)
+    if token.email:
+        return UserBase.construct(username=token.username, email=token.email)
+    return await get_user_by_username_required(db=db, username=token.username)
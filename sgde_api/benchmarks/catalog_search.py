@@ -0,0 +1,127 @@
+"""
+Benchmark of full-text search over a large catalog, with the FTS5 index and
+with a LIKE scan of the text columns. Run it with:
+
+    python -m sgde_api.benchmarks.catalog_search --generators 100000
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from sgde_api.benchmarks.utils import summarize, write_results
+from sgde_api.config import SQLiteProfile
+from sgde_api.database import (
+    Base,
+    GeneratorTable,
+    UserTable,
+    GENERATOR_SEARCH_COLUMNS,
+    create_database_engine,
+)
+from sgde_api.exchange.utils import search_generators, build_search_query
+from sgde_utils.schemas import GeneratorFilter
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return list(
+        {"".join(rng.choices(letters, k=rng.randint(4, 10))) for _ in range(size)}
+    )
+
+
+def make_generator(
+    i: int, vocabulary: list[str], cum_weights: list[float], rng: random.Random
+) -> GeneratorTable:
+    words = rng.choices(vocabulary, cum_weights=cum_weights, k=14)
+    return GeneratorTable(
+        name=f"{words[0]}_gan_{i}",
+        data_name=f"{words[1]}_{i % 100}",
+        data_description=" ".join(words[2:]),
+        gen_onnx_file=f"{i:064x}",
+        json_file=f"{i:064x}",
+        has_cls=False,
+        owner="bench",
+    )
+
+
+async def like_search(db, text_query: str, limit: int) -> list:
+    query = select(GeneratorTable)
+    for term in build_search_query(text_query):
+        query = query.filter(
+            or_(
+                *[
+                    getattr(GeneratorTable, name).ilike(f"%{term}%")
+                    for name in GENERATOR_SEARCH_COLUMNS
+                ]
+            )
+        )
+    return list(await db.scalars(query.order_by(GeneratorTable.name).limit(limit)))
+
+
+async def fts_search(db, text_query: str, limit: int) -> list:
+    generators, _ = await search_generators(db, text_query, GeneratorFilter(), limit)
+    return generators
+
+
+async def run_strategy(session_maker, search, queries: list[str], args) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    async with session_maker() as db:
+        for text_query in queries:
+            query_start = time.perf_counter()
+            await search(db, text_query, args.limit)
+            latencies.append(time.perf_counter() - query_start)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    # word frequencies of natural text roughly follow Zipf's law
+    cum_weights = list(
+        itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1))
+    )
+    queries = [
+        " ".join(rng.sample(vocabulary, rng.randint(1, 2))) for _ in range(args.queries)
+    ]
+    results = {"benchmark": "catalog_search", "parameters": vars(args)}
+    with tempfile.TemporaryDirectory() as instance_path:
+        engine = create_database_engine(
+            f"sqlite:///{os.path.join(instance_path, 'bench.db')}",
+            profile=SQLiteProfile.PRODUCTION,
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_maker() as db:
+            db.add(UserTable(username="bench", email="bench@example.com"))
+            for first in range(0, args.generators, 10000):
+                last = min(first + 10000, args.generators)
+                db.add_all(
+                    make_generator(i, vocabulary, cum_weights, rng)
+                    for i in range(first, last)
+                )
+                await db.flush()
+            await db.commit()
+        results["fts"] = await run_strategy(session_maker, fts_search, queries, args)
+        results["like"] = await run_strategy(session_maker, like_search, queries, args)
+        await engine.dispose()
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--generators", type=int, default=100000)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,132 @@
+"""
+Benchmark of the micro-batching of concurrent generation requests, with and
+without merging their batches, across concurrency levels. Run it with:
+
+    python -m sgde_api.benchmarks.generation_batching --concurrency 1 4 16 64
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from onnx import TensorProto
+from onnx.helper import (
+    make_graph,
+    make_model,
+    make_node,
+    make_opsetid,
+    make_tensor_value_info,
+)
+from onnx.numpy_helper import from_array
+
+from sgde_api.benchmarks.utils import summarize, write_results
+from sgde_api.executors import BoundedExecutor
+from sgde_api.generation.batching import MicroBatcher
+from sgde_api.generation.sampling import create_session, make_inputs
+
+
+def make_mlp(sizes: list[int], rng: np.random.Generator) -> bytes:
+    nodes, initializers = [], []
+    name = "input"
+    for i, (fan_in, fan_out) in enumerate(zip(sizes, sizes[1:])):
+        weights = rng.standard_normal((fan_in, fan_out)).astype(np.float32)
+        weights /= np.sqrt(fan_in)
+        initializers.append(from_array(weights, f"W{i}"))
+        nodes.append(make_node("MatMul", [name, f"W{i}"], [f"h{i}"]))
+        name = f"h{i}"
+        if i < len(sizes) - 2:
+            nodes.append(make_node("Relu", [name], [f"a{i}"]))
+            name = f"a{i}"
+    nodes.append(make_node("Identity", [name], ["output"]))
+    graph = make_graph(
+        nodes,
+        "mlp",
+        [make_tensor_value_info("input", TensorProto.FLOAT, [None, sizes[0]])],
+        [make_tensor_value_info("output", TensorProto.FLOAT, [None, sizes[-1]])],
+        initializers,
+    )
+    model = make_model(graph, opset_imports=[make_opsetid("", 13)])
+    model.ir_version = 8
+    return model.SerializeToString()
+
+
+async def run_client(batcher, models, args, rng, deadline, latencies):
+    while time.perf_counter() < deadline:
+        labels = rng.integers(0, args.num_classes, args.samples)
+        inputs = make_inputs(labels, args.latent_dim, rng, args.num_classes)
+        start = time.perf_counter()
+        await batcher.run("bench", models, inputs, labels)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_level(models, concurrency: int, max_wait: float, args) -> dict:
+    executor = BoundedExecutor(
+        "bench_generation",
+        max_workers=args.workers,
+        max_queue=concurrency,
+        retry_after=1,
+        executor_factory=lambda workers: ThreadPoolExecutor(max_workers=workers),
+    )
+    batcher = MicroBatcher(
+        "bench_batcher",
+        max_batch_size=args.max_batch_size,
+        max_wait=max_wait,
+        executor=executor,
+    )
+    latencies = []
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(
+        *[
+            run_client(
+                batcher,
+                models,
+                args,
+                np.random.default_rng([args.seed, i]),
+                deadline,
+                latencies,
+            )
+            for i in range(concurrency)
+        ]
+    )
+    duration = time.perf_counter() - start
+    executor.shutdown()
+    return {
+        **summarize(latencies, duration),
+        "samples_per_second": len(latencies) * args.samples / duration,
+        "batches_per_run": batcher.batches / batcher.runs if batcher.runs else 0,
+    }
+
+
+async def main(args):
+    rng = np.random.default_rng(args.seed)
+    gen_model = make_mlp(
+        [args.latent_dim + args.num_classes, 256, 512, args.features], rng
+    )
+    cls_model = make_mlp([args.features, 256, args.num_classes], rng)
+    models = (create_session(gen_model), create_session(cls_model))
+    results = {"benchmark": "generation_batching", "parameters": vars(args)}
+    for concurrency in args.concurrency:
+        results[f"concurrency_{concurrency}"] = {
+            "unbatched": await run_level(models, concurrency, 0.0, args),
+            "batched": await run_level(models, concurrency, args.max_wait, args),
+        }
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--samples", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-batch-size", type=int, default=1024)
+    parser.add_argument("--max-wait", type=float, default=0.002)
+    parser.add_argument("--latent-dim", type=int, default=128)
+    parser.add_argument("--num-classes", type=int, default=10)
+    parser.add_argument("--features", type=int, default=784)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
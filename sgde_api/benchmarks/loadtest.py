@@ -0,0 +1,312 @@
+"""
+Load test of the SGDE API with a mixed workload of catalog listings, metadata
+lookups, downloads, uploads and logins, at increasing concurrency levels. Run
+it from the root folder of the project with:
+
+    python -m sgde_api.benchmarks.loadtest --concurrency 1 8 32 --output run.json
+
+The server is started with uvicorn in a temporary folder, hence on an empty
+SQLite database, and seeded with users and with generators made of the models
+in model_examples. Clients pick their operations from seeded random generators,
+so runs are reproducible. Pass the output of an earlier run, e.g. of another
+commit, with --baseline to report the relative change of every latency
+percentile and throughput.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from sgde_api.benchmarks.utils import summarize, write_results
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MODEL_PATH = os.path.join(ROOT_PATH, "model_examples")
+OPERATIONS = ["list", "metadata", "download", "upload", "login"]
+PASSWORD = "aaaAAA1!"
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for item in text.split(","):
+        operation, _, weight = item.partition("=")
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {operation}")
+        mix[operation] = float(weight)
+    return mix
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT_PATH,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_server(instance_path: str, port: int, args) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [ROOT_PATH, os.environ.get("PYTHONPATH")])
+        ),
+        "JWT_SECRET": os.environ.get("JWT_SECRET", "loadtest"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(instance_path, 'sgde_db.db')}",
+        "GENERATOR_PATH": os.path.join(instance_path, "generators"),
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+    }
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "sgde_api.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=instance_path,
+        env=env,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, server: subprocess.Popen):
+    deadline = time.perf_counter() + 60
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("The server exited during startup")
+        try:
+            if (await client.get("/generators/", params={"limit": 1})).is_success:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("The server did not start in time")
+
+
+def make_files(name: str, model: bytes, metadata: dict) -> dict:
+    return {
+        "gen_onnx_file": ("gen.onnx", model),
+        "json_file": ("gen.json", json.dumps({**metadata, "name": name})),
+    }
+
+
+async def seed(client: httpx.AsyncClient, model: bytes, metadata: dict, args):
+    semaphore = asyncio.Semaphore(8)
+
+    async def register(i: int) -> dict:
+        user = {
+            "username": f"load_user_{i}",
+            "email": f"load_user_{i}@example.com",
+            "password": PASSWORD,
+        }
+        async with semaphore:
+            (await client.post("/auth/register", json=user)).raise_for_status()
+            response = await client.post(
+                "/auth/token", data={"username": user["username"], "password": PASSWORD}
+            )
+        response.raise_for_status()
+        return {**user, "token": response.json()["access_token"]}
+
+    async def upload(i: int, user: dict) -> str:
+        name = f"load_gan_{i}"
+        async with semaphore:
+            response = await client.post(
+                "/exchange/upload",
+                headers={"Authorization": f"Bearer {user['token']}"},
+                files=make_files(name, model, metadata),
+            )
+        response.raise_for_status()
+        return name
+
+    users = await asyncio.gather(*[register(i) for i in range(args.users)])
+    names = await asyncio.gather(
+        *[upload(i, users[i % len(users)]) for i in range(args.generators)]
+    )
+    return users, names
+
+
+async def run_client(
+    client: httpx.AsyncClient,
+    rng: random.Random,
+    client_id: str,
+    state: dict,
+    deadline: float,
+    args,
+):
+    operations, weights = zip(*args.mix.items())
+    requests = 0
+    while time.perf_counter() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        user = rng.choice(state["users"])
+        headers = {"Authorization": f"Bearer {user['token']}"}
+        start = time.perf_counter()
+        if operation == "list":
+            response = await client.get(
+                "/generators/", params={"limit": args.page_size}
+            )
+        elif operation == "metadata":
+            response = await client.get(f"/generators/{rng.choice(state['names'])}")
+        elif operation == "download":
+            response = await client.get(
+                f"/generators/{rng.choice(state['names'])}/download", headers=headers
+            )
+        elif operation == "upload":
+            response = await client.post(
+                "/exchange/upload",
+                headers=headers,
+                files=make_files(
+                    f"load_gan_{client_id}_{requests}",
+                    state["model"],
+                    state["metadata"],
+                ),
+            )
+        else:
+            response = await client.post(
+                "/auth/token",
+                data={"username": user["username"], "password": PASSWORD},
+            )
+        latency = time.perf_counter() - start
+        requests += 1
+        if response.is_success:
+            state["latencies"][operation].append(latency)
+        else:
+            state["errors"][operation] += 1
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, state: dict, args):
+    state["latencies"] = {operation: [] for operation in args.mix}
+    state["errors"] = {operation: 0 for operation in args.mix}
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(
+        *[
+            run_client(
+                client,
+                random.Random(f"{args.seed}-{concurrency}-{i}"),
+                f"{concurrency}_{i}",
+                state,
+                deadline,
+                args,
+            )
+            for i in range(concurrency)
+        ]
+    )
+    duration = time.perf_counter() - start
+    results = {
+        "overall": summarize(
+            [
+                latency
+                for latencies in state["latencies"].values()
+                for latency in latencies
+            ],
+            duration,
+            sum(state["errors"].values()),
+        )
+    }
+    for operation in args.mix:
+        results[operation] = summarize(
+            state["latencies"][operation], duration, state["errors"][operation]
+        )
+    return results
+
+
+def compare(levels: dict, baseline: dict) -> dict:
+    comparison = {}
+    for level, operations in levels.items():
+        for operation, summary in operations.items():
+            previous = baseline.get("levels", {}).get(level, {}).get(operation)
+            if not previous:
+                continue
+            comparison.setdefault(level, {})[operation] = {
+                key: summary[key] / previous[key] - 1 if previous[key] else None
+                for key in ["throughput", "p50_ms", "p95_ms", "p99_ms"]
+            }
+    return comparison
+
+
+async def main(args):
+    with open(os.path.join(MODEL_PATH, "model.onnx"), "rb") as f:
+        model = f.read()
+    with open(os.path.join(MODEL_PATH, "model.json")) as f:
+        metadata = json.load(f)
+
+    results = {
+        "benchmark": "loadtest",
+        "parameters": vars(args),
+        "environment": {
+            "commit": get_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "levels": {},
+    }
+    with tempfile.TemporaryDirectory() as instance_path:
+        port = get_free_port()
+        server = start_server(instance_path, port, args)
+        try:
+            limits = httpx.Limits(max_connections=max(args.concurrency))
+            async with httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60
+            ) as client:
+                await wait_ready(client, server)
+                users, names = await seed(client, model, metadata, args)
+                state = {
+                    "users": users,
+                    "names": names,
+                    "model": model,
+                    "metadata": metadata,
+                }
+                for concurrency in args.concurrency:
+                    results["levels"][str(concurrency)] = await run_level(
+                        client, concurrency, state, args
+                    )
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["comparison"] = compare(results["levels"], json.load(f))
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--generators", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default="list=30,metadata=35,download=15,upload=5,login=15",
+    )
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
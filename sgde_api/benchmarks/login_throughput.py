@@ -0,0 +1,95 @@
+"""
+Benchmark of the /auth/token throughput and of the /generators/ latency while
+users log in, against a running SGDE API. Run it with:
+
+    python -m sgde_api.benchmarks.login_throughput --url http://localhost:8000
+
+The catalog is first polled alone, to measure its baseline latency, and then
+together with concurrent logins.
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+from sgde_api.benchmarks.utils import summarize, write_results
+
+
+async def poll_catalog(client: httpx.AsyncClient, deadline: float, latencies: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/generators/")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+
+async def log_in(
+    client: httpx.AsyncClient, user: dict, deadline: float, latencies: list, errors
+):
+    data = {"username": user["username"], "password": user["password"]}
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.post("/auth/token", data=data)
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(response.status_code)
+
+
+async def run_phase(client: httpx.AsyncClient, users: list[dict], args) -> dict:
+    catalog_latencies, login_latencies, login_errors = [], [], []
+    deadline = time.perf_counter() + args.duration
+    await asyncio.gather(
+        *[
+            poll_catalog(client, deadline, catalog_latencies)
+            for _ in range(args.pollers)
+        ],
+        *[
+            log_in(client, user, deadline, login_latencies, login_errors)
+            for user in users
+        ],
+    )
+    results = {"catalog": summarize(catalog_latencies, args.duration)}
+    if users:
+        results["login"] = summarize(login_latencies, args.duration, len(login_errors))
+    return results
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.pollers + args.logins)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=60
+    ) as client:
+        users = []
+        for _ in range(args.logins):
+            suffix = uuid.uuid4().hex[:8]
+            user = {
+                "username": f"bench_{suffix}",
+                "email": f"bench_{suffix}@example.com",
+                "password": "aaaAAA1!",
+            }
+            (await client.post("/auth/register", json=user)).raise_for_status()
+            users.append(user)
+
+        results = {
+            "benchmark": "login_throughput",
+            "parameters": vars(args),
+            "phases": {
+                "catalog": await run_phase(client, [], args),
+                "catalog_and_login": await run_phase(client, users, args),
+            },
+        }
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=16)
+    parser.add_argument("--pollers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,139 @@
+"""
+Benchmark of catalog reads while generators are being written, for each SQLite
+storage profile. Run it with:
+
+    python -m sgde_api.benchmarks.sqlite_concurrency --readers 8 --writers 2
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from sgde_api.benchmarks.utils import summarize, write_results
+from sgde_api.config import SQLiteProfile
+from sgde_api.database import (
+    Base,
+    GeneratorTable,
+    UserTable,
+    create_database_engine,
+)
+from sgde_api.exchange.utils import get_generators_page
+from sgde_utils.schemas import GeneratorFilter, GeneratorSort
+
+
+def make_generator(i: int) -> GeneratorTable:
+    return GeneratorTable(
+        name=f"bench_gan_{i}",
+        data_name="mnist",
+        data_structure="image",
+        data_length=60000,
+        task="classification",
+        metric="accuracy",
+        best_score=(i % 1000) / 1000,
+        gen_onnx_file=f"{i:064x}",
+        json_file=f"{i:064x}",
+        has_cls=False,
+        owner="bench",
+    )
+
+
+async def reader(session_maker, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            async with session_maker() as db:
+                await get_generators_page(
+                    db, GeneratorFilter(), GeneratorSort.best_score_desc, limit=100
+                )
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors.append(1)
+
+
+async def writer(
+    session_maker, deadline: float, first: int, latencies: list, errors: list
+):
+    i = first
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            async with session_maker() as db:
+                db.add(make_generator(i))
+                await db.commit()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors.append(1)
+        i += 1
+
+
+async def run_profile(profile: SQLiteProfile, args) -> dict:
+    with tempfile.TemporaryDirectory() as instance_path:
+        engine = create_database_engine(
+            f"sqlite:///{os.path.join(instance_path, 'bench.db')}",
+            profile=profile,
+            pool_size=args.readers + args.writers,
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_maker() as db:
+            db.add(UserTable(username="bench", email="bench@example.com"))
+            db.add_all(make_generator(i) for i in range(args.generators))
+            await db.commit()
+
+        read_latencies, read_errors = [], []
+        write_latencies, write_errors = [], []
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(
+            *[
+                reader(session_maker, deadline, read_latencies, read_errors)
+                for _ in range(args.readers)
+            ],
+            *[
+                writer(
+                    session_maker,
+                    deadline,
+                    args.generators + w * 10**6,
+                    write_latencies,
+                    write_errors,
+                )
+                for w in range(args.writers)
+            ],
+        )
+        await engine.dispose()
+    return {
+        "reads": summarize(read_latencies, args.duration, len(read_errors)),
+        "writes": summarize(write_latencies, args.duration, len(write_errors)),
+    }
+
+
+async def main(args):
+    results = {
+        "benchmark": "sqlite_concurrency",
+        "parameters": vars(args),
+        "profiles": {},
+    }
+    for profile in args.profiles:
+        results["profiles"][profile] = await run_profile(SQLiteProfile(profile), args)
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--generators", type=int, default=1000)
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        default=[profile.value for profile in SQLiteProfile],
+        choices=[profile.value for profile in SQLiteProfile],
+    )
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,152 @@
+"""
+Benchmark of the ways of resolving the user of an authenticated request, for
+each JWT algorithm. Run it with:
+
+    python -m sgde_api.benchmarks.token_verification --requests 2000
+
+The strategies are:
+* database: verify the token and load the user from the database
+* user_cache: verify the token and load the user through the user cache
+* claims: verify the token and read the user from its claims
+* token_cache: read the user from the claims of the verified-token cache
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from sgde_api.auth.keys import clear_keys, get_verification_key
+from sgde_api.auth.utils import (
+    UserDB,
+    JWTData,
+    create_access_token,
+    get_user_by_username,
+    get_user_from_token,
+    verify_token,
+)
+from sgde_api.benchmarks.utils import summarize, write_results
+from sgde_api.cache import token_cache, user_cache
+from sgde_api.config import settings
+from sgde_api.database import Base, UserTable, create_database_engine
+
+PRIVATE_KEYS = {
+    "RS256": lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    "ES256": lambda: ec.generate_private_key(ec.SECP256R1()),
+}
+
+
+def use_algorithm(algorithm: str, key_folder: str):
+    settings.JWT_ALG = algorithm
+    if algorithm in PRIVATE_KEYS:
+        private_key_file = os.path.join(key_folder, f"{algorithm}.pem")
+        with open(private_key_file, "wb") as f:
+            f.write(
+                PRIVATE_KEYS[algorithm]().private_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PrivateFormat.PKCS8,
+                    serialization.NoEncryption(),
+                )
+            )
+        settings.JWT_PRIVATE_KEY_FILE = private_key_file
+    clear_keys()
+    token_cache.clear()
+    user_cache.clear()
+
+
+def decode(token: str) -> JWTData:
+    payload = jwt.decode(token, get_verification_key(), algorithms=[settings.JWT_ALG])
+    return JWTData(**payload)
+
+
+async def resolve_database(db, token: str):
+    user_cache.clear()
+    return await get_user_by_username(db, decode(token).username)
+
+
+async def resolve_user_cache(db, token: str):
+    return await get_user_by_username(db, decode(token).username)
+
+
+async def resolve_claims(db, token: str):
+    return await get_user_from_token(db, decode(token))
+
+
+async def resolve_token_cache(db, token: str):
+    return await get_user_from_token(db, verify_token(token))
+
+
+STRATEGIES = {
+    "database": resolve_database,
+    "user_cache": resolve_user_cache,
+    "claims": resolve_claims,
+    "token_cache": resolve_token_cache,
+}
+
+
+async def run_strategy(session_maker, strategy, tokens: list[str]) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    async with session_maker() as db:
+        for token in tokens:
+            request_start = time.perf_counter()
+            user = await strategy(db, token)
+            latencies.append(time.perf_counter() - request_start)
+            assert user is not None
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def main(args):
+    results = {
+        "benchmark": "token_verification",
+        "parameters": vars(args),
+        "algorithms": {},
+    }
+    with tempfile.TemporaryDirectory() as instance_path:
+        engine = create_database_engine(
+            f"sqlite:///{os.path.join(instance_path, 'bench.db')}"
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_maker() as db:
+            db.add_all(
+                UserTable(
+                    username=f"bench_user_{i}",
+                    email=f"bench_user_{i}@example.com",
+                    hashed_password=b"",
+                )
+                for i in range(args.users)
+            )
+            await db.commit()
+            users = [UserDB.from_orm(u) for u in await db.scalars(select(UserTable))]
+
+        for algorithm in args.algorithms:
+            use_algorithm(algorithm, instance_path)
+            tokens = [create_access_token(user) for user in users]
+            requests = [tokens[i % len(tokens)] for i in range(args.requests)]
+            results["algorithms"][algorithm] = {
+                name: await run_strategy(session_maker, STRATEGIES[name], requests)
+                for name in args.strategies
+            }
+        await engine.dispose()
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--algorithms", nargs="+", default=["HS256", "RS256", "ES256"])
+    parser.add_argument(
+        "--strategies", nargs="+", default=list(STRATEGIES), choices=list(STRATEGIES)
+    )
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,49 @@
+import json
+import math
+import sys
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """
+    Get a percentile of sorted values with the nearest-rank method.
+    :param sorted_values: values sorted in ascending order
+    :param q: percentile between 0 and 100
+    :return: the percentile, or NaN if there are no values
+    """
+    if not sorted_values:
+        return math.nan
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list[float], duration: float, errors: int = 0) -> dict:
+    """
+    Summarize the latencies of the operations run during a benchmark.
+    :param latencies: latencies in seconds of the successful operations
+    :param duration: duration in seconds of the benchmark
+    :param errors: number of failed operations
+    :return: dictionary with count, throughput, and latency percentiles in ms
+    """
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / duration if duration else math.nan,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def write_results(results: dict, output: str | None = None):
+    """
+    Write benchmark results as JSON, to a file or to the standard output.
+    :param results: benchmark results
+    :param output: path of the output file, or None for the standard output
+    """
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from sgde_api.config import settings
+from sgde_api.metrics import metrics
+
+
+class TTLCache:
+    """
+    In-process cache with a time to live and least-recently-used eviction.
+    Cached values must not be bound to a database session, hence lookups cache
+    pydantic copies of the ORM objects. Hits and misses are exposed as metrics.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = metrics.counter(
+            f"sgde_{name}_cache_hits_total", f"Number of {name} cache hits"
+        )
+        self._misses = metrics.counter(
+            f"sgde_{name}_cache_misses_total", f"Number of {name} cache misses"
+        )
+        metrics.gauge(
+            f"sgde_{name}_cache_size",
+            f"Number of entries in the {name} cache",
+            lambda: len(self._entries),
+        )
+
+    @property
+    def hits(self) -> int:
+        return self._hits.value
+
+    @property
+    def misses(self) -> int:
+        return self._misses.value
+
+    def get(self, key: Hashable) -> Any | None:
+        """
+        Get a cached value, counting the lookup as a hit or a miss.
+        :param key: key of the value
+        :return: the cached value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._misses.inc()
+                return None
+            self._entries.move_to_end(key)
+            self._hits.inc()
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """
+        Cache a value, evicting the least recently used entries beyond the
+        maximum size. Nothing is cached if the maximum size is zero.
+        :param key: key of the value
+        :param value: value to cache
+        :param ttl: time to live of the value, if shorter than the cache's one
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """
+        Remove a value from the cache.
+        :param key: key of the value
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Remove every value from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = TTLCache(
+    "user", maxsize=settings.METADATA_CACHE_SIZE, ttl=settings.METADATA_CACHE_TTL
+)
+generator_cache = TTLCache(
+    "generator", maxsize=settings.METADATA_CACHE_SIZE, ttl=settings.METADATA_CACHE_TTL
+)
+token_cache = TTLCache(
+    "token", maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.JWT_EXP * 60
+)
@@ -1,7 +1,10 @@
+import importlib.util
 import os
 from enum import Enum
 
-from pydantic import BaseSettings
+from pydantic import BaseSettings, root_validator, validator
+
+from sgde_utils.schemas import GeneratorVariant
 
 
 class Environment(str, Enum):
@@ -22,6 +25,21 @@ class Environment(str, Enum):
         return self == self.PRODUCTION
 
 
+class SQLiteProfile(str, Enum):
+    DEFAULT = "default"
+    PRODUCTION = "production"
+
+
+class BlobCompression(str, Enum):
+    NONE = "none"
+    GZIP = "gzip"
+
+
+# quantize_dynamic needs a newer onnx than the pinned one, so quantized variants
+# are rejected until it can be upgraded
+SUPPORTED_ONNX_VARIANTS = [GeneratorVariant.optimized]
+
+
 class Config(BaseSettings):
     """
     Class for the SGDE API configuration.
@@ -29,17 +47,95 @@ class Config(BaseSettings):
 
     INSTANCE_PATH = os.path.join(os.getcwd(), "instance")
     DATABASE_URL: str = f"sqlite:///{os.path.join(INSTANCE_PATH, 'sgde_db.db')}"
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 20
+
+    SQLITE_PROFILE: SQLiteProfile = SQLiteProfile.PRODUCTION
+    SQLITE_BUSY_TIMEOUT: int = 5000
+    SQLITE_CACHE_SIZE: int = -65536
+    SQLITE_MMAP_SIZE: int = 268435456
 
-    JWT_SECRET: str
+    JWT_SECRET: str | None = None
     JWT_ALG: str = "HS256"
     JWT_EXP: int = "21000"
+    JWT_PRIVATE_KEY_FILE: str | None = None
+    JWT_PUBLIC_KEY_FILE: str | None = None
+    TOKEN_CACHE_SIZE: int = 4096
+
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_WORKERS: int = min(os.cpu_count() or 1, 4)
+    PASSWORD_QUEUE_SIZE: int = 64
+    PASSWORD_RETRY_AFTER: int = 1
 
     ENVIRONMENT: Environment = Environment.DEVELOPMENT
 
     GENERATOR_PATH: str = os.path.join(os.getcwd(), "instance", "generators")
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    BLOB_COMPRESSION: BlobCompression = BlobCompression.NONE
+    BLOB_COMPRESSION_LEVEL: int = 1
+    BLOB_COMPRESSION_MIN_RATIO: float = 0.9
+    BLOB_SWEEP_GRACE: float = 3600.0
+    BUNDLE_CACHE_SIZE: int = 1024 * 1024 * 1024
+    BUNDLE_EVICTION_GRACE: float = 60.0
+    CATALOG_PAGE_SIZE: int = 100
+    CATALOG_MAX_PAGE_SIZE: int = 1000
+    BULK_LOOKUP_MAX_SIZE: int = 5000
+
+    METADATA_CACHE_SIZE: int = 4096
+    METADATA_CACHE_TTL: float = 60.0
+
+    BATCH_UPLOAD_MAX_SIZE: int = 100
+    BATCH_METADATA_MAX_SIZE: int = 1024 * 1024
+
+    VALIDATION_WORKERS: int = min(os.cpu_count() or 1, 4)
+    VALIDATION_QUEUE_SIZE: int = 16
+    VALIDATION_RETRY_AFTER: int = 5
+
+    ONNX_VARIANTS: list[GeneratorVariant] = []
+    ONNX_PARITY_RUNS: int = 8
+    ONNX_OPTIMIZED_TOLERANCE: float = 1e-4
+    VARIANT_WORKERS: int = 1
+    VARIANT_QUEUE_SIZE: int = 64
+
+    GENERATION_WORKERS: int = min(os.cpu_count() or 1, 4)
+    GENERATION_QUEUE_SIZE: int = 16
+    GENERATION_RETRY_AFTER: int = 5
+    GENERATION_MAX_SAMPLES: int = 100000
+    GENERATION_BATCH_SIZE: int = 256
+    GENERATION_MAX_ATTEMPTS: int = 10
+    GENERATION_MERGED_BATCH_SIZE: int = 1024
+    GENERATION_BATCH_WAIT: float = 0.002
+    GENERATION_SESSION_POOL_SIZE: int = 1024 * 1024 * 1024
+    GENERATION_WARMUP_SIZE: int = 8
+
+    TRACE_SLOW_REQUEST_THRESHOLD: float | None = 1.0
+    TRACE_BUFFER_SIZE: int = 100
+    TRACE_MAX_SPANS: int = 1000
+    ADMIN_USERS: list[str] = []
 
     class Config:
         env_file = ".api.env"
 
+    @validator("ONNX_VARIANTS")
+    def check_onnxruntime(cls, variants):
+        for variant in variants:
+            if variant not in SUPPORTED_ONNX_VARIANTS:
+                raise ValueError(f"{variant.value} variants are not supported")
+        if variants and importlib.util.find_spec("onnxruntime") is None:
+            raise ValueError("onnxruntime is required by ONNX_VARIANTS")
+        return variants
+
+    @root_validator(skip_on_failure=True)
+    def check_jwt_keys(cls, values):
+        if values["JWT_ALG"].startswith("HS"):
+            if not values["JWT_SECRET"]:
+                raise ValueError(f"JWT_SECRET is required by {values['JWT_ALG']}")
+        elif not (values["JWT_PRIVATE_KEY_FILE"] or values["JWT_PUBLIC_KEY_FILE"]):
+            raise ValueError(
+                f"JWT_PRIVATE_KEY_FILE or JWT_PUBLIC_KEY_FILE is required by "
+                f"{values['JWT_ALG']}"
+            )
+        return values
+
 
 settings = Config()
@@ -1,5 +1,8 @@
+import time
+from datetime import datetime
+
 from sqlalchemy import (
-    create_engine,
+    event,
     Column,
     String,
     Integer,
@@ -7,26 +10,149 @@ from sqlalchemy import (
     ForeignKey,
     Float,
     Boolean,
+    DateTime,
+    Index,
+    inspect,
+    update,
 )
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine
+from sqlalchemy.orm import declarative_base, relationship
+
+from sgde_api.config import settings, SQLiteProfile
+from sgde_api.metrics import metrics
+from sgde_api.tracing import start_span
+
+
+def get_async_database_url(database_url: str) -> str:
+    """
+    Get the URL of the async driver for a database URL. SQLite URLs without an
+    explicit driver use aiosqlite; other URLs must already name an async driver.
+    :param database_url: database URL
+    :return: async database URL
+    """
+    if database_url.startswith("sqlite:"):
+        return database_url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    return database_url
+
+
+def get_sqlite_pragmas(profile: SQLiteProfile) -> dict[str, str | int]:
+    """
+    Get the pragmas applied to every SQLite connection for a storage profile.
+    The production profile lets readers run alongside a writer (WAL), waits for
+    locks instead of failing, and keeps more of the database in memory.
+    :param profile: SQLite storage profile
+    :return: dictionary of pragma names and values
+    """
+    if profile == SQLiteProfile.DEFAULT:
+        return {}
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "temp_store": "MEMORY",
+    }
 
-from sgde_api.config import settings
 
-engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+QUERY_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "PRAGMA"}
+
+query_duration = metrics.histogram(
+    "sgde_db_query_duration_seconds",
+    "Duration of the SQL statements, in seconds",
+    labels=("statement",),
+)
+
+
+def get_statement_kind(statement: str) -> str:
+    """
+    Get the kind of an SQL statement from its first keyword, so that the query
+    metrics have a bounded number of series.
+    :param statement: SQL statement
+    :return: first keyword of the statement, or "OTHER"
+    """
+    keyword = statement.split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in QUERY_STATEMENTS else "OTHER"
+
+
+def create_database_engine(
+    database_url: str, profile: SQLiteProfile = settings.SQLITE_PROFILE, **kwargs
+) -> AsyncEngine:
+    """
+    Create an async engine with the configured connection pool. SQLite
+    connections are set up with the pragmas of the given profile, and every
+    statement is timed and traced.
+    :param database_url: database URL
+    :param profile: SQLite storage profile
+    :param kwargs: additional arguments of create_async_engine
+    :return: AsyncEngine object
+    """
+    database_url = get_async_database_url(database_url)
+    if "poolclass" not in kwargs and ":memory:" not in database_url:
+        kwargs.setdefault("pool_size", settings.DATABASE_POOL_SIZE)
+        kwargs.setdefault("max_overflow", settings.DATABASE_MAX_OVERFLOW)
+    async_engine = create_async_engine(database_url, **kwargs)
+
+    pragmas = get_sqlite_pragmas(profile)
+    if database_url.startswith("sqlite") and pragmas:
+
+        @event.listens_for(async_engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, _):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        context.query_start_time = time.perf_counter()
+        context.query_span = start_span("db_query", sql=statement[:200])
+
+    @event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+    def observe_query_time(conn, cursor, statement, parameters, context, executemany):
+        query_duration.observe(
+            time.perf_counter() - context.query_start_time,
+            get_statement_kind(statement),
+        )
+        if context.query_span is not None:
+            context.query_span.finish()
+
+    return async_engine
+
+
+def register_pool_metrics(async_engine: AsyncEngine):
+    """
+    Expose the connections of an engine's pool as metrics, if the pool keeps
+    track of them.
+    :param async_engine: AsyncEngine object
+    """
+    pool = async_engine.pool
+    if hasattr(pool, "checkedout"):
+        metrics.gauge(
+            "sgde_db_pool_checked_out",
+            "Number of database connections in use",
+            pool.checkedout,
+        )
+        metrics.gauge(
+            "sgde_db_pool_size",
+            "Number of database connections kept by the pool",
+            pool.size,
+        )
+
+
+engine = create_database_engine(settings.DATABASE_URL)
+register_pool_metrics(engine)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
-def get_db():
+async def get_db():
     """
-    Returns a database session, closing it when the context is exited.
+    Returns an async database session, closing it when the context is exited.
     :return:
     """
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 class UserTable(Base):
@@ -72,6 +198,167 @@ class GeneratorTable(Base):
 
     has_cls = Column(Boolean, index=True, nullable=False)
 
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
     owner = Column(String, ForeignKey("users.username"))
 
     owner_rel = relationship("UserTable", back_populates="generators_rel")
+    extras_rel = relationship(
+        "GeneratorExtraTable",
+        back_populates="generator_rel",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+
+class GeneratorExtraTable(Base):
+    """
+    Database table for the extra metadata of the SGDE API generators, i.e., the
+    keys of their JSON files that have no column. Values are stored as canonical
+    JSON, so that they can be compared by equality.
+    """
+
+    __tablename__ = "generator_extras"
+    __table_args__ = (
+        Index("ix_generator_extras_key_value", "key", "value", "generator_id"),
+    )
+
+    generator_id = Column(
+        Integer, ForeignKey("generators.id", ondelete="CASCADE"), primary_key=True
+    )
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+
+    generator_rel = relationship("GeneratorTable", back_populates="extras_rel")
+
+
+class GeneratorVariantTable(Base):
+    """
+    Database table for the ONNX variants derived from the artifacts of the SGDE
+    API generators, with the outcome of their numerical parity check.
+    """
+
+    __tablename__ = "generator_variants"
+
+    generator_id = Column(
+        Integer, ForeignKey("generators.id", ondelete="CASCADE"), primary_key=True
+    )
+    artifact = Column(String, primary_key=True)
+    variant = Column(String, primary_key=True)
+    digest = Column(String, nullable=False)
+    max_abs_error = Column(Float, nullable=False)
+    parity_ok = Column(Boolean, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class GeneratorUsageTable(Base):
+    """
+    Database table for the usage of the SGDE API generators, i.e., how many
+    generation requests they served, used to warm up the most popular ones.
+    """
+
+    __tablename__ = "generator_usage"
+
+    generator_id = Column(
+        Integer, ForeignKey("generators.id", ondelete="CASCADE"), primary_key=True
+    )
+    generations = Column(Integer, nullable=False, default=0, index=True)
+    last_generated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class BlobTable(Base):
+    """
+    Database table for the content-addressed generator artifacts.
+    """
+
+    __tablename__ = "blobs"
+
+    digest = Column(String, primary_key=True)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+
+
+GENERATOR_SEARCH_TABLE = "generators_fts"
+GENERATOR_SEARCH_COLUMNS = ["name", "data_name", "data_description"]
+
+
+def create_generator_search_index(target, connection, **kwargs):
+    """
+    Create the SQLite FTS5 index over the text columns of the generators, and
+    the triggers keeping it in sync with the generator table. The index stores
+    no copy of the text (external content). If the generator table already has
+    rows, e.g. in a database created before the index, the index is rebuilt.
+    Other backends have no index and search with LIKE.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (GENERATOR_SEARCH_TABLE,),
+    ).first()
+    if exists:
+        return
+    columns = ", ".join(GENERATOR_SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{column}" for column in GENERATOR_SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{column}" for column in GENERATOR_SEARCH_COLUMNS)
+    insert = (
+        f"INSERT INTO {GENERATOR_SEARCH_TABLE}(rowid, {columns}) "
+        f"VALUES (new.id, {new_values});"
+    )
+    delete = (
+        f"INSERT INTO {GENERATOR_SEARCH_TABLE}"
+        f"({GENERATOR_SEARCH_TABLE}, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values});"
+    )
+    for statement in [
+        f"CREATE VIRTUAL TABLE {GENERATOR_SEARCH_TABLE} USING fts5({columns}, "
+        f"content='generators', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {GENERATOR_SEARCH_TABLE}_insert AFTER INSERT ON generators "
+        f"BEGIN {insert} END",
+        f"CREATE TRIGGER {GENERATOR_SEARCH_TABLE}_delete AFTER DELETE ON generators "
+        f"BEGIN {delete} END",
+        f"CREATE TRIGGER {GENERATOR_SEARCH_TABLE}_update AFTER UPDATE ON generators "
+        f"BEGIN {delete} {insert} END",
+        f"INSERT INTO {GENERATOR_SEARCH_TABLE}({GENERATOR_SEARCH_TABLE}) "
+        f"VALUES ('rebuild')",
+    ]:
+        connection.exec_driver_sql(statement)
+
+
+def drop_generator_search_index(target, connection, **kwargs):
+    """
+    Drop the SQLite FTS5 index of the generators and its triggers.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    for trigger in ["insert", "delete", "update"]:
+        connection.exec_driver_sql(
+            f"DROP TRIGGER IF EXISTS {GENERATOR_SEARCH_TABLE}_{trigger}"
+        )
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {GENERATOR_SEARCH_TABLE}")
+
+
+def add_generator_created_at(target, connection, **kwargs):
+    """
+    Add the creation date column to a generator table created before it, and
+    backfill it with the time of the migration, since the upload dates of the
+    existing generators are unknown. SQLite cannot add a NOT NULL column without
+    a default, so the column is added as nullable; new rows always set it.
+    """
+    columns = inspect(connection).get_columns(GeneratorTable.__tablename__)
+    if any(column["name"] == "created_at" for column in columns):
+        return
+    column_type = GeneratorTable.created_at.type.compile(dialect=connection.dialect)
+    connection.exec_driver_sql(
+        f"ALTER TABLE {GeneratorTable.__tablename__} "
+        f"ADD COLUMN created_at {column_type}"
+    )
+    connection.execute(
+        update(GeneratorTable.__table__).values(created_at=datetime.utcnow())
+    )
+
+
+event.listen(Base.metadata, "after_create", add_generator_created_at)
+event.listen(Base.metadata, "after_create", create_generator_search_index)
+event.listen(Base.metadata, "before_drop", drop_generator_search_index)
@@ -34,3 +34,13 @@ class NotFound(DetailedHTTPException):
 class InternalServerError(DetailedHTTPException):
     STATUS_CODE = status.HTTP_500_INTERNAL_SERVER_ERROR
     DETAIL = "SGDE server error"
+
+
+class NotSupported(DetailedHTTPException):
+    STATUS_CODE = status.HTTP_501_NOT_IMPLEMENTED
+    DETAIL = "Not supported by the SGDE server"
+
+
+class ServiceUnavailable(DetailedHTTPException):
+    STATUS_CODE = status.HTTP_503_SERVICE_UNAVAILABLE
+    DETAIL = "SGDE server busy, retry later"
@@ -0,0 +1,86 @@
+import os
+import tarfile
+from typing import BinaryIO
+
+from sgde_api.config import settings
+from sgde_api.exchange.exceptions import (
+    InvalidArchiveError,
+    BatchTooLargeError,
+    MetadataTooLargeError,
+)
+from sgde_api.exchange.storage import stage_file
+from sgde_utils.schemas import GeneratorArtifact
+
+ARCHIVE_MEMBER_SUFFIXES = {
+    "_gen.onnx": GeneratorArtifact.gen,
+    "_cls.onnx": GeneratorArtifact.cls,
+    ".json": GeneratorArtifact.metadata,
+}
+
+
+def parse_archive_member_name(member_name: str) -> tuple[str, GeneratorArtifact]:
+    """
+    Get the item and the artifact of an archive member. Members are named as in
+    the download bundles: <key>.json, <key>_gen.onnx and <key>_cls.onnx.
+    :param member_name: name of the archive member
+    :return: key of the item and artifact, or None if the member is unknown
+    """
+    filename = os.path.basename(member_name)
+    for suffix, artifact in ARCHIVE_MEMBER_SUFFIXES.items():
+        if filename.endswith(suffix) and len(filename) > len(suffix):
+            return filename[: -len(suffix)], artifact
+    return None
+
+
+def discard_staged_archive(items: dict):
+    """
+    Delete the staged files of an archive that were not moved to the blob store.
+    :param items: items returned by stage_archive
+    """
+    for item in items.values():
+        for artifact in [GeneratorArtifact.gen, GeneratorArtifact.cls]:
+            if artifact in item and os.path.exists(item[artifact][0]):
+                os.unlink(item[artifact][0])
+
+
+def stage_archive(file: BinaryIO) -> dict[str, dict]:
+    """
+    Read a tar stream of generators, optionally compressed, in a single pass.
+    ONNX members are copied to the staging folder and JSON members, up to
+    BATCH_METADATA_MAX_SIZE bytes, are read in memory. Unknown members are
+    ignored.
+    This is blocking, so it must run in an executor.
+    :param file: file object of the tar stream
+    :return: dictionary from item keys to dictionaries from artifacts to the
+        metadata bytes or to the path and digest of the staged ONNX files
+    """
+    items = {}
+    try:
+        with tarfile.open(fileobj=file, mode="r|*") as archive:
+            for member in archive:
+                parsed = parse_archive_member_name(member.name)
+                if not member.isfile() or parsed is None:
+                    continue
+                key, artifact = parsed
+                if key not in items and len(items) >= settings.BATCH_UPLOAD_MAX_SIZE:
+                    raise BatchTooLargeError()
+                item = items.setdefault(key, {})
+                if artifact in item:
+                    raise InvalidArchiveError()
+                if (
+                    artifact == GeneratorArtifact.metadata
+                    and member.size > settings.BATCH_METADATA_MAX_SIZE
+                ):
+                    raise MetadataTooLargeError()
+                member_file = archive.extractfile(member)
+                if artifact == GeneratorArtifact.metadata:
+                    item[artifact] = member_file.read()
+                else:
+                    item[artifact] = stage_file(member_file, suffix=".onnx")
+    except tarfile.TarError as exc:
+        discard_staged_archive(items)
+        raise InvalidArchiveError() from exc
+    except Exception:
+        discard_staged_archive(items)
+        raise
+    return items
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+from sgde_api.config import settings, BlobCompression
+from sgde_api.exchange.storage import open_blob
+from sgde_api.tracing import operation
+
+BUNDLE_BUILD_ATTEMPTS = 2
+
+
+def get_bundle_cache_path() -> str:
+    """
+    Get the folder where download bundles are cached.
+    :return: path of the bundle cache folder
+    """
+    bundle_cache_path = os.path.join(settings.GENERATOR_PATH, ".bundles")
+    os.makedirs(bundle_cache_path, exist_ok=True)
+    return bundle_cache_path
+
+
+def get_bundle_filename(generator) -> str:
+    """
+    Get the filename of a generator's zip bundle, as seen by clients.
+    :param generator: GeneratorDB object
+    :return: filename of the bundle
+    """
+    return f"{generator.owner}_{generator.name}.zip"
+
+
+def get_bundle_key(generator) -> str:
+    """
+    Get the cache key of a generator's bundle. Generators never change after
+    upload, so the key only depends on the bundle's entries and on whether they
+    are compressed.
+    :param generator: GeneratorDB object
+    :return: hex digest identifying the bundle
+    """
+    key = "/".join(
+        [
+            settings.BLOB_COMPRESSION.value,
+            generator.owner,
+            generator.name,
+            generator.gen_onnx_file,
+            generator.cls_onnx_file or "",
+            generator.json_file,
+        ]
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def build_bundle(generator, bundle_path: str):
+    """
+    Zip a generator's ONNX and JSON files. The zip is written next to its final
+    location and atomically renamed, so readers never see a partial bundle.
+    Entries are deflated at BLOB_COMPRESSION_LEVEL if BLOB_COMPRESSION is set.
+    :param generator: GeneratorDB object
+    :param bundle_path: path of the bundle
+    """
+    prefix = f"{generator.owner}_{generator.name}"
+    entries = [(generator.gen_onnx_file, f"{prefix}_gen.onnx")]
+    if generator.cls_onnx_file:
+        entries.append((generator.cls_onnx_file, f"{prefix}_cls.onnx"))
+    entries.append((generator.json_file, f"{prefix}.json"))
+    if settings.BLOB_COMPRESSION == BlobCompression.NONE:
+        compression = {"compression": zipfile.ZIP_STORED}
+    else:
+        compression = {
+            "compression": zipfile.ZIP_DEFLATED,
+            "compresslevel": settings.BLOB_COMPRESSION_LEVEL,
+        }
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(bundle_path), suffix=".tmp", delete=False
+    ) as temp_zip:
+        try:
+            with zipfile.ZipFile(temp_zip, "w", **compression) as zipf:
+                for digest, arcname in entries:
+                    with open_blob(digest) as src, zipf.open(arcname, "w") as dst:
+                        shutil.copyfileobj(src, dst, settings.UPLOAD_CHUNK_SIZE)
+        except Exception:
+            temp_zip.close()
+            os.unlink(temp_zip.name)
+            raise
+    os.replace(temp_zip.name, bundle_path)
+
+
+def get_decoded_blob(digest: str) -> str:
+    """
+    Get the path of the uncompressed copy of a blob compressed at rest, for
+    clients that do not accept its content coding. The copy is decompressed on
+    the first request and cached with the bundles.
+    :param digest: hex digest of the blob
+    :return: path of the uncompressed copy
+    """
+    decoded_path = os.path.join(get_bundle_cache_path(), f"{digest}.blob")
+    try:
+        stat_result = os.stat(decoded_path)
+        os.utime(decoded_path, (time.time(), stat_result.st_mtime))
+    except FileNotFoundError:
+        with tempfile.NamedTemporaryFile(
+            dir=get_bundle_cache_path(), suffix=".tmp", delete=False
+        ) as dst:
+            try:
+                with open_blob(digest) as src:
+                    shutil.copyfileobj(src, dst, settings.UPLOAD_CHUNK_SIZE)
+            except Exception:
+                dst.close()
+                os.unlink(dst.name)
+                raise
+        os.replace(dst.name, decoded_path)
+        evict_bundles(keep=decoded_path)
+    return decoded_path
+
+
+def evict_bundles(keep: str):
+    """
+    Evict the least recently used bundles and decoded blobs until the cache
+    fits in BUNDLE_CACHE_SIZE. The access time of a file is its last use.
+    Files used in the last BUNDLE_EVICTION_GRACE seconds are never evicted,
+    since a request may be about to send them, so the cache can temporarily
+    exceed its size under heavy load.
+    :param keep: path of a bundle that must not be evicted
+    """
+    grace_start = time.time() - settings.BUNDLE_EVICTION_GRACE
+    bundles = []
+    with os.scandir(get_bundle_cache_path()) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith((".zip", ".blob")):
+                stat_result = entry.stat()
+                bundles.append((stat_result.st_atime, stat_result.st_size, entry.path))
+    total_size = sum(size for _, size, _ in bundles)
+    for last_used, size, path in sorted(bundles):
+        if total_size <= settings.BUNDLE_CACHE_SIZE:
+            break
+        if path == keep or last_used > grace_start:
+            continue
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+def get_bundle(generator) -> tuple[str, str]:
+    """
+    Get the path of a generator's zip bundle, building and caching it on the
+    first request. Its access time is refreshed, so that it is not evicted
+    before it is sent; if it is evicted right after being built, it is built
+    again, up to BUNDLE_BUILD_ATTEMPTS times.
+    :param generator: GeneratorDB object
+    :return: path and ETag of the bundle
+    """
+    key = get_bundle_key(generator)
+    bundle_path = os.path.join(get_bundle_cache_path(), f"{key}.zip")
+    for builds in range(BUNDLE_BUILD_ATTEMPTS + 1):
+        try:
+            stat_result = os.stat(bundle_path)
+            os.utime(bundle_path, (time.time(), stat_result.st_mtime))
+            return bundle_path, f'"{key}"'
+        except FileNotFoundError:
+            if builds == BUNDLE_BUILD_ATTEMPTS:
+                raise
+        with operation("build_bundle"):
+            build_bundle(generator, bundle_path)
+        evict_bundles(keep=bundle_path)
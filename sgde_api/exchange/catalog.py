@@ -0,0 +1,85 @@
+import calendar
+import threading
+import uuid
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from sgde_api.database import GeneratorTable
+
+
+class Catalog:
+    """
+    Validators of the generator catalog. Generators are only ever added, so the
+    state of the catalog is identified by the number of generators and the
+    largest id, read from the database with a single aggregate query: every
+    worker process and replica derives the same validators. Generators never
+    change after upload, hence their validators are remembered in the process
+    after the first lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generators: dict[str, tuple[str, float]] = {}
+
+    def reset(self):
+        """
+        Forget every remembered generator validator.
+        """
+        with self._lock:
+            self._generators.clear()
+
+    async def get_state(self, db: AsyncSession) -> tuple[str, float]:
+        """
+        Get the version of the catalog and its modification timestamp, i.e.,
+        the creation date of the last generator. The timestamp has the
+        one-second resolution of Last-Modified, so clients should prefer the
+        ETag to tell apart uploads made in the same second.
+        :param db: database session
+        :return: version string and modification timestamp
+        """
+        count, last_id, last_created_at = (
+            await db.execute(
+                select(
+                    func.count(GeneratorTable.id),
+                    func.max(GeneratorTable.id),
+                    func.max(GeneratorTable.created_at),
+                )
+            )
+        ).one()
+        last_modified = (
+            calendar.timegm(last_created_at.utctimetuple()) if last_created_at else 0
+        )
+        return f"{count}-{last_id or 0}", last_modified
+
+    @staticmethod
+    def etag(version: str, query: str = "") -> str:
+        """
+        Get the ETag of a catalog listing.
+        :param version: version of the catalog, as returned by get_state
+        :param query: canonical query string of the listing
+        :return: weak ETag
+        """
+        suffix = f"-{uuid.uuid5(uuid.NAMESPACE_URL, query).hex[:8]}" if query else ""
+        return f'W/"{version}{suffix}"'
+
+    def get_generator_validators(self, name: str) -> tuple[str, float] | None:
+        """
+        Get the remembered validators of a generator.
+        :param name: name of the generator
+        :return: ETag and modification timestamp, or None if unknown
+        """
+        return self._generators.get(name)
+
+    def remember_generator(self, name: str, etag: str, last_modified: float):
+        """
+        Remember the validators of a generator.
+        :param name: name of the generator
+        :param etag: ETag of the generator
+        :param last_modified: modification timestamp of the generator
+        """
+        with self._lock:
+            self._generators[name] = (etag, last_modified)
+
+
+catalog = Catalog()
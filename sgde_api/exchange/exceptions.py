@@ -5,6 +5,10 @@ class GeneratorNotFound(NotFound):
     DETAIL = "Generator not found"
 
 
+class ArtifactNotFound(NotFound):
+    DETAIL = "Artifact not found"
+
+
 class GeneratorExists(BadRequest):
     DETAIL = "Generator already exists"
 
@@ -19,3 +23,51 @@ class FileWritingError(BadRequest):
 
 class InvalidJSONError(BadRequest):
     DETAIL = "Invalid JSON file"
+
+
+class InvalidCursorError(BadRequest):
+    DETAIL = "Invalid pagination cursor"
+
+
+class InvalidArchiveError(BadRequest):
+    DETAIL = "Invalid generator archive"
+
+
+class BatchTooLargeError(BadRequest):
+    DETAIL = "Too many generators in the archive"
+
+
+class MetadataTooLargeError(BadRequest):
+    DETAIL = "JSON file too large in the archive"
+
+
+class MissingMetadataError(BadRequest):
+    DETAIL = "Missing JSON file"
+
+
+class MissingONNXError(BadRequest):
+    DETAIL = "Missing generator ONNX file"
+
+
+class BatchAbortedError(BadRequest):
+    DETAIL = "Not created, since other generators in the batch are invalid"
+
+
+class LookupTooLargeError(BadRequest):
+    DETAIL = "Too many generators to look up; use the paginated catalog"
+
+
+class InvalidSearchQueryError(BadRequest):
+    DETAIL = "The search query contains no words"
+
+
+class InvalidExtraFilterError(BadRequest):
+    DETAIL = "Invalid filter on the extra metadata"
+
+
+class VariantNotFound(NotFound):
+    DETAIL = "Variant not found"
+
+
+class UnsupportedVariantError(BadRequest):
+    DETAIL = "This variant is not supported by the server"
@@ -1,67 +1,231 @@
-from fastapi import APIRouter, Query, Depends, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import (
+    APIRouter,
+    Query,
+    Depends,
+    UploadFile,
+    File,
+    Header,
+    BackgroundTasks,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
+from starlette.responses import Response
 
-from sgde_api.auth.utils import get_current_user, parse_jwt_user_data_required, JWTData
+from sgde_api.auth.utils import parse_jwt_user_data_required, JWTData
+from sgde_api.config import settings
 from sgde_api.database import get_db
-from sgde_utils.schemas import Generator, User
+from sgde_utils.schemas import (
+    Generator,
+    GeneratorFilter,
+    GeneratorSort,
+    GeneratorArtifact,
+    GeneratorUploadResult,
+    GeneratorLookup,
+    GeneratorVariant,
+    GeneratorVariantInfo,
+)
 from sgde_api.exchange.utils import (
-    get_generator_by_name_required,
+    get_generator_if_modified,
     create_generator,
+    create_generators,
     download_generator,
-    get_generators,
+    download_generator_artifact,
+    get_generators_if_modified,
+    lookup_generators,
+    search_generators,
+    parse_generator_filter,
+    schedule_generator_variants,
+    get_generator_variants,
 )
 
 router = APIRouter()
 
 
 @router.get("/generators/", response_model=list[Generator])
-def exchange_get_generators(
-    db: Session = Depends(get_db),
+async def exchange_get_generators(
+    response: Response,
+    filters: GeneratorFilter = Depends(parse_generator_filter),
+    sort: GeneratorSort = Query(default=GeneratorSort.created),
+    limit: int = Query(
+        default=settings.CATALOG_PAGE_SIZE, ge=1, le=settings.CATALOG_MAX_PAGE_SIZE
+    ),
+    cursor: str | None = Query(default=None),
+    if_none_match: str | None = Header(default=None),
+    if_modified_since: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Returns a page of the available generators matching the given filters.
+    """
+    return await get_generators_if_modified(
+        db=db,
+        response=response,
+        filters=filters,
+        sort=sort,
+        limit=limit,
+        cursor=cursor,
+        if_none_match=if_none_match,
+        if_modified_since=if_modified_since,
+    )
+
+
+@router.post("/generators/lookup", response_model=list[Generator])
+async def exchange_lookup_generators(
+    lookup: GeneratorLookup,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Returns the metadata of many generators, by name and/or by filter.
+    """
+    return await lookup_generators(db=db, lookup=lookup)
+
+
+@router.get("/generators/search", response_model=list[Generator])
+async def exchange_search_generators(
+    response: Response,
+    q: str = Query(min_length=1),
+    filters: GeneratorFilter = Depends(parse_generator_filter),
+    limit: int = Query(
+        default=settings.CATALOG_PAGE_SIZE, ge=1, le=settings.CATALOG_MAX_PAGE_SIZE
+    ),
+    offset: int = Query(default=0, ge=0),
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    Returns the list of all the available generators.
+    Returns a page of the generators matching a full-text query, by relevance.
     """
-    return get_generators(db=db)
+    generators, next_offset = await search_generators(
+        db=db, text_query=q, filters=filters, limit=limit, offset=offset
+    )
+    if next_offset is not None:
+        response.headers["x-next-offset"] = str(next_offset)
+    return generators
 
 
 @router.get("/generators/{name}", response_model=Generator)
-def exchange_get_generator(name: str = Query(), db: Session = Depends(get_db)):
+async def exchange_get_generator(
+    response: Response,
+    name: str = Query(),
+    if_none_match: str | None = Header(default=None),
+    if_modified_since: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+):
     """
     Returns the metadata of a specific generator.
     """
-    return get_generator_by_name_required(db=db, name=name)
+    return await get_generator_if_modified(
+        db=db,
+        name=name,
+        response=response,
+        if_none_match=if_none_match,
+        if_modified_since=if_modified_since,
+    )
 
 
 @router.post(
     "/exchange/upload", status_code=status.HTTP_201_CREATED, response_model=Generator
 )
-def exchange_generator_upload(
-    current_user: User = Depends(get_current_user),
+async def exchange_generator_upload(
+    background_tasks: BackgroundTasks,
+    jwt_data: JWTData = Depends(parse_jwt_user_data_required),
     gen_onnx_file: UploadFile = File(),
     cls_onnx_file: UploadFile = File(default=None),
     json_file: UploadFile = File(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Uploads a new generator to the server.
     """
-    return create_generator(
+    generator = await create_generator(
         db=db,
-        username=current_user.username,
+        username=jwt_data.username,
         gen_onnx_file=gen_onnx_file,
         cls_onnx_file=cls_onnx_file,
         json_file=json_file,
     )
+    schedule_generator_variants(background_tasks, db, [generator.name])
+    return generator
+
+
+@router.post(
+    "/exchange/upload/batch",
+    status_code=status.HTTP_201_CREATED,
+    response_model=list[GeneratorUploadResult],
+)
+async def exchange_generator_upload_batch(
+    background_tasks: BackgroundTasks,
+    jwt_data: JWTData = Depends(parse_jwt_user_data_required),
+    archive: UploadFile = File(),
+    atomic: bool = Query(default=False),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Uploads many generators to the server from a tar stream.
+    """
+    results = await create_generators(
+        db=db, username=jwt_data.username, archive=archive, atomic=atomic
+    )
+    names = [result.generator.name for result in results if result.created]
+    schedule_generator_variants(background_tasks, db, names)
+    return results
+
+
+@router.get("/generators/{name}/variants", response_model=list[GeneratorVariantInfo])
+async def exchange_get_generator_variants(
+    name: str = Query(),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Returns the ONNX variants derived from the artifacts of a generator.
+    """
+    return await get_generator_variants(db=db, name=name)
 
 
 @router.get("/generators/{name}/download", response_model=Generator)
-def exchange_generator_download(
+async def exchange_generator_download(
     name: str = Query(),
+    if_none_match: str | None = Header(default=None),
+    range_header: str | None = Header(default=None, alias="range"),
+    if_range: str | None = Header(default=None),
     _: JWTData = Depends(parse_jwt_user_data_required),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Downloads the ONNX and JSON files of a generator.
     """
-    return download_generator(db=db, name=name)
+    return await download_generator(
+        db=db,
+        name=name,
+        if_none_match=if_none_match,
+        range_header=range_header,
+        if_range=if_range,
+    )
+
+
+@router.get("/generators/{name}/download/{artifact}")
+async def exchange_generator_artifact_download(
+    name: str = Query(),
+    artifact: GeneratorArtifact = Query(),
+    if_none_match: str | None = Header(default=None),
+    range_header: str | None = Header(default=None, alias="range"),
+    if_range: str | None = Header(default=None),
+    variant: GeneratorVariant | None = Query(default=None),
+    accept_encoding: str | None = Header(default=None),
+    _: JWTData = Depends(parse_jwt_user_data_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Downloads a single artifact of a generator: the generator's ONNX file, the
+    classifier's ONNX file, or the JSON metadata file. ONNX files can also be
+    downloaded as one of the variants derived by the server.
+    """
+    return await download_generator_artifact(
+        db=db,
+        name=name,
+        artifact=artifact,
+        if_none_match=if_none_match,
+        range_header=range_header,
+        if_range=if_range,
+        accept_encoding=accept_encoding,
+        variant=variant,
+    )
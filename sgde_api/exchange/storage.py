@@ -0,0 +1,282 @@
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from typing import BinaryIO
+
+from fastapi import UploadFile
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from sgde_api.config import settings, BlobCompression
+from sgde_api.database import BlobTable
+
+
+def get_staging_path() -> str:
+    """
+    Get the folder where uploads are staged before being moved to their final
+    location. It lives inside the generator folder so that the final move is an
+    atomic rename on the same file system.
+    :return: path of the staging folder
+    """
+    staging_path = os.path.join(settings.GENERATOR_PATH, ".staging")
+    os.makedirs(staging_path, exist_ok=True)
+    return staging_path
+
+
+def stage_upload_file(upload_file: UploadFile, suffix: str = "") -> tuple[str, str]:
+    """
+    Copy an uploaded file to the staging folder in fixed-size chunks, computing
+    its SHA-256 digest on the fly. Memory usage is bounded by the chunk size.
+    :param upload_file: UploadFile object to copy
+    :param suffix: suffix of the staged file
+    :return: path of the staged file and its hex digest
+    """
+    return stage_file(upload_file.file, suffix)
+
+
+def stage_file(file: BinaryIO, suffix: str = "") -> tuple[str, str]:
+    """
+    Copy a file object to the staging folder in fixed-size chunks, computing
+    its SHA-256 digest on the fly.
+    :param file: file object to copy
+    :param suffix: suffix of the staged file
+    :return: path of the staged file and its hex digest
+    """
+    sha256 = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(
+        dir=get_staging_path(), suffix=suffix, delete=False
+    ) as staged_file:
+        try:
+            while chunk := file.read(settings.UPLOAD_CHUNK_SIZE):
+                sha256.update(chunk)
+                staged_file.write(chunk)
+        except Exception:
+            staged_file.close()
+            os.unlink(staged_file.name)
+            raise
+    return staged_file.name, sha256.hexdigest()
+
+
+def get_blob_path(digest: str) -> str:
+    """
+    Get the path of a blob given its SHA-256 digest. Blobs are sharded in two
+    levels of sub-folders named after the first bytes of the digest.
+    :param digest: hex digest of the blob
+    :return: path of the blob
+    """
+    return os.path.join(settings.GENERATOR_PATH, digest[:2], digest[2:4], digest)
+
+
+def get_compressed_blob_path(digest: str) -> str:
+    """
+    Get the path of a blob compressed at rest.
+    :param digest: hex digest of the uncompressed blob
+    :return: path of the compressed blob
+    """
+    return f"{get_blob_path(digest)}.gz"
+
+
+def find_blob(digest: str) -> tuple[str, str | None]:
+    """
+    Find a blob on disk, whether it is stored compressed or not.
+    :param digest: hex digest of the uncompressed blob
+    :return: path of the blob and its content coding, or None if uncompressed
+    """
+    compressed_path = get_compressed_blob_path(digest)
+    if os.path.exists(compressed_path):
+        return compressed_path, BlobCompression.GZIP.value
+    return get_blob_path(digest), None
+
+
+def open_blob(digest: str) -> BinaryIO:
+    """
+    Open a blob for reading its uncompressed bytes.
+    :param digest: hex digest of the blob
+    :return: binary file object
+    """
+    path, encoding = find_blob(digest)
+    return gzip.open(path, "rb") if encoding else open(path, "rb")
+
+
+def stage_blob(digest: str, suffix: str = "") -> str:
+    """
+    Copy the uncompressed bytes of a blob to the staging folder, e.g. to hand
+    it over to a worker process.
+    :param digest: hex digest of the blob
+    :param suffix: suffix of the staged file
+    :return: path of the staged file
+    """
+    with open_blob(digest) as f:
+        staged_path, _ = stage_file(f, suffix=suffix)
+    return staged_path
+
+
+def compress_staged_file(staged_path: str) -> str | None:
+    """
+    Compress a staged file with gzip at BLOB_COMPRESSION_LEVEL. Files that do
+    not shrink below BLOB_COMPRESSION_MIN_RATIO of their size, e.g. dense float
+    weights, are kept uncompressed, so they are never decompressed in vain.
+    :param staged_path: path of the staged file
+    :return: path of the compressed staged file, or None if not worth it
+    """
+    compressed_path = f"{staged_path}.gz"
+    with open(staged_path, "rb") as src, gzip.open(
+        compressed_path, "wb", compresslevel=settings.BLOB_COMPRESSION_LEVEL
+    ) as dst:
+        shutil.copyfileobj(src, dst, settings.UPLOAD_CHUNK_SIZE)
+    ratio = os.path.getsize(compressed_path) / max(os.path.getsize(staged_path), 1)
+    if ratio >= settings.BLOB_COMPRESSION_MIN_RATIO:
+        os.unlink(compressed_path)
+        return None
+    return compressed_path
+
+
+def move_to_blob_store(staged_path: str, digest: str):
+    """
+    Move a staged file into the blob store, compressing it if BLOB_COMPRESSION
+    is enabled. If a blob with the same digest already exists, the staged file
+    is discarded and the blob is touched, so that sweep_blob_store keeps it
+    while it is being referenced. Concurrent moves of the same digest are safe,
+    since blobs are only ever replaced atomically by identical contents.
+    This is blocking, so it must run in an executor.
+    :param staged_path: path of the staged file
+    :param digest: hex digest of the staged file
+    """
+    existing_path = find_blob(digest)[0]
+    if os.path.exists(existing_path):
+        os.unlink(staged_path)
+        os.utime(existing_path)
+        return
+    blob_path = get_blob_path(digest)
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    if settings.BLOB_COMPRESSION == BlobCompression.GZIP:
+        try:
+            compressed_path = compress_staged_file(staged_path)
+        except Exception:
+            if os.path.exists(f"{staged_path}.gz"):
+                os.unlink(f"{staged_path}.gz")
+            raise
+        if compressed_path:
+            os.replace(compressed_path, get_compressed_blob_path(digest))
+            os.unlink(staged_path)
+            return
+    os.replace(staged_path, blob_path)
+
+
+def sweep_blob_store(referenced: set[str], grace: float) -> int:
+    """
+    Remove the blobs that no committed row references, e.g. those left behind
+    by failed uploads. Blobs modified in the last grace seconds are kept, since
+    uploads in progress store their blobs before committing their references.
+    This is blocking, so it must run in an executor.
+    :param referenced: digests of the referenced blobs
+    :param grace: minimum age in seconds of the removed blobs
+    :return: number of removed blobs
+    """
+    removed = 0
+    deadline = time.time() - grace
+    for root, dirs, files in os.walk(settings.GENERATOR_PATH):
+        # staging and bundle folders are not part of the blob store
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for filename in files:
+            digest = filename.removesuffix(".gz")
+            if digest in referenced:
+                continue
+            blob_path = os.path.join(root, filename)
+            try:
+                if os.stat(blob_path).st_mtime < deadline:
+                    os.unlink(blob_path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+async def collect_unreferenced_blobs(db: AsyncSession) -> int:
+    """
+    Remove the unreferenced blobs older than BLOB_SWEEP_GRACE seconds.
+    :param db: database session
+    :return: number of removed blobs
+    """
+    referenced = set((await db.scalars(select(BlobTable.digest))).all())
+    return await run_in_threadpool(
+        sweep_blob_store, referenced, settings.BLOB_SWEEP_GRACE
+    )
+
+
+def upsert_blob_ref(dialect_name: str, digest: str, size: int, count: int):
+    """
+    Build the statement taking references to a blob: the blob row is inserted,
+    or its reference count is incremented in place if it already exists, so
+    that concurrent uploads of the same blob neither conflict nor lose counts.
+    :param dialect_name: name of the database dialect
+    :param digest: hex digest of the blob
+    :param size: size of the blob in bytes
+    :param count: number of references to take
+    :return: insert statement
+    """
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    statement = dialect.insert(BlobTable).values(
+        digest=digest, size=size, ref_count=count
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[BlobTable.digest],
+        set_={"ref_count": BlobTable.ref_count + statement.excluded.ref_count},
+    )
+
+
+class BlobReferences:
+    """
+    Blobs stored on behalf of a database transaction. Files are moved into the
+    blob store first, without touching the database; the references are then
+    taken at once by add_to, right before the transaction commits, so that the
+    write lock of the database is held for as short as possible. If the
+    transaction fails, its blobs are left on disk, since a concurrent upload
+    of the same contents may be about to reference them; collect_unreferenced_blobs
+    removes them later.
+    """
+
+    def __init__(self):
+        self.sizes: dict[str, int] = {}
+        self.counts: dict[str, int] = {}
+
+    async def store(self, staged_path: str, digest: str) -> str:
+        """
+        Move a staged file into the blob store. If a blob with the same digest
+        already exists, the staged file is discarded.
+        :param staged_path: path of the staged file
+        :param digest: hex digest of the staged file
+        :return: digest of the stored blob
+        """
+        size = os.path.getsize(staged_path)
+        await run_in_threadpool(move_to_blob_store, staged_path, digest)
+        self.sizes[digest] = size
+        self.counts[digest] = self.counts.get(digest, 0) + 1
+        return digest
+
+    async def store_bytes(self, contents: bytes) -> str:
+        """
+        Store an in-memory object in the blob store.
+        :param contents: bytes to store
+        :return: digest of the stored blob
+        """
+        with tempfile.NamedTemporaryFile(dir=get_staging_path(), delete=False) as f:
+            f.write(contents)
+        return await self.store(f.name, hashlib.sha256(contents).hexdigest())
+
+    async def add_to(self, db: AsyncSession):
+        """
+        Take the references to the stored blobs in a database session. They
+        are not committed.
+        :param db: database session
+        """
+        dialect_name = db.bind.dialect.name
+        for digest, count in self.counts.items():
+            await db.execute(
+                upsert_blob_ref(dialect_name, digest, self.sizes[digest], count)
+            )
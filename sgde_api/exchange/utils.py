@@ -1,25 +1,105 @@
+import asyncio
+import base64
+import calendar
+import hashlib
 import json
 import os
+import re
 import tempfile
-import uuid
-import zipfile
+from datetime import datetime
 
-import onnx
-from fastapi import UploadFile
-from sqlalchemy.orm import Session
-from starlette.responses import FileResponse
+from fastapi import UploadFile, Depends, Query, BackgroundTasks
+from pydantic import Field
+from sqlalchemy import (
+    or_,
+    select,
+    insert,
+    event,
+    Select,
+    column,
+    func,
+    table,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
 
-from sgde_api.config import settings
-from sgde_api.database import GeneratorTable
-from sgde_api.exceptions import InternalServerError
+from sgde_api.cache import generator_cache
+from sgde_api.config import settings, SUPPORTED_ONNX_VARIANTS
+from sgde_api.database import (
+    SessionLocal,
+    GeneratorTable,
+    GeneratorExtraTable,
+    GeneratorVariantTable,
+    GENERATOR_SEARCH_TABLE,
+    GENERATOR_SEARCH_COLUMNS,
+)
+from sgde_api.exceptions import (
+    DetailedHTTPException,
+    InternalServerError,
+    ServiceUnavailable,
+)
+from sgde_api.executors import validation_executor, variant_executor
+from sgde_api.metrics import operation_duration
+from sgde_api.tracing import operation, span
+from sgde_api.responses import (
+    RangeFileResponse,
+    accepts_encoding,
+    is_not_modified,
+    not_modified_response,
+    set_validators,
+)
+from sgde_api.exchange.catalog import catalog
+from sgde_api.exchange.batch import stage_archive, discard_staged_archive
+from sgde_api.exchange.bundles import (
+    get_bundle,
+    get_bundle_filename,
+    get_decoded_blob,
+)
+from sgde_api.exchange.validation import check_onnx_file
+from sgde_api.exchange.variants import build_onnx_variant
+from sgde_api.exchange.storage import (
+    BlobReferences,
+    stage_upload_file,
+    find_blob,
+    open_blob,
+    stage_blob,
+    get_staging_path,
+)
 from sgde_api.exchange.exceptions import (
     GeneratorNotFound,
     GeneratorExists,
     InvalidONNXError,
     FileWritingError,
     InvalidJSONError,
+    InvalidCursorError,
+    ArtifactNotFound,
+    MissingMetadataError,
+    MissingONNXError,
+    BatchAbortedError,
+    LookupTooLargeError,
+    InvalidSearchQueryError,
+    InvalidExtraFilterError,
+    VariantNotFound,
+    UnsupportedVariantError,
+)
+from sgde_utils.schemas import (
+    GeneratorExtended,
+    Generator,
+    GeneratorFilter,
+    GeneratorFilterBase,
+    GeneratorSort,
+    GeneratorArtifact,
+    GeneratorUploadResult,
+    GeneratorLookup,
+    GeneratorVariant,
 )
-from sgde_utils.schemas import GeneratorExtended, Generator
+
+# SQLite builds before 3.32 accept at most 999 parameters per statement
+LOOKUP_CHUNK_SIZE = 500
+SEARCH_WEIGHTS = {"name": 10.0, "data_name": 5.0, "data_description": 1.0}
+SEARCH_TOKEN_PATTERN = re.compile(r"\w+")
 
 
 class GeneratorDB(Generator):
@@ -31,72 +111,570 @@ class GeneratorDB(Generator):
     cls_onnx_file: str | None
     json_file: str
     has_cls: bool
+    created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
-def get_generator_by_name(db: Session, name: str) -> GeneratorDB | None:
+async def get_generator_by_name(db: AsyncSession, name: str) -> GeneratorDB | None:
     """
-    Get a generator by its name. If it does not exist, return None.
+    Get a generator by its name. If it does not exist, return None. Found
+    generators are served from the generator cache until they expire.
     :param db: database session
     :param name: name of the generator
     :return: a single GeneratorDB object or None
     """
-    return db.query(GeneratorTable).filter_by(name=name).first()
+    generator = generator_cache.get(name)
+    if generator is None:
+        db_generator = await db.scalar(
+            select(GeneratorTable).filter_by(name=name).limit(1)
+        )
+        if db_generator is None:
+            return None
+        generator = GeneratorDB.from_orm(db_generator)
+        generator_cache.set(name, generator)
+    return generator
 
 
-def get_generator_by_name_required(db: Session, name: str) -> GeneratorDB:
+async def get_generator_by_name_required(db: AsyncSession, name: str) -> GeneratorDB:
     """
     Get a generator by its name. If it does not exist, raise an exception.
     :param db: database session
     :param name: name of the generator
     :return: a single GeneratorDB object
     """
-    generator = get_generator_by_name(db, name)
+    generator = await get_generator_by_name(db, name)
     if not generator:
         raise GeneratorNotFound()
     return generator
 
 
-def get_generators(db: Session) -> list[GeneratorDB]:
+def filter_generators(query: Select, filters: GeneratorFilter) -> Select:
+    """
+    Restrict a generator query to the generators matching a filter.
+    :param query: query on the generator table
+    :param filters: GeneratorFilter object
+    :return: the filtered query
+    """
+    for name in ["data_structure", "data_length", "task", "metric", "owner"]:
+        value = getattr(filters, name)
+        if value is not None:
+            query = query.filter(getattr(GeneratorTable, name) == value)
+    if filters.has_cls is not None:
+        query = query.filter(GeneratorTable.has_cls.is_(filters.has_cls))
+    for name in ["best_score", "best_score_real"]:
+        min_value = getattr(filters, f"min_{name}")
+        max_value = getattr(filters, f"max_{name}")
+        if min_value is not None:
+            query = query.filter(getattr(GeneratorTable, name) >= min_value)
+        if max_value is not None:
+            query = query.filter(getattr(GeneratorTable, name) <= max_value)
+    for key, value in (filters.extra or {}).items():
+        extras = select(GeneratorExtraTable.generator_id).filter_by(key=key)
+        if value is not None:
+            extras = extras.filter_by(value=encode_extra_value(value))
+        query = query.filter(GeneratorTable.id.in_(extras))
+    return query
+
+
+def encode_extra_value(value: str | int | float | list) -> str:
+    """
+    Encode a value of the extra metadata of a generator as canonical JSON, so
+    that equal values have equal encodings. Integral floats are encoded as
+    integers, so that e.g. 100 and 100.0 match.
+    :param value: value of an extra key
+    :return: canonical JSON string
+    """
+
+    def normalize(item):
+        if isinstance(item, float) and item.is_integer():
+            return int(item)
+        return item
+
+    if isinstance(value, list):
+        value = [normalize(item) for item in value]
+    return json.dumps(normalize(value), separators=(",", ":"))
+
+
+def get_extra_metadata(generator_create: GeneratorExtended) -> dict:
+    """
+    Get the extra metadata of a generator, i.e., the keys of its JSON file that
+    have no column in the generator table.
+    :param generator_create: metadata of the generator
+    :return: dictionary of the extra keys and their values
+    """
+    return {
+        key: value
+        for key, value in generator_create.dict().items()
+        if key not in GeneratorExtended.__fields__
+    }
+
+
+def parse_generator_filter(
+    filters: GeneratorFilterBase = Depends(),
+    extra: list[str] | None = Query(default=None),
+) -> GeneratorFilter:
+    """
+    Build a generator filter from the query parameters of a request. Extra keys
+    are given as key=value, where the value is parsed as JSON if possible and
+    taken as a string otherwise, or as a bare key to match its presence.
+    :param filters: filter on the generator columns
+    :param extra: filters on the extra metadata
+    :return: GeneratorFilter object
+    """
+    if not extra:
+        return GeneratorFilter(**filters.dict())
+    extra_filters = {}
+    for item in extra:
+        key, separator, raw_value = item.partition("=")
+        if not key:
+            raise InvalidExtraFilterError()
+        if not separator:
+            extra_filters[key] = None
+            continue
+        try:
+            extra_filters[key] = json.loads(raw_value)
+        except ValueError:
+            extra_filters[key] = raw_value
+    try:
+        return GeneratorFilter(**filters.dict(), extra=extra_filters)
+    except ValueError as exc:
+        raise InvalidExtraFilterError() from exc
+
+
+def encode_cursor(value, last_id: int) -> str:
+    """
+    Encode the position of the last generator of a page as an opaque cursor.
+    :param value: value of the sorting column of the last generator
+    :param last_id: id of the last generator
+    :return: cursor string
     """
-    Get a list of generators.
+    return base64.urlsafe_b64encode(json.dumps([value, last_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Decode a cursor produced by encode_cursor.
+    :param cursor: cursor string
+    :return: value of the sorting column and id of the last generator
+    """
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError as exc:
+        raise InvalidCursorError() from exc
+    if not isinstance(last_id, int) or isinstance(value, (list, dict)):
+        raise InvalidCursorError()
+    return value, last_id
+
+
+def paginate_generators(
+    query: Select, sort: GeneratorSort, cursor: str | None
+) -> list[Select]:
+    """
+    Sort a generator query and move it past a cursor (keyset pagination). Ties
+    are broken by id; missing values come first in ascending order and last in
+    descending order. Generators with and without a value are read by separate
+    queries, so that each of them seeks on the index of the sorting column
+    instead of scanning it.
+    :param query: query on the generator table
+    :param sort: sorting order
+    :param cursor: cursor of the previous page, or None for the first page
+    :return: the sorted queries, to be read one after the other
+    """
+    descending = sort.value.startswith("-")
+    column_name = sort.value.lstrip("-")
+    id_column = GeneratorTable.id
+    id_order = id_column.desc() if descending else id_column
+    if column_name == "created":
+        if cursor:
+            _, last_id = decode_cursor(cursor)
+            query = query.filter(
+                id_column < last_id if descending else id_column > last_id
+            )
+        return [query.order_by(id_order)]
+
+    sort_column = getattr(GeneratorTable, column_name)
+    missing = query.filter(sort_column.is_(None)).order_by(id_order)
+    present = query.filter(sort_column.is_not(None)).order_by(
+        sort_column.desc() if descending else sort_column, id_order
+    )
+    if not cursor:
+        return [present, missing] if descending else [missing, present]
+    value, last_id = decode_cursor(cursor)
+    if value is None:
+        missing = missing.filter(
+            id_column < last_id if descending else id_column > last_id
+        )
+        return [missing] if descending else [missing, present]
+    # the first bound lets the database seek on the index of the column
+    if descending:
+        present = present.filter(
+            sort_column <= value, or_(sort_column < value, id_column < last_id)
+        )
+        return [present, missing]
+    present = present.filter(
+        sort_column >= value, or_(sort_column > value, id_column > last_id)
+    )
+    return [present]
+
+
+async def get_generators_page(
+    db: AsyncSession,
+    filters: GeneratorFilter,
+    sort: GeneratorSort = GeneratorSort.created,
+    limit: int = settings.CATALOG_PAGE_SIZE,
+    cursor: str | None = None,
+) -> tuple[list[GeneratorDB], str | None]:
+    """
+    Get a page of generators matching a filter.
     :param db: database session
-    :return: a list of GeneratorDB objects
+    :param filters: GeneratorFilter object
+    :param sort: sorting order
+    :param limit: maximum number of generators in the page
+    :param cursor: cursor of the previous page, or None for the first page
+    :return: a list of GeneratorDB objects and the cursor of the next page
     """
-    return db.query(GeneratorTable).offset(0).all()
+    query = filter_generators(select(GeneratorTable), filters)
+    generators = []
+    for part in paginate_generators(query, sort, cursor):
+        generators += await db.scalars(part.limit(limit + 1 - len(generators)))
+        if len(generators) > limit:
+            break
+    if len(generators) <= limit:
+        return generators, None
+    generators = generators[:limit]
+    column_name = sort.value.lstrip("-")
+    last = generators[-1]
+    value = None if column_name == "created" else getattr(last, column_name)
+    return generators, encode_cursor(value, last.id)
 
 
-def save_generator_file(generator_name: str, upload_file: UploadFile) -> str:
+async def lookup_generators(
+    db: AsyncSession, lookup: GeneratorLookup
+) -> list[GeneratorDB]:
+    """
+    Get many generators with a single query, by name and/or by filter. Names
+    are looked up with an IN clause, split in chunks to stay within the
+    parameter limit of the database. The found generators warm the generator
+    cache.
+    :param db: database session
+    :param lookup: GeneratorLookup object
+    :return: a list of GeneratorDB objects, in the order of the names if given,
+        otherwise by name
     """
-    Save a generator's ONNX file on the server.
-    :param generator_name: name of the generator
+    max_size = settings.BULK_LOOKUP_MAX_SIZE
+    query = select(GeneratorTable)
+    if lookup.filter is not None:
+        query = filter_generators(query, lookup.filter)
+
+    if lookup.names is None:
+        query = query.order_by(GeneratorTable.name).limit(max_size + 1)
+        db_generators = list(await db.scalars(query))
+        if len(db_generators) > max_size:
+            raise LookupTooLargeError()
+    else:
+        names = list(dict.fromkeys(lookup.names))
+        if len(names) > max_size:
+            raise LookupTooLargeError()
+        db_generators = []
+        for i in range(0, len(names), LOOKUP_CHUNK_SIZE):
+            chunk = names[i : i + LOOKUP_CHUNK_SIZE]
+            db_generators += await db.scalars(
+                query.filter(GeneratorTable.name.in_(chunk))
+            )
+        positions = {name: i for i, name in enumerate(names)}
+        db_generators.sort(key=lambda generator: positions[generator.name])
+
+    generators = [GeneratorDB.from_orm(generator) for generator in db_generators]
+    for generator in generators:
+        generator_cache.set(generator.name, generator)
+    return generators
+
+
+def build_search_query(text_query: str) -> list[str]:
+    """
+    Split a free text query in the terms of a search. Only word characters are
+    kept, so that the query cannot inject FTS5 operators.
+    :param text_query: free text query
+    :return: a list of lowercase terms
+    """
+    terms = SEARCH_TOKEN_PATTERN.findall(text_query.lower())
+    if not terms:
+        raise InvalidSearchQueryError()
+    return terms
+
+
+async def search_generators(
+    db: AsyncSession,
+    text_query: str,
+    filters: GeneratorFilter,
+    limit: int = settings.CATALOG_PAGE_SIZE,
+    offset: int = 0,
+) -> tuple[list[GeneratorDB], int | None]:
+    """
+    Search the generators whose name, dataset name or dataset description
+    contain all the terms of a query, as words or word prefixes. On SQLite the
+    FTS5 index is used and results are ranked by relevance (BM25, matches in
+    the name weigh the most); on other backends the text columns are scanned
+    and results are sorted by name.
+    :param db: database session
+    :param text_query: free text query
+    :param filters: GeneratorFilter object
+    :param limit: maximum number of generators in the page
+    :param offset: number of results to skip
+    :return: a list of GeneratorDB objects and the offset of the next page
+    """
+    terms = build_search_query(text_query)
+    query = filter_generators(select(GeneratorTable), filters)
+    if db.bind.dialect.name == "sqlite":
+        search_table = table(GENERATOR_SEARCH_TABLE, column("rowid"))
+        match = " ".join(f'"{term}"*' for term in terms)
+        weights = [SEARCH_WEIGHTS[name] for name in GENERATOR_SEARCH_COLUMNS]
+        query = (
+            query.join(search_table, search_table.c.rowid == GeneratorTable.id)
+            .filter(text(f"{GENERATOR_SEARCH_TABLE} MATCH :match"))
+            .params(match=match)
+            .order_by(
+                func.bm25(text(GENERATOR_SEARCH_TABLE), *weights), GeneratorTable.id
+            )
+        )
+    else:
+        for term in terms:
+            query = query.filter(
+                or_(
+                    *[
+                        getattr(GeneratorTable, name).ilike(f"%{term}%")
+                        for name in GENERATOR_SEARCH_COLUMNS
+                    ]
+                )
+            )
+        query = query.order_by(GeneratorTable.name)
+    generators = list(await db.scalars(query.offset(offset).limit(limit + 1)))
+    if len(generators) <= limit:
+        return generators, None
+    return generators[:limit], offset + limit
+
+
+def compute_generator_validators(generator: GeneratorDB) -> tuple[str, float]:
+    """
+    Compute the HTTP validators of a generator's metadata. Generators never
+    change after upload, so they only depend on the stored row.
+    :param generator: GeneratorDB object
+    :return: ETag and modification timestamp
+    """
+    key = "/".join(
+        [generator.name, generator.owner, generator.json_file, str(generator.has_cls)]
+    )
+    etag = f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+    return etag, calendar.timegm(generator.created_at.utctimetuple())
+
+
+async def get_generator_if_modified(
+    db: AsyncSession,
+    name: str,
+    response: Response,
+    if_none_match: str | None = None,
+    if_modified_since: str | None = None,
+) -> GeneratorDB | Response:
+    """
+    Get a generator by its name, unless the client copy is still valid. Known
+    generators are validated without querying the database.
+    :param db: database session
+    :param name: name of the generator
+    :param response: response whose validators are set
+    :param if_none_match: value of the If-None-Match request header
+    :param if_modified_since: value of the If-Modified-Since request header
+    :return: a single GeneratorDB object or a 304 Response
+    """
+    validators = catalog.get_generator_validators(name)
+    if validators and is_not_modified(*validators, if_none_match, if_modified_since):
+        return not_modified_response(*validators)
+    generator = await get_generator_by_name_required(db, name)
+    validators = compute_generator_validators(generator)
+    catalog.remember_generator(name, *validators)
+    set_validators(response, *validators)
+    return generator
+
+
+async def get_generators_if_modified(
+    db: AsyncSession,
+    response: Response,
+    filters: GeneratorFilter,
+    sort: GeneratorSort = GeneratorSort.created,
+    limit: int = settings.CATALOG_PAGE_SIZE,
+    cursor: str | None = None,
+    if_none_match: str | None = None,
+    if_modified_since: str | None = None,
+) -> list[GeneratorDB] | Response:
+    """
+    Get a page of generators, unless the catalog did not change since the
+    client copy. The cursor of the next page is set in the X-Next-Cursor header.
+    :param db: database session
+    :param response: response whose headers are set
+    :param filters: GeneratorFilter object
+    :param sort: sorting order
+    :param limit: maximum number of generators in the page
+    :param cursor: cursor of the previous page, or None for the first page
+    :param if_none_match: value of the If-None-Match request header
+    :param if_modified_since: value of the If-Modified-Since request header
+    :return: a list of GeneratorDB objects or a 304 Response
+    """
+    query = json.dumps(
+        [filters.dict(exclude_none=True), sort, limit, cursor], sort_keys=True
+    )
+    version, last_modified = await catalog.get_state(db)
+    etag = catalog.etag(version, query)
+    if is_not_modified(etag, last_modified, if_none_match, if_modified_since):
+        return not_modified_response(etag, last_modified)
+    generators, next_cursor = await get_generators_page(
+        db, filters, sort, limit, cursor
+    )
+    set_validators(response, etag, last_modified)
+    if next_cursor:
+        response.headers["x-next-cursor"] = next_cursor
+    return generators
+
+
+async def save_generator_file(blobs: BlobReferences, upload_file: UploadFile) -> str:
+    """
+    Save a generator's ONNX file on the server. The file is streamed to the
+    staging folder, validated by path in the validation executor, and moved to
+    the blob store; the database is not touched. The durations of the whole and
+    of each step are observed.
+    :param blobs: blobs stored by the upload
     :param upload_file: UploadFile object containing the generator's ONNX file
+    :return: digest of the stored ONNX file
     """
 
-    filename = f"{generator_name}_{uuid.uuid4()}.onnx"
+    with operation("save_generator_file"):
+        staged_path = None
+        try:
+            with operation("stage_upload_file"):
+                staged_path, digest = await run_in_threadpool(
+                    stage_upload_file, upload_file, ".onnx"
+                )
+            with span("onnx_check_model"):
+                operation_duration.observe(
+                    await validation_executor.run(check_onnx_file, staged_path),
+                    "onnx_check_model",
+                )
+            with operation("store_blob"):
+                await blobs.store(staged_path, digest)
+            staged_path = None
+
+        except ValueError as exc:
+            raise InvalidONNXError() from exc
+        except ServiceUnavailable:
+            raise
+        except Exception as exc:
+            raise FileWritingError() from exc
+        finally:
+            await upload_file.close()
+            if staged_path:
+                os.unlink(staged_path)
+    return digest
+
+
+def parse_generator_metadata(contents: bytes) -> GeneratorExtended:
+    """
+    Parse the JSON file of a generator.
+    :param contents: contents of the JSON file
+    :return: GeneratorExtended object
+    """
     try:
-        contents = upload_file.file.read()
-        onnx.checker.check_model(contents)
-        with open(os.path.join(settings.GENERATOR_PATH, filename), "wb") as f:
-            f.write(contents)
+        return GeneratorExtended(**json.loads(contents))
+    except json.JSONDecodeError as exc:
+        raise InvalidJSONError from exc
+    except (ValueError, TypeError) as exc:
+        raise InvalidJSONError from exc
 
-    except onnx.checker.ValidationError as exc:
-        raise InvalidONNXError() from exc
-    except Exception as exc:
-        raise FileWritingError() from exc
-    finally:
-        upload_file.file.close()
-    return filename
+
+def build_generator_row(
+    generator_create: GeneratorExtended,
+    username: str,
+    gen_onnx_digest: str,
+    cls_onnx_digest: str | None,
+    json_digest: str,
+) -> GeneratorTable:
+    """
+    Build the database row of a new generator.
+    :param generator_create: metadata of the generator
+    :param username: username of the generator's owner
+    :param gen_onnx_digest: digest of the generator's ONNX file
+    :param cls_onnx_digest: digest of the classifier's ONNX file, if any
+    :param json_digest: digest of the generator's JSON file
+    :return: GeneratorTable object
+    """
+    db_generator = GeneratorDB(
+        **generator_create.dict(),
+        owner=username,
+        gen_onnx_file=gen_onnx_digest,
+        cls_onnx_file=cls_onnx_digest,
+        json_file=json_digest,
+        has_cls=cls_onnx_digest is not None,
+    )
+    return GeneratorTable(
+        **db_generator.dict(),
+        extras_rel=[
+            GeneratorExtraTable(key=key, value=encode_extra_value(value))
+            for key, value in get_extra_metadata(generator_create).items()
+        ],
+    )
 
 
-def create_generator(
-    db: Session,
+async def store_generator_metadata(
+    blobs: BlobReferences, generator_create: GeneratorExtended
+) -> str:
+    """
+    Store the normalized JSON file of a generator in the blob store.
+    :param blobs: blobs stored by the upload
+    :param generator_create: metadata of the generator
+    :return: digest of the stored JSON file
+    """
+    return await blobs.store_bytes(
+        json.dumps(generator_create.dict(), indent=2).encode()
+    )
+
+
+def index_generator_extras(target, connection, **kwargs):
+    """
+    Fill the extra metadata table from the JSON files of the generators, when
+    it is created in a database that already has generators. Generators whose
+    JSON file is missing or invalid are skipped.
+    """
+    rows = []
+    for generator_id, json_file in connection.execute(
+        select(GeneratorTable.id, GeneratorTable.json_file)
+    ):
+        try:
+            with open_blob(json_file) as f:
+                generator_create = parse_generator_metadata(f.read())
+        except (OSError, InvalidJSONError):
+            continue
+        rows += [
+            {
+                "generator_id": generator_id,
+                "key": key,
+                "value": encode_extra_value(value),
+            }
+            for key, value in get_extra_metadata(generator_create).items()
+        ]
+    if rows:
+        connection.execute(insert(GeneratorExtraTable), rows)
+
+
+event.listen(GeneratorExtraTable.__table__, "after_create", index_generator_extras)
+
+
+async def create_generator(
+    db: AsyncSession,
     username: str,
     gen_onnx_file: UploadFile,
     cls_onnx_file: UploadFile,
     json_file: UploadFile,
 ) -> GeneratorDB:
     """
-    Create a new generator on the server.
+    Create a new generator on the server. Every file is staged, validated and
+    moved to the blob store before the database is written, so that the blob
+    references and the generator are committed in a single short transaction.
     :param db: database session
     :param username: username of the generator's owner
     :param gen_onnx_file: ONNX file of the generator
@@ -104,78 +682,385 @@ def create_generator(
     :param json_file: JSON file of the generator
     :return: the created GeneratorDB object
     """
-    try:
-        model_dict = json.loads(json_file.file.read())
-        generator_create = GeneratorExtended(**model_dict)
-    except json.JSONDecodeError as exc:
-        raise InvalidJSONError from exc
-    except ValueError as exc:
-        raise InvalidJSONError from exc
+    generator_create = parse_generator_metadata(await json_file.read())
 
-    if get_generator_by_name(db, generator_create.name):
+    if await get_generator_by_name(db, generator_create.name):
         raise GeneratorExists()
 
-    json_file_name = f"{generator_create.name}_{uuid.uuid4()}.json"
-    with open(os.path.join(settings.GENERATOR_PATH, json_file_name), "w") as f:
-        json.dump(generator_create.dict(), f, indent=2)
-
-    gen_onnx_file_path = save_generator_file(generator_create.name, gen_onnx_file)
-    cls_onnx_file_path = (
-        save_generator_file(generator_create.name, cls_onnx_file)
-        if cls_onnx_file
-        else None
-    )
+    blobs = BlobReferences()
+    try:
+        gen_onnx_digest = await save_generator_file(blobs, gen_onnx_file)
+        cls_onnx_digest = (
+            await save_generator_file(blobs, cls_onnx_file) if cls_onnx_file else None
+        )
+        json_digest = await store_generator_metadata(blobs, generator_create)
 
-    db_generator = GeneratorDB(
-        **generator_create.dict(),
-        owner=username,
-        gen_onnx_file=gen_onnx_file_path,
-        cls_onnx_file=cls_onnx_file_path,
-        json_file=json_file_name,
-        has_cls=cls_onnx_file is not None,
-    )
-    db_generator = GeneratorTable(**db_generator.dict())
-    db.add(db_generator)
-    db.commit()
-    db.refresh(db_generator)
+        db_generator = build_generator_row(
+            generator_create, username, gen_onnx_digest, cls_onnx_digest, json_digest
+        )
+        with operation("commit_generator"):
+            await blobs.add_to(db)
+            db.add(db_generator)
+            await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    generator_cache.invalidate(db_generator.name)
+    await db.refresh(db_generator)
     return db_generator
 
 
-def download_generator(db: Session, name: str) -> FileResponse:
+async def validate_archive_item(item: dict, semaphore: asyncio.Semaphore):
+    """
+    Validate the staged ONNX files of an archive item in the validation
+    executor.
+    :param item: item returned by stage_archive
+    :param semaphore: semaphore bounding the validations run at once by a batch
+    """
+    async with semaphore:
+        for artifact in [GeneratorArtifact.gen, GeneratorArtifact.cls]:
+            if artifact in item:
+                with span("onnx_check_model"):
+                    operation_duration.observe(
+                        await validation_executor.run(
+                            check_onnx_file, item[artifact][0]
+                        ),
+                        "onnx_check_model",
+                    )
+
+
+async def create_generators(
+    db: AsyncSession, username: str, archive: UploadFile, atomic: bool = False
+) -> list[GeneratorUploadResult]:
     """
-    Download a generator's ONNX and JSON files from the server.
+    Create many generators on the server from a tar stream. The ONNX files are
+    validated in parallel, the files of the valid generators are moved to the
+    blob store, and their blob references and rows are committed in a single
+    transaction.
     :param db: database session
-    :param name: name of the generator
-    :return: FileResponse zip containing the generator's ONNX and JSON files
+    :param username: username of the generators' owner
+    :param archive: tar stream of the generators, named as in the download bundles
+    :param atomic: if True, no generator is created when any of them is invalid
+    :return: list of the outcomes of the generators, in archive order
     """
-    generator = get_generator_by_name_required(db, name)
-    gen_onnx_path = os.path.join(settings.GENERATOR_PATH, generator.gen_onnx_file)
-    json_path = os.path.join(settings.GENERATOR_PATH, generator.json_file)
+    try:
+        items = await run_in_threadpool(stage_archive, archive.file)
+    finally:
+        await archive.close()
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as temp_zip:
-        try:
-            with zipfile.ZipFile(temp_zip.name, "w") as zipf:
-                zipf.write(
-                    gen_onnx_path, f"{generator.owner}_{generator.name}_gen.onnx"
+    blobs = BlobReferences()
+    try:
+        errors, valid = {}, {}
+        for key, item in items.items():
+            try:
+                if GeneratorArtifact.metadata not in item:
+                    raise MissingMetadataError()
+                if GeneratorArtifact.gen not in item:
+                    raise MissingONNXError()
+                generator_create = parse_generator_metadata(
+                    item[GeneratorArtifact.metadata]
+                )
+                if generator_create.name in [g.name for g in valid.values()]:
+                    raise GeneratorExists()
+                if await get_generator_by_name(db, generator_create.name):
+                    raise GeneratorExists()
+            except DetailedHTTPException as exc:
+                errors[key] = exc.detail
+                continue
+            valid[key] = generator_create
+
+        semaphore = asyncio.Semaphore(validation_executor.max_workers)
+        outcomes = await asyncio.gather(
+            *[validate_archive_item(items[key], semaphore) for key in valid],
+            return_exceptions=True,
+        )
+        for key, outcome in zip(list(valid), outcomes):
+            if isinstance(outcome, ValueError):
+                errors[key] = InvalidONNXError.DETAIL
+                del valid[key]
+            elif isinstance(outcome, BaseException):
+                raise outcome
+
+        created = {}
+        if valid and not (atomic and errors):
+            for key, generator_create in valid.items():
+                item = items[key]
+                json_digest = await store_generator_metadata(blobs, generator_create)
+                gen_onnx_digest = await blobs.store(*item[GeneratorArtifact.gen])
+                cls_onnx_digest = (
+                    await blobs.store(*item[GeneratorArtifact.cls])
+                    if GeneratorArtifact.cls in item
+                    else None
+                )
+                created[key] = build_generator_row(
+                    generator_create,
+                    username,
+                    gen_onnx_digest,
+                    cls_onnx_digest,
+                    json_digest,
+                )
+            with operation("commit_generator"):
+                await blobs.add_to(db)
+                db.add_all(created.values())
+                await db.commit()
+            for db_generator in created.values():
+                generator_cache.invalidate(db_generator.name)
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await run_in_threadpool(discard_staged_archive, items)
+
+    results = []
+    for key in items:
+        if key in created:
+            results.append(
+                GeneratorUploadResult(
+                    key=key, created=True, generator=Generator.from_orm(created[key])
                 )
-                if generator.cls_onnx_file:
-                    cls_onnx_path = os.path.join(
-                        settings.GENERATOR_PATH, generator.cls_onnx_file
-                    )
-                    zipf.write(
-                        cls_onnx_path, f"{generator.owner}_{generator.name}_cls.onnx"
-                    )
-                zipf.write(json_path, f"{generator.owner}_{generator.name}.json")
-            response = FileResponse(
-                temp_zip.name, filename=f"{generator.owner}_{generator.name}.zip"
             )
-        except Exception as exc:
-            os.unlink(temp_zip.name)
-            raise InternalServerError() from exc
+        else:
+            detail = errors.get(key, BatchAbortedError.DETAIL)
+            results.append(GeneratorUploadResult(key=key, created=False, detail=detail))
+    return results
 
-    def delete_temp_file():
-        os.unlink(temp_zip.name)
 
-    response.on_send = delete_temp_file
+async def create_generator_variant(
+    db: AsyncSession,
+    generator_id: int,
+    artifact: GeneratorArtifact,
+    variant: GeneratorVariant,
+    source_path: str,
+):
+    """
+    Derive a variant of an ONNX artifact in the variant executor, store it in
+    the blob store, and commit the outcome of its parity check in a short
+    transaction of its own. Variants that cannot be built, e.g. because of an
+    unsupported operator or a full variant queue, are skipped.
+    :param db: database session
+    :param generator_id: id of the generator
+    :param artifact: artifact the variant is derived from
+    :param variant: variant to derive
+    :param source_path: path of the staged artifact
+    """
+    tolerances = {
+        GeneratorVariant.optimized: settings.ONNX_OPTIMIZED_TOLERANCE,
+    }
+    with tempfile.NamedTemporaryFile(
+        dir=get_staging_path(), suffix=".onnx", delete=False
+    ) as f:
+        target_path = f.name
+    try:
+        variant_digest, max_abs_error = await variant_executor.run(
+            build_onnx_variant,
+            source_path,
+            target_path,
+            variant.value,
+            settings.ONNX_PARITY_RUNS,
+        )
+    except (ValueError, ServiceUnavailable):
+        os.unlink(target_path)
+        return
+    blobs = BlobReferences()
+    try:
+        await blobs.store(target_path, variant_digest)
+        await blobs.add_to(db)
+        db.add(
+            GeneratorVariantTable(
+                generator_id=generator_id,
+                artifact=artifact.value,
+                variant=variant.value,
+                digest=variant_digest,
+                max_abs_error=max_abs_error,
+                parity_ok=max_abs_error <= tolerances[variant],
+            )
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
 
-    return response
+
+async def create_generator_variants(bind: AsyncEngine, names: list[str]):
+    """
+    Derive the ONNX variants enabled by ONNX_VARIANTS from the artifacts of new
+    generators. It runs after the upload response is sent, in a session of its
+    own, so that no transaction stays open while the variants are built.
+    :param bind: database engine of the upload request
+    :param names: names of the new generators
+    """
+    async with SessionLocal(bind=bind) as db:
+        async with db.begin():
+            rows = (
+                await db.execute(
+                    select(
+                        GeneratorTable.id,
+                        GeneratorTable.gen_onnx_file,
+                        GeneratorTable.cls_onnx_file,
+                    ).filter(GeneratorTable.name.in_(names))
+                )
+            ).all()
+        for generator_id, gen_onnx_digest, cls_onnx_digest in rows:
+            artifacts = {
+                GeneratorArtifact.gen: gen_onnx_digest,
+                GeneratorArtifact.cls: cls_onnx_digest,
+            }
+            for artifact, digest in artifacts.items():
+                if digest is None:
+                    continue
+                source_path = await run_in_threadpool(stage_blob, digest, ".onnx")
+                try:
+                    for variant in settings.ONNX_VARIANTS:
+                        await create_generator_variant(
+                            db, generator_id, artifact, variant, source_path
+                        )
+                finally:
+                    os.unlink(source_path)
+
+
+def schedule_generator_variants(
+    background_tasks: BackgroundTasks, db: AsyncSession, names: list[str]
+):
+    """
+    Schedule the derivation of the ONNX variants of new generators after the
+    upload response, if any variant is enabled.
+    :param background_tasks: background tasks of the upload request
+    :param db: database session of the upload request
+    :param names: names of the new generators
+    """
+    if settings.ONNX_VARIANTS and names:
+        background_tasks.add_task(create_generator_variants, db.bind, names)
+
+
+async def get_generator_variants(
+    db: AsyncSession, name: str
+) -> list[GeneratorVariantTable]:
+    """
+    Get the ONNX variants derived from the artifacts of a generator.
+    :param db: database session
+    :param name: name of the generator
+    :return: a list of GeneratorVariantTable objects
+    """
+    await get_generator_by_name_required(db, name)
+    query = (
+        select(GeneratorVariantTable)
+        .join(GeneratorTable, GeneratorTable.id == GeneratorVariantTable.generator_id)
+        .filter(GeneratorTable.name == name)
+        .order_by(GeneratorVariantTable.artifact, GeneratorVariantTable.variant)
+    )
+    return list(await db.scalars(query))
+
+
+async def download_generator(
+    db: AsyncSession,
+    name: str,
+    if_none_match: str | None = None,
+    range_header: str | None = None,
+    if_range: str | None = None,
+) -> Response:
+    """
+    Download a generator's ONNX and JSON files from the server. The zip bundle
+    is built on the first request and served from the bundle cache afterwards,
+    so partial downloads can be resumed with a Range request.
+    :param db: database session
+    :param name: name of the generator
+    :param if_none_match: value of the If-None-Match request header
+    :param range_header: value of the Range request header
+    :param if_range: value of the If-Range request header
+    :return: RangeFileResponse zip containing the generator's ONNX and JSON files
+    """
+    generator = await get_generator_by_name_required(db, name)
+    try:
+        bundle_path, etag = await run_in_threadpool(get_bundle, generator)
+    except Exception as exc:
+        raise InternalServerError() from exc
+
+    if is_not_modified(etag, if_none_match=if_none_match):
+        return not_modified_response(etag)
+    return RangeFileResponse(
+        bundle_path,
+        range_header=range_header,
+        if_range=if_range,
+        filename=get_bundle_filename(generator),
+        headers={"etag": etag},
+    )
+
+
+async def download_generator_artifact(
+    db: AsyncSession,
+    name: str,
+    artifact: GeneratorArtifact,
+    if_none_match: str | None = None,
+    range_header: str | None = None,
+    if_range: str | None = None,
+    accept_encoding: str | None = None,
+    variant: GeneratorVariant | None = None,
+) -> Response:
+    """
+    Download a single artifact of a generator, or one of its ONNX variants,
+    straight from the blob store. Blobs are content-addressed, so their digest
+    is a strong ETag. Blobs compressed at rest are sent as they are to clients
+    accepting their content coding, and decompressed once for the other clients.
+    :param db: database session
+    :param name: name of the generator
+    :param artifact: artifact to download
+    :param if_none_match: value of the If-None-Match request header
+    :param range_header: value of the Range request header
+    :param if_range: value of the If-Range request header
+    :param accept_encoding: value of the Accept-Encoding request header
+    :param variant: variant of the artifact, or None for the uploaded artifact
+    :return: RangeFileResponse of the artifact
+    """
+    generator = await get_generator_by_name_required(db, name)
+    prefix = f"{generator.owner}_{generator.name}"
+    if artifact == GeneratorArtifact.gen:
+        digest, filename = generator.gen_onnx_file, f"{prefix}_gen.onnx"
+    elif artifact == GeneratorArtifact.cls:
+        digest, filename = generator.cls_onnx_file, f"{prefix}_cls.onnx"
+    else:
+        digest, filename = generator.json_file, f"{prefix}.json"
+    if digest is None:
+        raise ArtifactNotFound()
+    if variant is not None:
+        if variant not in SUPPORTED_ONNX_VARIANTS:
+            raise UnsupportedVariantError()
+        digest = await db.scalar(
+            select(GeneratorVariantTable.digest)
+            .join(
+                GeneratorTable, GeneratorTable.id == GeneratorVariantTable.generator_id
+            )
+            .filter(
+                GeneratorTable.name == name,
+                GeneratorVariantTable.artifact == artifact.value,
+                GeneratorVariantTable.variant == variant.value,
+            )
+        )
+        if digest is None:
+            raise VariantNotFound()
+        filename = f"{prefix}_{artifact.value}_{variant.value}.onnx"
+
+    blob_path, encoding = await run_in_threadpool(find_blob, digest)
+    headers = {"vary": "accept-encoding"}
+    if encoding and accepts_encoding(accept_encoding, encoding):
+        etag = f'"{digest}.{encoding}"'
+        headers["content-encoding"] = encoding
+    else:
+        etag = f'"{digest}"'
+        if encoding:
+            try:
+                blob_path = await run_in_threadpool(get_decoded_blob, digest)
+            except Exception as exc:
+                raise InternalServerError() from exc
+
+    headers["etag"] = etag
+    if is_not_modified(etag, if_none_match=if_none_match):
+        response = not_modified_response(etag)
+        response.headers["vary"] = headers["vary"]
+        return response
+    return RangeFileResponse(
+        blob_path,
+        range_header=range_header,
+        if_range=if_range,
+        filename=filename,
+        headers=headers,
+    )
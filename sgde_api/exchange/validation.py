@@ -0,0 +1,24 @@
+"""
+Inspection of uploaded models. These functions run in the worker processes of
+the validation executor, so this module must stay cheap to import and its
+results and exceptions must be picklable.
+"""
+
+import time
+
+import onnx
+
+
+def check_onnx_file(path: str) -> float:
+    """
+    Check that a file contains a valid ONNX model.
+    :param path: path of the ONNX file
+    :return: time spent checking the model, in seconds
+    :raise ValueError: if the model is not valid
+    """
+    start = time.perf_counter()
+    try:
+        onnx.checker.check_model(path)
+    except onnx.checker.ValidationError as exc:
+        raise ValueError(str(exc)) from None
+    return time.perf_counter() - start
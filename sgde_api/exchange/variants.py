@@ -0,0 +1,137 @@
+"""
+Derivation of ONNX variants of uploaded models with onnxruntime, an optional
+dependency of the server. These functions run in the worker processes of the
+variant executor, so they only work on file paths, and their results and
+exceptions must be picklable.
+"""
+
+import hashlib
+
+import numpy as np
+
+PARITY_SEED = 0
+DIGEST_CHUNK_SIZE = 1024 * 1024
+INPUT_DTYPES = {
+    "tensor(float)": np.float32,
+    "tensor(double)": np.float64,
+    "tensor(float16)": np.float16,
+    "tensor(int64)": np.int64,
+    "tensor(int32)": np.int32,
+    "tensor(bool)": np.bool_,
+}
+
+
+def create_session(path: str, **options):
+    """
+    Create an onnxruntime inference session on the CPU.
+    :param path: path of the ONNX file
+    :param options: attributes of the session options
+    :return: InferenceSession object
+    """
+    import onnxruntime as rt
+
+    session_options = rt.SessionOptions()
+    session_options.log_severity_level = 3
+    for name, value in options.items():
+        setattr(session_options, name, value)
+    return rt.InferenceSession(
+        path, session_options, providers=["CPUExecutionProvider"]
+    )
+
+
+def optimize_onnx_file(source_path: str, target_path: str):
+    """
+    Save the graph of a model after the offline optimizations of onnxruntime.
+    The extended level is used, since the layout optimizations of the higher
+    level are specific to the hardware of the server.
+    :param source_path: path of the ONNX file
+    :param target_path: path of the optimized ONNX file
+    """
+    import onnxruntime as rt
+
+    create_session(
+        source_path,
+        graph_optimization_level=rt.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        optimized_model_filepath=target_path,
+    )
+
+
+def make_parity_inputs(session, rng: np.random.Generator) -> dict:
+    """
+    Draw random inputs for a model, with dynamic dimensions set to 1. Floats
+    are drawn from a standard normal distribution, like latent vectors, and
+    integers from {0, 1}, like one-hot labels.
+    :param session: InferenceSession object
+    :param rng: random generator
+    :return: dictionary of input names and values
+    """
+    inputs = {}
+    for model_input in session.get_inputs():
+        dtype = INPUT_DTYPES.get(model_input.type)
+        if dtype is None:
+            raise ValueError(f"Unsupported input type {model_input.type}")
+        shape = [dim if isinstance(dim, int) else 1 for dim in model_input.shape]
+        if np.issubdtype(dtype, np.floating):
+            inputs[model_input.name] = rng.standard_normal(shape).astype(dtype)
+        else:
+            inputs[model_input.name] = rng.integers(0, 2, shape).astype(dtype)
+    return inputs
+
+
+def check_parity(source_path: str, variant_path: str, runs: int) -> float:
+    """
+    Compare the outputs of a model and of its variant on the same random
+    inputs. Both models run without graph optimizations, so that the check
+    covers the transformations baked in the variant.
+    :param source_path: path of the original ONNX file
+    :param variant_path: path of the variant ONNX file
+    :param runs: number of random inputs
+    :return: maximum absolute difference between the outputs
+    """
+    import onnxruntime as rt
+
+    disabled = rt.GraphOptimizationLevel.ORT_DISABLE_ALL
+    source = create_session(source_path, graph_optimization_level=disabled)
+    variant = create_session(variant_path, graph_optimization_level=disabled)
+    rng = np.random.default_rng(PARITY_SEED)
+    max_abs_error = 0.0
+    for _ in range(runs):
+        inputs = make_parity_inputs(source, rng)
+        for expected, actual in zip(
+            source.run(None, inputs), variant.run(None, inputs)
+        ):
+            if np.shape(expected) != np.shape(actual):
+                raise ValueError("The variant changes the shape of the outputs")
+            if not np.size(expected):
+                continue
+            error = np.max(np.abs(np.subtract(expected, actual, dtype=np.float64)))
+            max_abs_error = max(max_abs_error, float(np.nan_to_num(error, nan=np.inf)))
+    return max_abs_error
+
+
+def build_onnx_variant(
+    source_path: str, target_path: str, variant: str, runs: int
+) -> tuple[str, float]:
+    """
+    Build a variant of an ONNX model and check its numerical parity with the
+    original model.
+    :param source_path: path of the original ONNX file
+    :param target_path: path of the variant ONNX file
+    :param variant: name of the variant, only "optimized" is supported
+    :param runs: number of random inputs of the parity check
+    :return: hex digest of the variant, and the maximum absolute difference
+        between the outputs of the two models
+    :raise ValueError: if the variant cannot be built or run
+    """
+    try:
+        if variant != "optimized":
+            raise ValueError(f"Unsupported variant {variant}")
+        optimize_onnx_file(source_path, target_path)
+        max_abs_error = check_parity(source_path, target_path, runs)
+    except Exception as exc:
+        raise ValueError(str(exc)) from None
+    sha256 = hashlib.sha256()
+    with open(target_path, "rb") as f:
+        while chunk := f.read(DIGEST_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest(), max_abs_error
@@ -0,0 +1,195 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from sgde_api.config import settings
+from sgde_api.exceptions import ServiceUnavailable
+from sgde_api.metrics import metrics
+
+
+class BoundedExecutor:
+    """
+    Executor with a bounded number of pending tasks. A task is in flight while
+    a worker runs it and queued while it waits for a free worker; once the
+    queue is full, new tasks are rejected with ServiceUnavailable instead of
+    making every request wait longer. The wrapped executor is created on first
+    use, so importing this module does not start any worker. If a worker
+    process dies, e.g. killed by the OOM killer or crashed by a native library,
+    the broken pool is replaced and its tasks fail with ServiceUnavailable.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        max_queue: int,
+        retry_after: int,
+        executor_factory: Callable[[int], Executor] | None = None,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor_factory = executor_factory or (
+            lambda workers: ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        )
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        metrics.gauge(
+            f"sgde_{name}_in_flight",
+            f"Number of {name} tasks being run by a worker",
+            lambda: self.in_flight,
+        )
+        metrics.gauge(
+            f"sgde_{name}_queue_depth",
+            f"Number of {name} tasks waiting for a free worker",
+            lambda: self.queue_depth,
+        )
+        self._rejected = metrics.counter(
+            f"sgde_{name}_rejected_total",
+            f"Number of {name} tasks rejected because the queue was full",
+        )
+        self._restarts = metrics.counter(
+            f"sgde_{name}_restarts_total",
+            f"Number of {name} executors replaced because a worker died",
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return min(self._pending, self.max_workers)
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self._pending - self.max_workers, 0)
+
+    def _task_done(self, _: Future):
+        with self._lock:
+            self._pending -= 1
+
+    def _replace_broken(self, executor: Executor):
+        """
+        Drop a broken executor, so that the next task creates a new one. It is
+        a no-op if the executor was already replaced.
+        :param executor: broken executor
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._restarts.inc()
+        executor.shutdown(wait=False)
+
+    def _unavailable(self) -> ServiceUnavailable:
+        return ServiceUnavailable(headers={"Retry-After": str(self.retry_after)})
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        """
+        Submit a task to the executor.
+        :param fn: function to run; it must be picklable for process executors
+        :param args: arguments of the function
+        :return: Future of the task
+        :raise ServiceUnavailable: if the queue is full
+        """
+        return self._submit(fn, *args)[0]
+
+    def _submit(self, fn: Callable, *args: Any) -> tuple[Future, Executor]:
+        """
+        Submit a task to the executor, replacing it once if it is broken.
+        :param fn: function to run
+        :param args: arguments of the function
+        :return: Future of the task, and the executor running it
+        :raise ServiceUnavailable: if the queue is full
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected.inc()
+                raise self._unavailable()
+            self._pending += 1
+        try:
+            for attempt in range(2):
+                with self._lock:
+                    if self._executor is None:
+                        self._executor = self._executor_factory(self.max_workers)
+                    executor = self._executor
+                try:
+                    future = executor.submit(fn, *args)
+                    break
+                except BrokenProcessPool:
+                    self._replace_broken(executor)
+                    if attempt:
+                        raise self._unavailable()
+        except Exception:
+            self._task_done(None)
+            raise
+        future.add_done_callback(self._task_done)
+        return future, executor
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """
+        Run a task in the executor and wait for its result without blocking the
+        event loop.
+        :param fn: function to run; it must be picklable for process executors
+        :param args: arguments of the function
+        :return: result of the function
+        :raise ServiceUnavailable: if the queue is full, or if a worker died
+        """
+        future, executor = self._submit(fn, *args)
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool as exc:
+            self._replace_broken(executor)
+            raise self._unavailable() from exc
+
+    def shutdown(self, wait: bool = True):
+        """
+        Shut down the wrapped executor. It is created again on the next task.
+        :param wait: wait for the pending tasks to complete
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+validation_executor = BoundedExecutor(
+    "validation",
+    max_workers=settings.VALIDATION_WORKERS,
+    max_queue=settings.VALIDATION_QUEUE_SIZE,
+    retry_after=settings.VALIDATION_RETRY_AFTER,
+)
+variant_executor = BoundedExecutor(
+    "variant",
+    max_workers=settings.VARIANT_WORKERS,
+    max_queue=settings.VARIANT_QUEUE_SIZE,
+    retry_after=settings.VALIDATION_RETRY_AFTER,
+)
+password_executor = BoundedExecutor(
+    "password",
+    max_workers=settings.PASSWORD_WORKERS,
+    max_queue=settings.PASSWORD_QUEUE_SIZE,
+    retry_after=settings.PASSWORD_RETRY_AFTER,
+    executor_factory=lambda workers: ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="password"
+    ),
+)
+generation_executor = BoundedExecutor(
+    "generation",
+    max_workers=settings.GENERATION_WORKERS,
+    max_queue=settings.GENERATION_QUEUE_SIZE,
+    retry_after=settings.GENERATION_RETRY_AFTER,
+    executor_factory=lambda workers: ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="generation"
+    ),
+)
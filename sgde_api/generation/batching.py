@@ -0,0 +1,154 @@
+import asyncio
+from typing import Hashable
+
+import numpy as np
+
+from sgde_api.config import settings
+from sgde_api.executors import BoundedExecutor, generation_executor
+from sgde_api.generation.sampling import generate_batches
+from sgde_api.metrics import metrics
+
+
+class PendingBatch:
+    """
+    Batches waiting to be merged into a single run of the same models.
+    """
+
+    def __init__(self, models: tuple):
+        self.models = models
+        self.items: list[tuple[np.ndarray, np.ndarray, asyncio.Future]] = []
+        self.size = 0
+        self.timer: asyncio.TimerHandle | None = None
+
+
+class MicroBatcher:
+    """
+    Scheduler merging the batches of concurrent generation requests for the
+    same models into a single run, amortizing the per-call overhead of
+    onnxruntime. Batches run right away while no run of their models is in
+    flight, so that sequential requests never wait; otherwise they are
+    gathered until the run in flight ends, until they hold max_batch_size
+    samples, or for at most max_wait seconds. A non-positive wait disables
+    merging. The outputs are split back to each request. Batches are
+    gathered on the event loop, hence the scheduler is not thread-safe, and
+    the runs are submitted to the given executor. The number of runs and of
+    merged batches are exposed as metrics.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_batch_size: int,
+        max_wait: float,
+        executor: BoundedExecutor,
+    ):
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = executor
+        self._pending: dict[Hashable, PendingBatch] = {}
+        self._running: dict[Hashable, int] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._runs = metrics.counter(
+            f"sgde_{name}_runs_total", f"Number of {name} model runs"
+        )
+        self._batches = metrics.counter(
+            f"sgde_{name}_batches_total",
+            f"Number of {name} batches, merged into the model runs",
+        )
+
+    @property
+    def runs(self) -> int:
+        return self._runs.value
+
+    @property
+    def batches(self) -> int:
+        return self._batches.value
+
+    async def run(
+        self, key: Hashable, models: tuple, inputs: np.ndarray, labels: np.ndarray
+    ) -> tuple[bytes, np.ndarray]:
+        """
+        Generate a batch of samples, possibly merged with the batches of other
+        requests for the same models.
+        :param key: key identifying the models, e.g. the digests of their files
+        :param models: inference sessions of the generator and of the
+            classifier, or None
+        :param inputs: inputs of the generator
+        :param labels: labels of the samples
+        :return: NDJSON lines of the accepted samples, and labels of the
+            rejected samples
+        :raise ValueError: if a model cannot be run
+        :raise ServiceUnavailable: if the queue of the executor is full
+        """
+        loop = asyncio.get_running_loop()
+        key = (key, inputs.shape[1:])
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = PendingBatch(models)
+        future = loop.create_future()
+        pending.items.append((inputs, labels, future))
+        pending.size += len(labels)
+        if (
+            pending.size >= self.max_batch_size
+            or self.max_wait <= 0
+            or not self._running.get(key)
+        ):
+            self._flush(key)
+        elif pending.timer is None:
+            pending.timer = loop.call_later(self.max_wait, self._flush, key)
+        return await future
+
+    def _flush(self, key: Hashable):
+        """
+        Start the merged run of the batches pending for some models.
+        :param key: key of the models
+        """
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        if pending.timer is not None:
+            pending.timer.cancel()
+        self._running[key] = self._running.get(key, 0) + 1
+        task = asyncio.create_task(self._run(key, pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Hashable, pending: PendingBatch):
+        """
+        Run the models on the merged batches and resolve the future of each
+        batch with its own outputs, or with the error of the run. The batches
+        gathered in the meantime are flushed once the run ends.
+        :param key: key of the models
+        :param pending: PendingBatch object
+        """
+        futures = [future for _, _, future in pending.items]
+        try:
+            results = await self.executor.run(
+                generate_batches,
+                *pending.models,
+                [(inputs, labels) for inputs, labels, _ in pending.items],
+            )
+        except Exception as exc:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            self._running[key] -= 1
+            if not self._running[key]:
+                del self._running[key]
+            self._flush(key)
+        self._runs.inc()
+        self._batches.inc(len(futures))
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+
+generation_batcher = MicroBatcher(
+    "generation_batcher",
+    max_batch_size=settings.GENERATION_MERGED_BATCH_SIZE,
+    max_wait=settings.GENERATION_BATCH_WAIT,
+    executor=generation_executor,
+)
@@ -0,0 +1,28 @@
+from sgde_api.exceptions import BadRequest, NotFound, NotSupported
+
+
+class GenerationNotSupported(NotSupported):
+    DETAIL = "Sample generation requires onnxruntime on the server"
+
+
+class UnsupportedGeneratorError(BadRequest):
+    DETAIL = (
+        "The generator must be a classification generator declaring latent_dim "
+        "and labels_shape"
+    )
+
+
+class GenerationTooLargeError(BadRequest):
+    DETAIL = "Too many samples requested"
+
+
+class InvalidClassCountsError(BadRequest):
+    DETAIL = "class_counts must have one count per class of the generator"
+
+
+class InvalidModelError(BadRequest):
+    DETAIL = "The generator models cannot be run"
+
+
+class ModelFileNotFound(NotFound):
+    DETAIL = "The files of the generator are missing or unreadable on the server"
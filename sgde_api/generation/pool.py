@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from sgde_api.config import settings
+from sgde_api.executors import BoundedExecutor, generation_executor
+from sgde_api.exchange.storage import open_blob
+from sgde_api.generation.sampling import create_session
+from sgde_api.metrics import metrics
+
+
+class SessionPool:
+    """
+    In-process pool of onnxruntime inference sessions, keyed by the digest of
+    their model, with least-recently-used eviction under a budget of resident
+    bytes. The resident bytes of a session are estimated by the size of its
+    model, which onnxruntime keeps in memory as initializers. Sessions are
+    loaded on the given executor, and concurrent requests for the same model
+    share a single load. Evicted sessions stay usable by the requests holding
+    them. Hits, misses, load time and resident bytes are exposed as metrics.
+    """
+
+    def __init__(self, name: str, max_bytes: int, executor: BoundedExecutor):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.executor = executor
+        self._entries: OrderedDict[str, tuple[int, object]] = OrderedDict()
+        self._loading: dict[str, Future] = {}
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = metrics.counter(
+            f"sgde_{name}_pool_hits_total",
+            f"Number of {name} lookups served by a loaded session",
+        )
+        self._misses = metrics.counter(
+            f"sgde_{name}_pool_misses_total",
+            f"Number of {name} lookups that loaded a session",
+        )
+        self._load_seconds = metrics.counter(
+            f"sgde_{name}_pool_load_seconds_total",
+            f"Time spent loading {name} sessions, in seconds",
+        )
+        metrics.gauge(
+            f"sgde_{name}_pool_sessions",
+            f"Number of loaded {name} sessions",
+            lambda: len(self._entries),
+        )
+        metrics.gauge(
+            f"sgde_{name}_pool_resident_bytes",
+            f"Estimated resident bytes of the loaded {name} sessions",
+            lambda: self.resident_bytes,
+        )
+
+    @property
+    def hits(self) -> int:
+        return self._hits.value
+
+    @property
+    def misses(self) -> int:
+        return self._misses.value
+
+    @property
+    def resident_bytes(self) -> int:
+        return self._resident_bytes
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._entries
+
+    def _load(self, digest: str):
+        """
+        Load the session of a model and add it to the pool, evicting the least
+        recently used sessions beyond the budget. A session larger than the
+        whole budget is returned without being pooled.
+        :param digest: hex digest of the model
+        :return: InferenceSession object
+        :raise ValueError: if the model cannot be loaded
+        :raise OSError: if the model file is missing or unreadable
+        """
+        try:
+            start = time.perf_counter()
+            with open_blob(digest) as f:
+                model = f.read()
+            try:
+                session = create_session(model)
+            except Exception as exc:
+                raise ValueError(str(exc)) from None
+            self._load_seconds.inc(time.perf_counter() - start)
+            size = len(model)
+            with self._lock:
+                if size <= self.max_bytes and digest not in self._entries:
+                    self._entries[digest] = (size, session)
+                    self._resident_bytes += size
+                    while self._resident_bytes > self.max_bytes:
+                        evicted_size, _ = self._entries.popitem(last=False)[1]
+                        self._resident_bytes -= evicted_size
+            return session
+        finally:
+            with self._lock:
+                self._loading.pop(digest, None)
+
+    async def get(self, digest: str):
+        """
+        Get the session of a model, loading it on a miss.
+        :param digest: hex digest of the model
+        :return: InferenceSession object
+        :raise ValueError: if the model cannot be loaded
+        :raise OSError: if the model file is missing or unreadable
+        :raise ServiceUnavailable: if the queue of the executor is full
+        """
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self._hits.inc()
+                return entry[1]
+            self._misses.inc()
+            future = self._loading.get(digest)
+            if future is None:
+                future = self.executor.submit(self._load, digest)
+                self._loading[digest] = future
+        return await asyncio.wrap_future(future)
+
+    def clear(self):
+        """
+        Remove every session from the pool.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._resident_bytes = 0
+
+
+session_pool = SessionPool(
+    "generation_session",
+    max_bytes=settings.GENERATION_SESSION_POOL_SIZE,
+    executor=generation_executor,
+)
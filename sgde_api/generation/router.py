@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Query, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import StreamingResponse
+
+from sgde_api.auth.utils import parse_jwt_user_data_required, JWTData
+from sgde_api.database import get_db
+from sgde_api.generation.utils import generate_samples, NDJSON_MEDIA_TYPE
+from sgde_utils.schemas import GenerationRequest
+
+router = APIRouter()
+
+
+@router.post(
+    "/generators/{name}/generate",
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
+)
+async def generation_generate_samples(
+    request: GenerationRequest,
+    name: str = Query(),
+    _: JWTData = Depends(parse_jwt_user_data_required),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Generates synthetic samples with a generator, streamed as NDJSON.
+    """
+    return await generate_samples(db=db, name=name, request=request)
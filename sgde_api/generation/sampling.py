@@ -0,0 +1,118 @@
+"""
+Generation of synthetic samples with onnxruntime, an optional dependency of the
+server, following the classifier-filtered rejection sampling of the client's
+generate_samples_onnx. These functions run in the threads of the generation
+executor, since onnxruntime releases the GIL while running models, and the
+sessions are shared by concurrent requests through the session pool.
+"""
+
+import json
+
+import numpy as np
+
+
+def create_session(model: bytes):
+    """
+    Create a single-threaded onnxruntime inference session on the CPU; requests
+    run in parallel on the threads of the generation executor instead.
+    :param model: serialized ONNX model
+    :return: InferenceSession object
+    """
+    import onnxruntime as rt
+
+    session_options = rt.SessionOptions()
+    session_options.log_severity_level = 3
+    session_options.intra_op_num_threads = 1
+    session_options.inter_op_num_threads = 1
+    return rt.InferenceSession(
+        model, session_options, providers=["CPUExecutionProvider"]
+    )
+
+
+def spread_labels(class_counts: list[int]) -> np.ndarray:
+    """
+    Get the labels of the samples to generate, interleaving the classes so that
+    every prefix of the stream has about the class proportions of the whole.
+    Equal counts give the labels 0, 1, ..., k - 1, 0, 1, ... of the client.
+    :param class_counts: number of samples of each class
+    :return: array of labels
+    """
+    labels = np.repeat(np.arange(len(class_counts)), class_counts)
+    positions = np.concatenate(
+        [np.arange(count) / count for count in class_counts if count]
+    )
+    return labels[np.argsort(positions, kind="stable")]
+
+
+def make_inputs(
+    labels: np.ndarray, latent_dim: int, rng: np.random.Generator, num_classes: int
+) -> np.ndarray:
+    """
+    Make the inputs of the generator, i.e., standard normal noise concatenated
+    with one-hot labels. The noise is drawn from the random generator of each
+    request, so that seeded requests are reproducible however they are batched.
+    :param labels: labels of the samples
+    :param latent_dim: dimension of the noise
+    :param rng: random generator of the request
+    :param num_classes: number of classes of the generator
+    :return: inputs of the generator
+    """
+    one_hot = np.eye(num_classes, dtype=np.float32)[labels]
+    noise = rng.standard_normal((len(labels), latent_dim), dtype=np.float32)
+    return np.concatenate([noise, one_hot], axis=1)
+
+
+def encode_samples(samples: np.ndarray, labels: np.ndarray) -> bytes:
+    """
+    Encode samples as NDJSON lines with their label.
+    :param samples: array of samples
+    :param labels: labels of the samples
+    :return: NDJSON lines
+    """
+    return b"".join(
+        json.dumps({"label": int(label), "sample": sample.tolist()}).encode() + b"\n"
+        for sample, label in zip(samples, labels)
+    )
+
+
+def generate_batches(
+    generator, classifier, batches: list[tuple[np.ndarray, np.ndarray]]
+) -> list[tuple[bytes, np.ndarray]]:
+    """
+    Generate the samples of several batches with a single run of the models on
+    their concatenated inputs, and keep the samples that the classifier assigns
+    to their label.
+    :param generator: inference session of the generator
+    :param classifier: inference session of the classifier, or None
+    :param batches: inputs of the generator and labels of each batch
+    :return: NDJSON lines of the accepted samples, and labels of the rejected
+        samples, of each batch
+    :raise ValueError: if a model cannot be run
+    """
+    inputs = np.concatenate([batch_inputs for batch_inputs, _ in batches])
+    labels = np.concatenate([batch_labels for _, batch_labels in batches])
+    try:
+        samples = generator.run(None, {generator.get_inputs()[0].name: inputs})[0]
+        accepted = np.ones(len(labels), dtype=bool)
+        if classifier is not None:
+            predictions = classifier.run(
+                None, {classifier.get_inputs()[0].name: samples}
+            )[0]
+            accepted = np.argmax(predictions, axis=1) == labels
+    except Exception as exc:
+        raise ValueError(str(exc)) from None
+    results = []
+    start = 0
+    for _, batch_labels in batches:
+        end = start + len(batch_labels)
+        batch_accepted = accepted[start:end]
+        results.append(
+            (
+                encode_samples(
+                    samples[start:end][batch_accepted], batch_labels[batch_accepted]
+                ),
+                batch_labels[~batch_accepted],
+            )
+        )
+        start = end
+    return results
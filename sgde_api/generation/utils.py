@@ -0,0 +1,258 @@
+import importlib.util
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+import numpy as np
+from sqlalchemy import select, update, insert, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+
+from sgde_api.config import settings
+from sgde_api.database import GeneratorTable, GeneratorUsageTable
+from sgde_api.exceptions import ServiceUnavailable
+from sgde_api.exchange.storage import open_blob
+from sgde_api.exchange.utils import GeneratorDB, get_generator_by_name_required
+from sgde_api.generation.exceptions import (
+    GenerationNotSupported,
+    UnsupportedGeneratorError,
+    GenerationTooLargeError,
+    InvalidClassCountsError,
+    InvalidModelError,
+    ModelFileNotFound,
+)
+from sgde_api.generation.batching import generation_batcher
+from sgde_api.generation.pool import session_pool
+from sgde_api.generation.sampling import spread_labels, make_inputs
+from sgde_api.tracing import span
+from sgde_utils.schemas import GenerationRequest, Task
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def read_blob(digest: str) -> bytes:
+    """
+    Read the uncompressed bytes of a blob.
+    :param digest: hex digest of the blob
+    :return: contents of the blob
+    """
+    with open_blob(digest) as f:
+        return f.read()
+
+
+async def get_generation_shape(generator: GeneratorDB) -> tuple[int, int]:
+    """
+    Get the dimension of the noise and the number of classes of a generator
+    from its JSON file.
+    :param generator: GeneratorDB object
+    :return: dimension of the noise and number of classes
+    """
+    metadata = json.loads(await run_in_threadpool(read_blob, generator.json_file))
+    latent_dim, labels_shape = metadata.get("latent_dim"), metadata.get("labels_shape")
+    if (
+        generator.task != Task.classification
+        or not isinstance(latent_dim, int)
+        or not isinstance(labels_shape, list)
+        or not labels_shape
+        or not isinstance(labels_shape[0], int)
+    ):
+        raise UnsupportedGeneratorError()
+    return latent_dim, labels_shape[0]
+
+
+def get_class_counts(request: GenerationRequest, num_classes: int) -> list[int]:
+    """
+    Get the number of samples to generate for each class, spreading them evenly
+    if only the total is requested.
+    :param request: GenerationRequest object
+    :param num_classes: number of classes of the generator
+    :return: number of samples of each class
+    """
+    if request.class_counts is None:
+        quotient, remainder = divmod(request.num_samples, num_classes)
+        class_counts = [quotient + (i < remainder) for i in range(num_classes)]
+    elif len(request.class_counts) != num_classes:
+        raise InvalidClassCountsError()
+    else:
+        class_counts = request.class_counts
+    if sum(class_counts) > settings.GENERATION_MAX_SAMPLES:
+        raise GenerationTooLargeError()
+    return class_counts
+
+
+async def record_generator_usage(db: AsyncSession, name: str):
+    """
+    Count a generation request of a generator.
+    :param db: database session
+    :param name: name of the generator
+    """
+    generator_id = (
+        select(GeneratorTable.id).where(GeneratorTable.name == name).scalar_subquery()
+    )
+    now = datetime.utcnow()
+    increment = (
+        update(GeneratorUsageTable)
+        .where(GeneratorUsageTable.generator_id == generator_id)
+        .values(generations=GeneratorUsageTable.generations + 1, last_generated_at=now)
+    )
+    if not (await db.execute(increment)).rowcount:
+        try:
+            await db.execute(
+                insert(GeneratorUsageTable).from_select(
+                    ["generator_id", "generations", "last_generated_at"],
+                    select(GeneratorTable.id, literal(1), literal(now)).where(
+                        GeneratorTable.name == name
+                    ),
+                )
+            )
+        except IntegrityError:
+            # a concurrent request inserted the row first
+            await db.rollback()
+            await db.execute(increment)
+    await db.commit()
+
+
+async def warm_up_sessions(db: AsyncSession):
+    """
+    Load the sessions of the GENERATION_WARMUP_SIZE generators that served the
+    most generation requests into the session pool. The most popular ones are
+    loaded last, so that they are the last to be evicted. Models that cannot be
+    loaded are skipped.
+    :param db: database session
+    """
+    if importlib.util.find_spec("onnxruntime") is None:
+        return
+    query = (
+        select(GeneratorTable.gen_onnx_file, GeneratorTable.cls_onnx_file)
+        .join(GeneratorUsageTable)
+        .order_by(GeneratorUsageTable.generations.desc())
+        .limit(settings.GENERATION_WARMUP_SIZE)
+    )
+    for gen_onnx_file, cls_onnx_file in reversed((await db.execute(query)).all()):
+        for digest in [cls_onnx_file, gen_onnx_file]:
+            if digest is None or digest in session_pool:
+                continue
+            try:
+                await session_pool.get(digest)
+            except (ValueError, OSError, ServiceUnavailable):
+                pass
+
+
+def encode_error(detail: str) -> bytes:
+    """
+    Encode an error raised while streaming samples as the last NDJSON line,
+    since the status of the response has already been sent.
+    :param detail: description of the error
+    :return: NDJSON line
+    """
+    return json.dumps({"detail": detail}).encode() + b"\n"
+
+
+async def generate_sample_batches(
+    models: tuple,
+    key: tuple,
+    labels: np.ndarray,
+    latent_dim: int,
+    num_classes: int,
+    seed: int | None,
+) -> AsyncIterator[bytes]:
+    """
+    Generate samples in batches of GENERATION_BATCH_SIZE, which the generation
+    batcher merges with the batches of concurrent requests for the same models.
+    Samples rejected by the classifier are generated again, up to
+    GENERATION_MAX_ATTEMPTS times.
+    :param models: inference sessions of the generator and of the classifier,
+        or None
+    :param key: digests of the models
+    :param labels: labels of the samples
+    :param latent_dim: dimension of the noise
+    :param num_classes: number of classes of the generator
+    :param seed: seed of the noise, or None
+    :return: iterator over the NDJSON lines of the batches
+    """
+    rng = np.random.default_rng(seed)
+    batch_size = settings.GENERATION_BATCH_SIZE
+    for _ in range(settings.GENERATION_MAX_ATTEMPTS):
+        rejected = []
+        for start in range(0, len(labels), batch_size):
+            batch_labels = labels[start : start + batch_size]
+            lines, batch_rejected = await generation_batcher.run(
+                key,
+                models,
+                make_inputs(batch_labels, latent_dim, rng, num_classes),
+                batch_labels,
+            )
+            rejected.append(batch_rejected)
+            yield lines
+        labels = np.concatenate(rejected)
+        if not len(labels):
+            return
+    yield encode_error(
+        f"{len(labels)} samples were rejected by the classifier "
+        f"{settings.GENERATION_MAX_ATTEMPTS} times"
+    )
+
+
+async def generate_samples(
+    db: AsyncSession, name: str, request: GenerationRequest
+) -> StreamingResponse:
+    """
+    Generate synthetic samples with the stored models of a generator, streamed
+    as NDJSON lines with the label and the sample. The sessions of the models
+    are taken from the session pool, so hot generators skip loading entirely.
+    The first batch is generated before the response starts, so that errors get
+    their own status code; later errors end the stream with a line holding
+    their detail. The request is counted once the stream ends.
+    :param db: database session
+    :param name: name of the generator
+    :param request: GenerationRequest object
+    :return: StreamingResponse of the samples
+    """
+    if importlib.util.find_spec("onnxruntime") is None:
+        raise GenerationNotSupported()
+    generator = await get_generator_by_name_required(db, name)
+    try:
+        latent_dim, num_classes = await get_generation_shape(generator)
+    except OSError as exc:
+        raise ModelFileNotFound() from exc
+    labels = spread_labels(get_class_counts(request, num_classes))
+
+    cls_onnx_file = generator.cls_onnx_file if request.filter else None
+    try:
+        with span("load_models"):
+            models = (
+                await session_pool.get(generator.gen_onnx_file),
+                await session_pool.get(cls_onnx_file) if cls_onnx_file else None,
+            )
+        batches = generate_sample_batches(
+            models,
+            (generator.gen_onnx_file, cls_onnx_file),
+            labels,
+            latent_dim,
+            num_classes,
+            request.seed,
+        )
+        first_batch = await batches.__anext__()
+    except ValueError as exc:
+        raise InvalidModelError() from exc
+    except OSError as exc:
+        raise ModelFileNotFound() from exc
+
+    async def stream() -> AsyncIterator[bytes]:
+        yield first_batch
+        try:
+            async for batch in batches:
+                yield batch
+        except ValueError:
+            yield encode_error(InvalidModelError.DETAIL)
+        except ServiceUnavailable as exc:
+            yield encode_error(exc.detail)
+
+    return StreamingResponse(
+        stream(),
+        media_type=NDJSON_MEDIA_TYPE,
+        background=BackgroundTask(record_generator_usage, db, name),
+    )
@@ -3,18 +3,60 @@ import os
 import uvicorn
 from fastapi import FastAPI
 
+from sgde_api.admin.router import router as admin_router
 from sgde_api.auth.router import router as auth_router
 from sgde_api.config import settings
 from sgde_api.exchange.router import router as exchange_router
-from sgde_api.database import Base, engine
+from sgde_api.exchange.storage import collect_unreferenced_blobs
+from sgde_api.generation.router import router as generation_router
+from sgde_api.generation.utils import warm_up_sessions
+from sgde_api.database import Base, engine, SessionLocal
+from sgde_api.executors import (
+    validation_executor,
+    variant_executor,
+    password_executor,
+    generation_executor,
+)
+from sgde_api.metrics import router as metrics_router, MetricsMiddleware
+from sgde_api.tracing import TracingMiddleware
 
 os.makedirs(settings.INSTANCE_PATH, exist_ok=True)
 os.makedirs(settings.GENERATOR_PATH, exist_ok=True)
-Base.metadata.create_all(bind=engine)
 app = FastAPI()
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth_router)
 app.include_router(exchange_router)
+app.include_router(generation_router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
+
+
+@app.on_event("startup")
+async def create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+@app.on_event("startup")
+async def sweep_blob_store():
+    async with SessionLocal() as db:
+        await collect_unreferenced_blobs(db)
+
+
+@app.on_event("startup")
+async def warm_up_generation_sessions():
+    async with SessionLocal() as db:
+        await warm_up_sessions(db)
+
+
+@app.on_event("shutdown")
+def shutdown_executors():
+    validation_executor.shutdown()
+    variant_executor.shutdown()
+    password_executor.shutdown()
+    generation_executor.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,346 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from fastapi import APIRouter
+from starlette.responses import PlainTextResponse
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+# seconds, from sub-millisecond cache hits to slow uploads
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+Sample = tuple[str, dict[str, str], float]
+
+
+class Counter:
+    """
+    Monotonically increasing metric.
+    """
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class LabeledCounter:
+    """
+    Monotonically increasing metric with a value for each combination of
+    label values.
+    """
+
+    def __init__(self, labels: tuple[str, ...]):
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def samples(self) -> list[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        return [("", dict(zip(self.labels, key)), value) for key, value in values]
+
+
+class Histogram:
+    """
+    Distribution of observed values, counted in cumulative buckets for each
+    combination of label values. Observing costs a binary search and an
+    increment under a lock.
+    """
+
+    def __init__(self, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # bucket counts, followed by the count of values above the last bucket
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(label_values)
+            if counts is None:
+                counts = self._counts[label_values] = [0] * (len(self.buckets) + 1)
+                self._sums[label_values] = 0.0
+            counts[index] += 1
+            self._sums[label_values] += value
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        """
+        Observe the time spent in a block of code, in seconds, even if it
+        raises.
+        :param label_values: values of the labels
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def count(self, *label_values: str) -> int:
+        return sum(self._counts.get(label_values, ()))
+
+    def samples(self) -> list[Sample]:
+        with self._lock:
+            series = [
+                (key, list(counts), self._sums[key])
+                for key, counts in self._counts.items()
+            ]
+        samples = []
+        for key, counts, total in series:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append(("_bucket", {**labels, "le": str(bound)}, cumulative))
+            samples.append(("_bucket", {**labels, "le": "+Inf"}, sum(counts)))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, sum(counts)))
+        return samples
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    """
+    Format the labels of a sample in the Prometheus text format.
+    :param labels: dictionary of label names and values
+    :return: labels text, empty if there are no labels
+    """
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class MetricsRegistry:
+    """
+    Registry of the server metrics, rendered in the Prometheus text format.
+    Gauges are read from a callback when rendered, so they never go stale.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, tuple[str, str, Callable[[], list[Sample]]]] = {}
+
+    def gauge(self, name: str, description: str, fn: Callable[[], float]):
+        """
+        Register a gauge.
+        :param name: name of the metric
+        :param description: help text of the metric
+        :param fn: callback returning the current value
+        """
+        self._metrics[name] = ("gauge", description, lambda: [("", {}, fn())])
+
+    def counter(self, name: str, description: str) -> Counter:
+        """
+        Register a counter.
+        :param name: name of the metric
+        :param description: help text of the metric
+        :return: Counter object
+        """
+        counter = Counter()
+        self._metrics[name] = (
+            "counter",
+            description,
+            lambda: [("", {}, counter.value)],
+        )
+        return counter
+
+    def labeled_counter(
+        self, name: str, description: str, labels: tuple[str, ...]
+    ) -> LabeledCounter:
+        """
+        Register a counter with labels.
+        :param name: name of the metric
+        :param description: help text of the metric
+        :param labels: names of the labels
+        :return: LabeledCounter object
+        """
+        counter = LabeledCounter(labels)
+        self._metrics[name] = ("counter", description, counter.samples)
+        return counter
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """
+        Register a histogram.
+        :param name: name of the metric
+        :param description: help text of the metric
+        :param labels: names of the labels
+        :param buckets: upper bounds of the buckets
+        :return: Histogram object
+        """
+        histogram = Histogram(labels, buckets)
+        self._metrics[name] = ("histogram", description, histogram.samples)
+        return histogram
+
+    def collect(self) -> dict[str, float]:
+        """
+        Get the current value of every metric without labels.
+        :return: dictionary from metric names to values
+        """
+        values = {}
+        for name, (_, _, fn) in self._metrics.items():
+            samples = fn()
+            if len(samples) == 1 and not samples[0][1]:
+                values[name] = samples[0][2]
+        return values
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text format.
+        :return: metrics text
+        """
+        lines = []
+        for name, (kind, description, fn) in self._metrics.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in fn():
+                lines.append(f"{name}{suffix}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+operation_duration = metrics.histogram(
+    "sgde_operation_duration_seconds",
+    "Duration of the internal operations of the server, in seconds",
+    labels=("operation",),
+)
+
+http_request_duration = metrics.histogram(
+    "sgde_http_request_duration_seconds",
+    "Latency of the HTTP requests, in seconds",
+    labels=("method", "route"),
+)
+http_requests = metrics.labeled_counter(
+    "sgde_http_requests_total",
+    "Number of HTTP requests",
+    labels=("method", "route", "status"),
+)
+http_request_bytes = metrics.labeled_counter(
+    "sgde_http_request_bytes_total",
+    "Bytes received in the bodies of the HTTP requests",
+    labels=("method", "route"),
+)
+http_response_bytes = metrics.labeled_counter(
+    "sgde_http_response_bytes_total",
+    "Bytes sent in the bodies of the HTTP responses",
+    labels=("method", "route"),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware measuring the latency and the request and response bytes
+    of every HTTP request, labeled by method and route template, so that the
+    number of series stays bounded. Requests that match no route are labeled
+    with the "unmatched" route. Streamed responses are measured until their
+    last chunk is sent.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._route_paths: dict[Callable, str] = {}
+
+    def get_route(self, scope: Scope) -> str:
+        """
+        Get the template of the route that handled a request, from the endpoint
+        set in the scope by the router.
+        :param scope: ASGI scope of the request
+        :return: path template of the route, or "unmatched"
+        """
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            routes: list[BaseRoute] = scope["app"].routes
+            for route in routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = self._route_paths[endpoint] = route.path
+                    break
+            else:
+                return "unmatched"
+        return path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        request_bytes = response_bytes = 0
+        status_code = 500
+
+        async def receive_wrapper() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message):
+            nonlocal response_bytes, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            method, route = scope["method"], self.get_route(scope)
+            http_request_duration.observe(time.perf_counter() - start, method, route)
+            http_requests.inc(method, route, str(status_code))
+            http_request_bytes.inc(method, route, amount=request_bytes)
+            http_response_bytes.inc(method, route, amount=response_bytes)
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    return metrics.render()
@@ -0,0 +1,177 @@
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+
+import anyio
+from starlette import status
+from starlette.responses import FileResponse, Response
+from starlette.types import Scope, Receive, Send
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def is_not_modified(
+    etag: str,
+    last_modified: float | None = None,
+    if_none_match: str | None = None,
+    if_modified_since: str | None = None,
+) -> bool:
+    """
+    Evaluate the conditional request headers against the current validators of
+    a resource. If-None-Match takes precedence over If-Modified-Since.
+    :param etag: current ETag of the resource
+    :param last_modified: current modification timestamp of the resource
+    :param if_none_match: value of the If-None-Match request header
+    :param if_modified_since: value of the If-Modified-Since request header
+    :return: True if the client copy is still valid
+    """
+    if if_none_match:
+        return if_none_match.strip() == "*" or etag in [
+            tag.strip() for tag in if_none_match.split(",")
+        ]
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def accepts_encoding(accept_encoding: str | None, encoding: str) -> bool:
+    """
+    Check whether a client accepts a content coding.
+    :param accept_encoding: value of the Accept-Encoding request header
+    :param encoding: content coding, e.g. "gzip"
+    :return: True if the coding is accepted with a non-zero quality
+    """
+    if not accept_encoding:
+        return False
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in [encoding, "*"]:
+            continue
+        quality = params.strip().removeprefix("q=")
+        try:
+            return float(quality) > 0 if quality else True
+        except ValueError:
+            return False
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: float | None = None):
+    """
+    Set the ETag and Last-Modified headers of a response.
+    :param response: response to update
+    :param etag: ETag of the resource
+    :param last_modified: modification timestamp of the resource
+    """
+    response.headers["etag"] = etag
+    if last_modified is not None:
+        response.headers["last-modified"] = formatdate(last_modified, usegmt=True)
+
+
+def not_modified_response(etag: str, last_modified: float | None = None) -> Response:
+    """
+    Build an empty 304 response carrying the validators of a resource.
+    :param etag: ETag of the resource
+    :param last_modified: modification timestamp of the resource
+    :return: 304 Response
+    """
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+class RangeFileResponse(FileResponse):
+    """
+    FileResponse that honours single byte ranges and the If-Range precondition.
+    Multiple ranges are not supported and fall back to the full file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        range_header: str | None = None,
+        if_range: str | None = None,
+        **kwargs,
+    ):
+        super().__init__(path, **kwargs)
+        self.range_header = range_header
+        self.if_range = if_range
+
+    def parse_range(self, size: int) -> tuple[int, int] | None:
+        """
+        Parse the Range header against the size of the file.
+        :param size: size of the file in bytes
+        :return: first and last byte of the range, or None to send the full file
+        :raise ValueError: if the range cannot be satisfied
+        """
+        if not self.range_header:
+            return None
+        if self.if_range and self.if_range not in [
+            self.headers.get("etag"),
+            self.headers.get("last-modified"),
+        ]:
+            return None
+        match = RANGE_PATTERN.match(self.range_header.strip())
+        if not match or match.groups() == ("", ""):
+            return None
+        first, last = match.groups()
+        if not first:
+            first, last = max(size - int(last), 0), size - 1
+        else:
+            first, last = int(first), min(int(last), size - 1) if last else size - 1
+        if first > last or first >= size:
+            raise ValueError()
+        return first, last
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stat_result is None:
+            self.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+            self.set_stat_headers(self.stat_result)
+        self.headers["accept-ranges"] = "bytes"
+        size = self.stat_result.st_size
+
+        try:
+            byte_range = self.parse_range(size)
+        except ValueError:
+            self.status_code = status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+            self.headers["content-range"] = f"bytes */{size}"
+            self.headers["content-length"] = "0"
+            self.send_header_only = True
+            byte_range = None
+        if byte_range is None:
+            await super().__call__(scope, receive, send)
+            return
+
+        first, last = byte_range
+        self.headers["content-range"] = f"bytes {first}-{last}/{size}"
+        self.headers["content-length"] = str(last - first + 1)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status.HTTP_206_PARTIAL_CONTENT,
+                "headers": self.raw_headers,
+            }
+        )
+        if self.send_header_only:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(first)
+            remaining = last - first + 1
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0 and len(chunk) > 0,
+                    }
+                )
+                if not chunk:
+                    break
+        if self.background is not None:
+            await self.background()
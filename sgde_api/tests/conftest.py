@@ -8,17 +8,26 @@ from onnx import TensorProto
 from onnx.checker import check_model
 from onnx.helper import make_tensor_value_info, make_node, make_model, make_graph
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from starlette.testclient import TestClient
 
+from sgde_api.admin.router import router as admin_router
 from sgde_api.auth.router import router as auth_router
+from sgde_api.cache import user_cache, generator_cache, token_cache
 from sgde_api.config import settings
-from sgde_api.database import Base, get_db
+from sgde_api.database import Base, get_db, create_database_engine
+from sgde_api.exchange.catalog import catalog
 from sgde_api.exchange.router import router as exchange_router
+from sgde_api.generation.router import router as generation_router
+from sgde_api.metrics import router as metrics_router, MetricsMiddleware
+from sgde_api.tracing import TracingMiddleware
 
 settings.INSTANCE_PATH = os.path.join(os.getcwd(), "test_instance")
 settings.DATABASE_URL = os.path.join(os.getcwd(), "test_instance", "sgde_test_db.db")
 settings.GENERATOR_PATH = os.path.join(os.getcwd(), "test_instance", "generators")
+settings.BCRYPT_ROUNDS = 4
 os.makedirs(settings.INSTANCE_PATH, exist_ok=True)
 os.makedirs(settings.GENERATOR_PATH, exist_ok=True)
 engine = create_engine(
@@ -26,6 +35,13 @@ engine = create_engine(
     connect_args={"check_same_thread": False},
 )
 SessionTesting = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_database_engine(
+    f'sqlite:///{os.path.join(settings.INSTANCE_PATH, "sgde_test_db.db")}',
+    poolclass=NullPool,
+)
+AsyncSessionTesting = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
 
 foobar = {"username": "foobar", "email": "foobar@example.com", "password": "aaaAAA1!"}
 
@@ -44,8 +60,13 @@ foo_gan = {
 
 def start_application() -> FastAPI:
     app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(MetricsMiddleware)
     app.include_router(auth_router)
     app.include_router(exchange_router)
+    app.include_router(generation_router)
+    app.include_router(metrics_router)
+    app.include_router(admin_router)
     return app
 
 
@@ -54,23 +75,21 @@ def app():
     os.makedirs(settings.INSTANCE_PATH, exist_ok=True)
     os.makedirs(settings.GENERATOR_PATH, exist_ok=True)
     Base.metadata.create_all(engine)
+    catalog.reset()
+    user_cache.clear()
+    generator_cache.clear()
+    token_cache.clear()
     _app = start_application()
     yield _app
     Base.metadata.drop_all(engine)
-    for item in os.listdir(settings.GENERATOR_PATH):
-        if item.endswith(".onnx"):
-            os.remove(os.path.join(settings.GENERATOR_PATH, item))
+    shutil.rmtree(settings.GENERATOR_PATH)
 
 
 @pytest.fixture(scope="function")
 def db_session(app):
-    connection = engine.connect()
-    transaction = connection.begin()
-    session = SessionTesting(bind=connection)
+    session = SessionTesting()
     yield session
     session.close()
-    transaction.rollback()
-    connection.close()
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -82,12 +101,10 @@ def cleanup_db(request):
 
 
 @pytest.fixture(scope="function")
-def client(app, db_session):
-    def _get_test_db():
-        try:
-            yield db_session
-        finally:
-            pass
+def client(app):
+    async def _get_test_db():
+        async with AsyncSessionTesting() as db:
+            yield db
 
     app.dependency_overrides[get_db] = _get_test_db
     with TestClient(app) as fixture_client:
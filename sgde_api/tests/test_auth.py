@@ -1,3 +1,11 @@
+import hashlib
+from datetime import timedelta
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwt
+from sqlalchemy import select
 from starlette import status
 
 from sgde_api.auth.exceptions import (
@@ -8,7 +16,14 @@ from sgde_api.auth.exceptions import (
     LoginRequired,
     InvalidToken,
 )
-from sgde_api.tests.conftest import foobar
+from sgde_api.auth.keys import clear_keys
+from sgde_api.auth.utils import UserDB, create_access_token
+from sgde_api.cache import token_cache, user_cache
+from sgde_api.config import settings
+from sgde_api.database import UserTable
+from sgde_api.exceptions import ServiceUnavailable
+from sgde_api.executors import password_executor
+from sgde_api.tests.conftest import foobar, register_and_login
 from sgde_utils.schemas import VALID_USERNAME, VALID_PASSWORD
 
 
@@ -152,3 +167,136 @@ def test_authorized_whoami(client):
     response = client.get("/auth/whoami", headers={"Authorization": f"Bearer {token}"})
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == {"username": foobar["username"], "email": foobar["email"]}
+
+
+def test_token_claims(client):
+    token = register_and_login(client)
+    claims = jwt.get_unverified_claims(token)
+    assert claims["sub"] == foobar["username"]
+    assert claims["email"] == foobar["email"]
+
+
+def test_whoami_from_claims(client):
+    token = register_and_login(client)
+    misses = user_cache.misses
+    response = client.get("/auth/whoami", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"username": foobar["username"], "email": foobar["email"]}
+    assert user_cache.misses == misses
+
+
+def test_verified_token_cached(client):
+    token = register_and_login(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/auth/whoami", headers=headers)
+    hits = token_cache.hits
+    client.get("/auth/whoami", headers=headers)
+    assert token_cache.hits == hits + 1
+
+
+def test_rotated_key_rejects_cached_token(client, monkeypatch):
+    token = register_and_login(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/auth/whoami", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    monkeypatch.setattr(settings, "JWT_SECRET", f"{settings.JWT_SECRET}-rotated")
+    clear_keys()
+    try:
+        response = client.get("/auth/whoami", headers=headers)
+        assert response.status_code == InvalidToken.STATUS_CODE
+    finally:
+        monkeypatch.undo()
+        clear_keys()
+
+
+def test_expired_token_not_cached(client):
+    client.post("/auth/register", json=foobar)
+    user = UserDB(
+        username=foobar["username"], email=foobar["email"], hashed_password=b""
+    )
+    token = create_access_token(user, expires_delta=timedelta(seconds=-1))
+    response = client.get("/auth/whoami", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == InvalidToken.STATUS_CODE
+    assert token_cache.get(hashlib.sha256(token.encode()).hexdigest()) is None
+
+
+@pytest.mark.parametrize(
+    "algorithm, private_key",
+    [
+        ("RS256", rsa.generate_private_key(public_exponent=65537, key_size=2048)),
+        ("ES256", ec.generate_private_key(ec.SECP256R1())),
+    ],
+)
+def test_asymmetric_token(client, tmp_path, monkeypatch, algorithm, private_key):
+    private_key_file = tmp_path / "jwt_key.pem"
+    private_key_file.write_bytes(
+        private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    public_key_file = tmp_path / "jwt_key.pub"
+    public_key_file.write_bytes(
+        private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    )
+    monkeypatch.setattr(settings, "JWT_ALG", algorithm)
+    monkeypatch.setattr(settings, "JWT_PRIVATE_KEY_FILE", str(private_key_file))
+    clear_keys()
+    try:
+        token = register_and_login(client)
+        assert jwt.get_unverified_header(token)["alg"] == algorithm
+
+        # a replica holding only the public key verifies the token
+        monkeypatch.setattr(settings, "JWT_PRIVATE_KEY_FILE", None)
+        monkeypatch.setattr(settings, "JWT_PUBLIC_KEY_FILE", str(public_key_file))
+        clear_keys()
+        response = client.get(
+            "/auth/whoami", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["username"] == foobar["username"]
+    finally:
+        monkeypatch.undo()
+        clear_keys()
+
+
+def test_password_rehashed_on_login(client, db_session, monkeypatch):
+    client.post("/auth/register", json=foobar)
+    user = db_session.scalar(select(UserTable).filter_by(username=foobar["username"]))
+    assert user.hashed_password.startswith(
+        f"$2b${settings.BCRYPT_ROUNDS:02d}$".encode()
+    )
+
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", settings.BCRYPT_ROUNDS + 1)
+    response = client.post(
+        "/auth/token",
+        data={"username": foobar["username"], "password": foobar["password"]},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    db_session.expire_all()
+    user = db_session.scalar(select(UserTable).filter_by(username=foobar["username"]))
+    assert user.hashed_password.startswith(
+        f"$2b${settings.BCRYPT_ROUNDS:02d}$".encode()
+    )
+
+    response = client.post(
+        "/auth/token",
+        data={"username": foobar["username"], "password": foobar["password"]},
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_login_busy(client, monkeypatch):
+    client.post("/auth/register", json=foobar)
+    monkeypatch.setattr(password_executor, "max_workers", 0)
+    monkeypatch.setattr(password_executor, "max_queue", 0)
+    response = client.post(
+        "/auth/token",
+        data={"username": foobar["username"], "password": foobar["password"]},
+    )
+    assert response.status_code == ServiceUnavailable.STATUS_CODE
+    assert response.headers["retry-after"] == str(password_executor.retry_after)
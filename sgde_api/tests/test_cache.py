@@ -0,0 +1,57 @@
+import time
+
+from starlette import status
+
+from sgde_api.cache import TTLCache, user_cache, generator_cache
+from sgde_api.tests.conftest import foobar, register_and_login
+from sgde_api.tests.test_exchange import upload_foo_gan
+
+
+def test_cache_lru_eviction():
+    cache = TTLCache("test_lru", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_cache_ttl_expiration():
+    cache = TTLCache("test_ttl", maxsize=2, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_cache_disabled():
+    cache = TTLCache("test_disabled", maxsize=0, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_user_lookups_cached(client):
+    register_and_login(client)
+    client.get(f"/users/{foobar['username']}")
+    hits = user_cache.hits
+    response = client.get(f"/users/{foobar['username']}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["username"] == foobar["username"]
+    assert user_cache.hits == hits + 1
+
+
+def test_generator_lookups_cached(client, onnx_file, json_file):
+    token = register_and_login(client)
+    assert client.get("/generators/foo_gan").status_code == 404
+    upload_foo_gan(client, token, onnx_file, json_file)
+    response = client.get("/generators/foo_gan")
+    assert response.status_code == status.HTTP_200_OK
+    hits = generator_cache.hits
+    response = client.get(
+        "/generators/foo_gan/download/metadata",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert generator_cache.hits == hits + 1
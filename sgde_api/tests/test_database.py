@@ -0,0 +1,44 @@
+import asyncio
+import os
+
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+
+from sgde_api.config import settings, SQLiteProfile
+from sgde_api.database import create_database_engine, get_async_database_url
+
+
+async def read_pragmas(profile: SQLiteProfile) -> dict:
+    engine = create_database_engine(
+        f'sqlite:///{os.path.join(settings.INSTANCE_PATH, f"{profile.value}.db")}',
+        profile=profile,
+        poolclass=NullPool,
+    )
+    pragmas = {}
+    async with engine.connect() as conn:
+        for name in ["journal_mode", "synchronous", "busy_timeout", "mmap_size"]:
+            pragmas[name] = (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+    await engine.dispose()
+    return pragmas
+
+
+def test_async_database_url():
+    assert get_async_database_url("sqlite:///a.db") == "sqlite+aiosqlite:///a.db"
+    assert (
+        get_async_database_url("postgresql+asyncpg://db/sgde")
+        == "postgresql+asyncpg://db/sgde"
+    )
+
+
+def test_sqlite_production_profile(app):
+    pragmas = asyncio.run(read_pragmas(SQLiteProfile.PRODUCTION))
+    assert pragmas["journal_mode"] == "wal"
+    assert pragmas["synchronous"] == 1
+    assert pragmas["busy_timeout"] == settings.SQLITE_BUSY_TIMEOUT
+    assert pragmas["mmap_size"] == settings.SQLITE_MMAP_SIZE
+
+
+def test_sqlite_default_profile(app):
+    pragmas = asyncio.run(read_pragmas(SQLiteProfile.DEFAULT))
+    assert pragmas["journal_mode"] == "delete"
+    assert pragmas["synchronous"] == 2
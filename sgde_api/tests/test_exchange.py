@@ -1,3 +1,15 @@
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import os
+import tarfile
+import zipfile
+
+import onnx
+import pytest
+from sqlalchemy import select, text
 from starlette import status
 
 from sgde_api.auth.exceptions import LoginRequired
@@ -6,8 +18,51 @@ from sgde_api.exchange.exceptions import (
     GeneratorExists,
     InvalidONNXError,
     InvalidJSONError,
+    InvalidCursorError,
+    ArtifactNotFound,
+    MissingONNXError,
+    BatchAbortedError,
+    InvalidArchiveError,
+    MetadataTooLargeError,
+    LookupTooLargeError,
+    InvalidSearchQueryError,
+    InvalidExtraFilterError,
+    VariantNotFound,
+    UnsupportedVariantError,
+)
+from sgde_api.config import settings, BlobCompression, Config
+from sgde_api.database import (
+    Base,
+    BlobTable,
+    GeneratorTable,
+    GeneratorExtraTable,
+)
+from sgde_api.exchange.catalog import catalog
+from sgde_api.exchange import bundles
+from sgde_api.exchange.bundles import get_bundle_cache_path, evict_bundles
+from sgde_api.exchange.storage import (
+    BlobReferences,
+    collect_unreferenced_blobs,
+    get_staging_path,
+    get_blob_path,
+    get_compressed_blob_path,
+    find_blob,
+)
+from sgde_api.responses import accepts_encoding
+from sgde_api.exchange.utils import (
+    LOOKUP_CHUNK_SIZE,
+    GeneratorDB,
+    encode_cursor,
+    paginate_generators,
+)
+from sgde_api.tests.conftest import (
+    AsyncSessionTesting,
+    SessionTesting,
+    foobar,
+    register_and_login,
+    foo_gan,
 )
-from sgde_api.tests.conftest import foobar, register_and_login, foo_gan
+from sgde_utils.schemas import GeneratorSort, GeneratorVariant
 
 
 def test_get_empty_generators(client):
@@ -193,3 +248,869 @@ def test_download_non_existent_generator_no_login(client):
     )
     assert response.status_code == LoginRequired.STATUS_CODE
     assert response.json()["detail"] == LoginRequired.DETAIL
+
+
+def test_upload_generator_streamed_to_disk(client, onnx_file, json_file):
+    token = register_and_login(client)
+    settings.UPLOAD_CHUNK_SIZE, chunk_size = 16, settings.UPLOAD_CHUNK_SIZE
+    files = {
+        "gen_onnx_file": onnx_file.well_formatted,
+        "json_file": json_file.well_formatted,
+    }
+    try:
+        response = client.post(
+            "/exchange/upload",
+            headers={"Authorization": f"Bearer {token}"},
+            files=files,
+        )
+    finally:
+        settings.UPLOAD_CHUNK_SIZE = chunk_size
+    assert response.status_code == status.HTTP_201_CREATED
+    digest = hashlib.sha256(onnx_file.well_formatted).hexdigest()
+    with open(get_blob_path(digest), "rb") as f:
+        assert f.read() == onnx_file.well_formatted
+    assert os.listdir(get_staging_path()) == []
+
+
+def test_upload_generator_corrupted_onnx_not_staged(client, onnx_file, json_file):
+    token = register_and_login(client)
+    files = {
+        "gen_onnx_file": onnx_file.corrupted,
+        "json_file": json_file.well_formatted,
+    }
+    response = client.post(
+        "/exchange/upload",
+        headers={"Authorization": f"Bearer {token}"},
+        files=files,
+    )
+    assert response.status_code == InvalidONNXError.STATUS_CODE
+    assert os.listdir(get_staging_path()) == []
+
+
+def test_upload_generator_deduplicated(client, db_session, onnx_file, json_file):
+    token = register_and_login(client)
+    files = {
+        "gen_onnx_file": onnx_file.well_formatted,
+        "cls_onnx_file": onnx_file.well_formatted,
+        "json_file": json_file.well_formatted,
+    }
+    response = client.post(
+        "/exchange/upload",
+        headers={"Authorization": f"Bearer {token}"},
+        files=files,
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    generator = db_session.query(GeneratorTable).filter_by(name="foo_gan").one()
+    assert generator.gen_onnx_file == generator.cls_onnx_file
+    blob = db_session.get(BlobTable, generator.gen_onnx_file)
+    assert blob.ref_count == 2
+    assert blob.size == len(onnx_file.well_formatted)
+    assert os.path.exists(get_blob_path(generator.json_file))
+
+
+def test_upload_generator_failure_blobs_swept(client, db_session, onnx_file, json_file):
+    token = register_and_login(client)
+    files = {
+        "gen_onnx_file": onnx_file.well_formatted,
+        "cls_onnx_file": onnx_file.corrupted,
+        "json_file": json_file.well_formatted,
+    }
+    client.post(
+        "/exchange/upload",
+        headers={"Authorization": f"Bearer {token}"},
+        files=files,
+    )
+    assert db_session.query(BlobTable).count() == 0
+    digest = hashlib.sha256(onnx_file.well_formatted).hexdigest()
+    os.utime(find_blob(digest)[0], (0, 0))
+    asyncio.run(collect_blobs())
+    assert not os.path.exists(find_blob(digest)[0])
+
+
+async def collect_blobs() -> int:
+    async with AsyncSessionTesting() as db:
+        return await collect_unreferenced_blobs(db)
+
+
+def test_blob_references_concurrent(app):
+    async def take_reference(contents: bytes) -> str:
+        async with AsyncSessionTesting() as db:
+            blobs = BlobReferences()
+            digest = await blobs.store_bytes(contents)
+            await blobs.add_to(db)
+            await db.commit()
+            return digest
+
+    async def take_references() -> list[str]:
+        return await asyncio.gather(*[take_reference(b"blob") for _ in range(4)])
+
+    digests = asyncio.run(take_references())
+    assert len(set(digests)) == 1
+    with SessionTesting() as db_session:
+        assert db_session.get(BlobTable, digests[0]).ref_count == 4
+
+
+def test_collect_unreferenced_blobs(app):
+    async def store(contents: bytes, commit: bool) -> str:
+        async with AsyncSessionTesting() as db:
+            blobs = BlobReferences()
+            digest = await blobs.store_bytes(contents)
+            if commit:
+                await blobs.add_to(db)
+                await db.commit()
+            return digest
+
+    referenced = asyncio.run(store(b"referenced", commit=True))
+    orphan = asyncio.run(store(b"orphan", commit=False))
+    assert asyncio.run(collect_blobs()) == 0
+    assert os.path.exists(find_blob(orphan)[0])
+
+    # blobs of failed uploads are only removed after the grace period
+    os.utime(find_blob(orphan)[0], (0, 0))
+    assert asyncio.run(collect_blobs()) == 1
+    assert not os.path.exists(find_blob(orphan)[0])
+    assert os.path.exists(find_blob(referenced)[0])
+
+
+def upload_foo_gan(client, token, onnx_file, json_file, cls=False):
+    files = {
+        "gen_onnx_file": onnx_file.well_formatted,
+        "json_file": json_file.well_formatted,
+    }
+    if cls:
+        files["cls_onnx_file"] = onnx_file.well_formatted
+    return client.post(
+        "/exchange/upload",
+        headers={"Authorization": f"Bearer {token}"},
+        files=files,
+    )
+
+
+def test_download_generator_cached_bundle(client, onnx_file, json_file):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file, cls=True)
+    headers = {"Authorization": f"Bearer {token}"}
+    first = client.get("generators/foo_gan/download", headers=headers)
+    second = client.get("generators/foo_gan/download", headers=headers)
+    assert first.status_code == second.status_code == status.HTTP_200_OK
+    assert first.headers["etag"] == second.headers["etag"]
+    assert first.content == second.content
+    assert len(os.listdir(get_bundle_cache_path())) == 1
+    with zipfile.ZipFile(io.BytesIO(first.content)) as zipf:
+        assert sorted(zipf.namelist()) == [
+            "foobar_foo_gan.json",
+            "foobar_foo_gan_cls.onnx",
+            "foobar_foo_gan_gen.onnx",
+        ]
+        assert zipf.read("foobar_foo_gan_gen.onnx") == onnx_file.well_formatted
+
+
+def test_download_generator_not_modified(client, onnx_file, json_file):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    headers = {"Authorization": f"Bearer {token}"}
+    etag = client.get("generators/foo_gan/download", headers=headers).headers["etag"]
+    response = client.get(
+        "generators/foo_gan/download", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+
+def test_evict_bundles(client, onnx_file, json_file, monkeypatch):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    client.get(
+        "generators/foo_gan/download", headers={"Authorization": f"Bearer {token}"}
+    )
+    [bundle] = os.listdir(get_bundle_cache_path())
+    stale_bundle = os.path.join(get_bundle_cache_path(), "stale.zip")
+    with open(stale_bundle, "wb") as f:
+        f.write(b"0" * 1024)
+    os.utime(stale_bundle, (0, 0))
+    monkeypatch.setattr(settings, "BUNDLE_CACHE_SIZE", 1)
+    evict_bundles(keep="")
+    assert os.listdir(get_bundle_cache_path()) == [bundle]
+
+    monkeypatch.setattr(settings, "BUNDLE_EVICTION_GRACE", 0)
+    with open(stale_bundle, "wb") as f:
+        f.write(b"0" * 1024)
+    evict_bundles(keep=stale_bundle)
+    assert os.listdir(get_bundle_cache_path()) == ["stale.zip"]
+    evict_bundles(keep="")
+    assert os.listdir(get_bundle_cache_path()) == []
+
+
+def test_get_bundle_evicted(client, db_session, onnx_file, json_file, monkeypatch):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    generator = GeneratorDB.from_orm(db_session.query(GeneratorTable).one())
+    build_bundle = bundles.build_bundle
+
+    def build_and_evict(*args):
+        build_bundle(*args)
+        if not evicted:
+            evicted.append(args[1])
+            os.unlink(args[1])
+
+    evicted = []
+    monkeypatch.setattr(bundles, "build_bundle", build_and_evict)
+    bundle_path, _ = bundles.get_bundle(generator)
+    assert evicted == [bundle_path]
+    assert zipfile.is_zipfile(bundle_path)
+
+
+def test_download_generator_range(client, onnx_file, json_file):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    headers = {"Authorization": f"Bearer {token}"}
+    full = client.get("generators/foo_gan/download", headers=headers)
+    assert full.headers["accept-ranges"] == "bytes"
+    size = len(full.content)
+
+    response = client.get(
+        "generators/foo_gan/download", headers={**headers, "Range": "bytes=10-"}
+    )
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.headers["content-range"] == f"bytes 10-{size - 1}/{size}"
+    assert response.content == full.content[10:]
+
+    response = client.get(
+        "generators/foo_gan/download", headers={**headers, "Range": "bytes=-5"}
+    )
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == full.content[-5:]
+
+    response = client.get(
+        "generators/foo_gan/download",
+        headers={**headers, "Range": f"bytes={size}-"},
+    )
+    assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+    assert response.headers["content-range"] == f"bytes */{size}"
+
+
+def test_download_generator_if_range(client, onnx_file, json_file):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    headers = {"Authorization": f"Bearer {token}", "Range": "bytes=0-9"}
+    etag = client.get("generators/foo_gan/download", headers=headers).headers["etag"]
+
+    response = client.get(
+        "generators/foo_gan/download", headers={**headers, "If-Range": etag}
+    )
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert len(response.content) == 10
+
+    response = client.get(
+        "generators/foo_gan/download", headers={**headers, "If-Range": '"stale"'}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.content) > 10
+
+
+def test_get_generators_not_modified(client, onnx_file, json_file):
+    response = client.get("/generators")
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+    response = client.get("/generators", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    response = client.get("/generators", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    response = client.get("/generators", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 1
+    response = client.get("/generators", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_get_generators_not_modified_shared(client, db_session):
+    etag = client.get("/generators").headers["etag"]
+    catalog.reset()
+    response = client.get("/generators", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    register_and_login(client)
+    add_generators(db_session, [0.5])
+    response = client.get("/generators", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert [generator["name"] for generator in response.json()] == ["gan_0"]
+
+
+def test_get_generator_not_modified(client, onnx_file, json_file):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    response = client.get("/generators/foo_gan")
+    etag = response.headers["etag"]
+    assert "last-modified" in response.headers
+    response = client.get("/generators/foo_gan", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["etag"] == etag
+    response = client.get("/generators/foo_gan", headers={"If-None-Match": '"old"'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["name"] == "foo_gan"
+
+
+def add_generators(db_session, scores):
+    for i, score in enumerate(scores):
+        db_session.add(
+            GeneratorTable(
+                name=f"gan_{i}",
+                data_structure="image",
+                data_length=100 * i,
+                task="classification",
+                best_score=score,
+                gen_onnx_file=f"gen_{i}",
+                cls_onnx_file=f"cls_{i}" if i % 2 else None,
+                json_file=f"json_{i}",
+                has_cls=bool(i % 2),
+                owner=foobar["username"],
+            )
+        )
+    db_session.commit()
+
+
+def get_all_pages(client, **params):
+    names, cursor = [], None
+    while True:
+        response = client.get(
+            "/generators", params={**params, **({"cursor": cursor} if cursor else {})}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        names += [generator["name"] for generator in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return names
+
+
+def test_get_generators_pagination(client, db_session):
+    add_generators(db_session, [0.5, None, 0.9, 0.5, None, 0.1])
+    response = client.get("/generators", params={"limit": 4})
+    assert len(response.json()) == 4
+    assert "x-next-cursor" in response.headers
+    assert get_all_pages(client, limit=4) == [f"gan_{i}" for i in range(6)]
+    assert get_all_pages(client, limit=1, sort="-created") == [
+        f"gan_{i}" for i in reversed(range(6))
+    ]
+    assert get_all_pages(client, limit=2, sort="-name") == [
+        f"gan_{i}" for i in reversed(range(6))
+    ]
+
+
+def test_get_generators_sort_by_score(client, db_session):
+    add_generators(db_session, [0.5, None, 0.9, 0.5, None, 0.1])
+    assert get_all_pages(client, limit=1, sort="-best_score") == [
+        "gan_2",
+        "gan_3",
+        "gan_0",
+        "gan_5",
+        "gan_4",
+        "gan_1",
+    ]
+    assert get_all_pages(client, limit=2, sort="best_score") == [
+        "gan_1",
+        "gan_4",
+        "gan_5",
+        "gan_0",
+        "gan_3",
+        "gan_2",
+    ]
+    assert get_all_pages(client, limit=3, sort="-best_score") == [
+        "gan_2",
+        "gan_3",
+        "gan_0",
+        "gan_5",
+        "gan_4",
+        "gan_1",
+    ]
+
+
+@pytest.mark.parametrize("sort", ["best_score", "-best_score"])
+@pytest.mark.parametrize("value", [None, 0.5])
+def test_paginate_generators_seeks_index(db_session, sort, value):
+    cursor = encode_cursor(value, 3)
+    for query in paginate_generators(
+        select(GeneratorTable), GeneratorSort(sort), cursor
+    ):
+        sql = query.compile(
+            dialect=db_session.bind.dialect, compile_kwargs={"literal_binds": True}
+        )
+        plan = db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        assert all(row[-1].startswith("SEARCH") for row in plan)
+
+
+def test_get_generators_filters(client, db_session):
+    add_generators(db_session, [0.5, None, 0.9, 0.5, None, 0.1])
+    assert get_all_pages(client, has_cls=True) == ["gan_1", "gan_3", "gan_5"]
+    assert get_all_pages(client, data_length=200) == ["gan_2"]
+    assert get_all_pages(client, min_best_score=0.2, max_best_score=0.5) == [
+        "gan_0",
+        "gan_3",
+    ]
+    assert get_all_pages(client, owner="barfoo") == []
+
+
+def test_get_generators_invalid_cursor(client):
+    response = client.get("/generators", params={"cursor": "not-a-cursor"})
+    assert response.status_code == InvalidCursorError.STATUS_CODE
+    assert response.json()["detail"] == InvalidCursorError.DETAIL
+
+
+def test_download_generator_artifacts(client, onnx_file, json_file):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get("generators/foo_gan/download/gen", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == onnx_file.well_formatted
+    digest = hashlib.sha256(onnx_file.well_formatted).hexdigest()
+    assert response.headers["etag"] == f'"{digest}"'
+    assert "foobar_foo_gan_gen.onnx" in response.headers["content-disposition"]
+
+    response = client.get("generators/foo_gan/download/metadata", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["name"] == foo_gan["name"]
+
+    response = client.get(
+        "generators/foo_gan/download/gen",
+        headers={**headers, "If-None-Match": f'"{digest}"'},
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = client.get(
+        "generators/foo_gan/download/gen", headers={**headers, "Range": "bytes=0-3"}
+    )
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == onnx_file.well_formatted[:4]
+
+
+def test_download_generator_missing_artifact(client, onnx_file, json_file):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("generators/foo_gan/download/cls", headers=headers)
+    assert response.status_code == ArtifactNotFound.STATUS_CODE
+    assert response.json()["detail"] == ArtifactNotFound.DETAIL
+    response = client.get("generators/foo_gan/download/weights", headers=headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    response = client.get(
+        "generators/foo_gan/download/gen", headers={"Authorization": "Bearer "}
+    )
+    assert response.status_code == LoginRequired.STATUS_CODE
+
+
+def make_archive(members: dict[str, bytes | str]) -> bytes:
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        for name, contents in members.items():
+            if isinstance(contents, str):
+                contents = contents.encode()
+            info = tarfile.TarInfo(name)
+            info.size = len(contents)
+            tar.addfile(info, io.BytesIO(contents))
+    return archive.getvalue()
+
+
+def generator_json(name: str) -> str:
+    return json.dumps({**foo_gan, "name": name})
+
+
+def upload_batch(client, token, members, **params):
+    return client.post(
+        "/exchange/upload/batch",
+        headers={"Authorization": f"Bearer {token}"},
+        files={"archive": ("generators.tar.gz", make_archive(members))},
+        params=params,
+    )
+
+
+def test_upload_generators_batch(client, onnx_file, json_file):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    members = {
+        "bar_gan.json": generator_json("bar_gan"),
+        "bar_gan_gen.onnx": onnx_file.well_formatted,
+        "baz_gan/baz_gan.json": generator_json("baz_gan"),
+        "baz_gan/baz_gan_gen.onnx": onnx_file.well_formatted,
+        "baz_gan/baz_gan_cls.onnx": onnx_file.well_formatted,
+        "foo_gan.json": generator_json("foo_gan"),
+        "foo_gan_gen.onnx": onnx_file.well_formatted,
+        "qux_gan.json": generator_json("qux_gan"),
+        "qux_gan_gen.onnx": onnx_file.corrupted,
+        "quux_gan.json": generator_json("quux_gan"),
+        "README.md": "ignored",
+    }
+    response = upload_batch(client, token, members)
+    assert response.status_code == status.HTTP_201_CREATED
+    results = {result["key"]: result for result in response.json()}
+    assert list(results) == ["bar_gan", "baz_gan", "foo_gan", "qux_gan", "quux_gan"]
+    assert results["bar_gan"]["created"]
+    assert not results["bar_gan"]["generator"]["has_cls"]
+    assert results["baz_gan"]["created"]
+    assert results["baz_gan"]["generator"]["has_cls"]
+    assert results["foo_gan"]["detail"] == GeneratorExists.DETAIL
+    assert results["qux_gan"]["detail"] == InvalidONNXError.DETAIL
+    assert results["quux_gan"]["detail"] == MissingONNXError.DETAIL
+
+    names = {generator["name"] for generator in client.get("/generators").json()}
+    assert names == {"foo_gan", "bar_gan", "baz_gan"}
+    assert os.listdir(get_staging_path()) == []
+
+
+def test_upload_generators_batch_atomic(client, onnx_file):
+    token = register_and_login(client)
+    members = {
+        "bar_gan.json": generator_json("bar_gan"),
+        "bar_gan_gen.onnx": onnx_file.well_formatted,
+        "qux_gan.json": generator_json("qux_gan"),
+        "qux_gan_gen.onnx": onnx_file.corrupted,
+    }
+    response = upload_batch(client, token, members, atomic=True)
+    results = {result["key"]: result for result in response.json()}
+    assert results["bar_gan"]["detail"] == BatchAbortedError.DETAIL
+    assert results["qux_gan"]["detail"] == InvalidONNXError.DETAIL
+    assert client.get("/generators").json() == []
+    assert os.listdir(get_staging_path()) == []
+
+
+def test_upload_generators_invalid_archive(client):
+    token = register_and_login(client)
+    response = client.post(
+        "/exchange/upload/batch",
+        headers={"Authorization": f"Bearer {token}"},
+        files={"archive": b"not a tar stream"},
+    )
+    assert response.status_code == InvalidArchiveError.STATUS_CODE
+    assert response.json()["detail"] == InvalidArchiveError.DETAIL
+
+
+def test_upload_generators_metadata_too_large(client, onnx_file, monkeypatch):
+    token = register_and_login(client)
+    members = {
+        "bar_gan_gen.onnx": onnx_file.well_formatted,
+        "bar_gan.json": generator_json("bar_gan"),
+    }
+    monkeypatch.setattr(
+        settings, "BATCH_METADATA_MAX_SIZE", len(members["bar_gan.json"]) - 1
+    )
+    response = upload_batch(client, token, members)
+    assert response.status_code == MetadataTooLargeError.STATUS_CODE
+    assert response.json()["detail"] == MetadataTooLargeError.DETAIL
+    assert os.listdir(get_staging_path()) == []
+
+
+def test_lookup_generators_by_name(client, db_session):
+    add_generators(db_session, [0.1 * i for i in range(LOOKUP_CHUNK_SIZE + 10)])
+    names = [f"gan_{i}" for i in range(LOOKUP_CHUNK_SIZE + 10)][::-1]
+    response = client.post(
+        "/generators/lookup", json={"names": names + ["gan_0", "foo_gan"]}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [generator["name"] for generator in response.json()] == names
+
+
+def test_lookup_generators_by_filter(client, db_session):
+    add_generators(db_session, [0.1, 0.2, 0.3, 0.4])
+    response = client.post(
+        "/generators/lookup",
+        json={"names": ["gan_1", "gan_2", "gan_3"], "filter": {"has_cls": True}},
+    )
+    assert [generator["name"] for generator in response.json()] == ["gan_1", "gan_3"]
+    response = client.post(
+        "/generators/lookup", json={"filter": {"min_best_score": 0.25}}
+    )
+    assert [generator["name"] for generator in response.json()] == ["gan_2", "gan_3"]
+
+
+def test_lookup_generators_too_many(client, db_session, monkeypatch):
+    add_generators(db_session, [0.1, 0.2, 0.3])
+    monkeypatch.setattr(settings, "BULK_LOOKUP_MAX_SIZE", 2)
+    response = client.post("/generators/lookup", json={"filter": {}})
+    assert response.status_code == LookupTooLargeError.STATUS_CODE
+    assert response.json()["detail"] == LookupTooLargeError.DETAIL
+    response = client.post("/generators/lookup", json={"names": ["a", "b", "c"]})
+    assert response.status_code == LookupTooLargeError.STATUS_CODE
+
+
+def test_lookup_generators_empty(client):
+    response = client.post("/generators/lookup", json={})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_accepts_encoding():
+    assert accepts_encoding("gzip, deflate", "gzip")
+    assert accepts_encoding("br;q=1.0, gzip;q=0.5", "gzip")
+    assert accepts_encoding("*", "gzip")
+    assert not accepts_encoding("gzip;q=0", "gzip")
+    assert not accepts_encoding("identity", "gzip")
+    assert not accepts_encoding(None, "gzip")
+
+
+def test_compressed_blobs(client, onnx_file, json_file, monkeypatch):
+    monkeypatch.setattr(settings, "BLOB_COMPRESSION", BlobCompression.GZIP)
+    monkeypatch.setattr(settings, "BLOB_COMPRESSION_MIN_RATIO", 10.0)
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    digest = hashlib.sha256(onnx_file.well_formatted).hexdigest()
+    assert find_blob(digest) == (get_compressed_blob_path(digest), "gzip")
+    assert not os.path.exists(get_blob_path(digest))
+    with open(get_compressed_blob_path(digest), "rb") as f:
+        assert gzip.decompress(f.read()) == onnx_file.well_formatted
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with client.stream(
+        "GET",
+        "generators/foo_gan/download/gen",
+        headers={**headers, "Accept-Encoding": "gzip"},
+    ) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["etag"] == f'"{digest}.gzip"'
+        assert "accept-encoding" in response.headers["vary"]
+        raw = b"".join(response.iter_raw())
+        assert gzip.decompress(raw) == onnx_file.well_formatted
+
+    response = client.get(
+        "generators/foo_gan/download/gen",
+        headers={**headers, "Accept-Encoding": "identity", "Range": "bytes=0-3"},
+    )
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == f'"{digest}"'
+    assert response.content == onnx_file.well_formatted[:4]
+
+    response = client.get("/generators/foo_gan/download", headers=headers)
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zipf:
+        assert zipf.getinfo("foobar_foo_gan_gen.onnx").compress_type == (
+            zipfile.ZIP_DEFLATED
+        )
+        assert zipf.read("foobar_foo_gan_gen.onnx") == onnx_file.well_formatted
+
+
+def test_incompressible_blobs_stored_raw(client, onnx_file, json_file, monkeypatch):
+    monkeypatch.setattr(settings, "BLOB_COMPRESSION", BlobCompression.GZIP)
+    monkeypatch.setattr(settings, "BLOB_COMPRESSION_MIN_RATIO", 0.0)
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    digest = hashlib.sha256(onnx_file.well_formatted).hexdigest()
+    assert find_blob(digest) == (get_blob_path(digest), None)
+    assert os.listdir(get_staging_path()) == []
+
+
+def add_described_generators(db_session, descriptions: dict[str, tuple[str, str]]):
+    for i, (name, (data_name, data_description)) in enumerate(descriptions.items()):
+        db_session.add(
+            GeneratorTable(
+                name=name,
+                data_name=data_name,
+                data_description=data_description,
+                gen_onnx_file=f"gen_{i}",
+                json_file=f"json_{i}",
+                has_cls=bool(i % 2),
+                owner=foobar["username"],
+            )
+        )
+    db_session.commit()
+
+
+def search(client, q, **params):
+    response = client.get("/generators/search", params={"q": q, **params})
+    assert response.status_code == status.HTTP_200_OK
+    return [generator["name"] for generator in response.json()], response.headers
+
+
+def test_search_generators(client, db_session):
+    add_described_generators(
+        db_session,
+        {
+            "digits_gan": ("mnist", "Handwritten digits"),
+            "fashion_vae": ("fashion_mnist", "Zalando clothing images"),
+            "census_gan": ("adult", "Census income, tabular"),
+            "mnist_gan": ("emnist", "Handwritten letters and digits"),
+        },
+    )
+    names, _ = search(client, "handwritten digits")
+    assert sorted(names) == ["digits_gan", "mnist_gan"]
+    assert search(client, "mnist")[0][0] == "mnist_gan"
+    assert search(client, "CLOTH")[0] == ["fashion_vae"]
+    assert search(client, "income tabular")[0] == ["census_gan"]
+    assert search(client, "digits", has_cls=True)[0] == ["mnist_gan"]
+    assert search(client, "speech")[0] == []
+
+
+def test_search_generators_pagination(client, db_session):
+    add_described_generators(
+        db_session, {f"gan_{i}": ("mnist", "digits") for i in range(5)}
+    )
+    names, headers = search(client, "digits", limit=2)
+    assert len(names) == 2 and headers["x-next-offset"] == "2"
+    more, headers = search(client, "digits", limit=2, offset=4)
+    assert len(more) == 1 and "x-next-offset" not in headers
+    all_names = []
+    for offset in range(0, 6, 2):
+        all_names += search(client, "digits", limit=2, offset=offset)[0]
+    assert sorted(all_names) == [f"gan_{i}" for i in range(5)]
+
+
+def test_search_generators_index_in_sync(client, onnx_file, json_file):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    upload_batch(
+        client,
+        token,
+        {
+            "bar_gan.json": generator_json("bar_gan"),
+            "bar_gan_gen.onnx": onnx_file.well_formatted,
+        },
+    )
+    assert sorted(search(client, "mnist")[0]) == ["bar_gan", "foo_gan"]
+    assert search(client, "bar")[0] == ["bar_gan"]
+
+
+def test_search_generators_invalid_query(client):
+    response = client.get("/generators/search", params={"q": "* -"})
+    assert response.status_code == InvalidSearchQueryError.STATUS_CODE
+    assert response.json()["detail"] == InvalidSearchQueryError.DETAIL
+    response = client.get("/generators/search", params={"q": '"mnist" OR NEAR('})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_upload_generator_extra_metadata(client, db_session, onnx_file):
+    token = register_and_login(client)
+    metadata = {**foo_gan, "latent_dim": 100, "dataset_shape": [32, 32, 3.0]}
+    client.post(
+        "/exchange/upload",
+        headers={"Authorization": f"Bearer {token}"},
+        files={
+            "gen_onnx_file": ("gen.onnx", onnx_file.well_formatted),
+            "json_file": ("foo_gan.json", json.dumps(metadata)),
+        },
+    )
+    extras = db_session.query(GeneratorExtraTable).order_by(GeneratorExtraTable.key)
+    assert [(extra.key, extra.value) for extra in extras] == [
+        ("dataset_shape", "[32,32,3]"),
+        ("latent_dim", "100"),
+    ]
+
+
+def test_get_generators_extra_filters(client, onnx_file):
+    token = register_and_login(client)
+    shapes = {"cifar_gan": [32, 32, 3], "mnist_gan": [28, 28], "svhn_gan": [32, 32, 3]}
+    members = {}
+    for name, shape in shapes.items():
+        extra = {"dataset_shape": shape, "architecture": name[:4]}
+        if name != "svhn_gan":
+            extra["gan_epochs"] = 100
+        members[f"{name}.json"] = json.dumps({**foo_gan, "name": name, **extra})
+        members[f"{name}_gen.onnx"] = onnx_file.well_formatted
+    upload_batch(client, token, members)
+
+    def names(**params):
+        response = client.get("/generators", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        return sorted(generator["name"] for generator in response.json())
+
+    assert names(extra="dataset_shape=[32, 32, 3]") == ["cifar_gan", "svhn_gan"]
+    assert names(extra=["dataset_shape=[32,32,3]", "gan_epochs=100.0"]) == ["cifar_gan"]
+    assert names(extra="architecture=mnis") == ["mnist_gan"]
+    assert names(extra='architecture="svhn"') == ["svhn_gan"]
+    assert names(extra="gan_epochs") == ["cifar_gan", "mnist_gan"]
+    assert names(extra="latent_dim") == []
+    response = client.post(
+        "/generators/lookup", json={"filter": {"extra": {"gan_epochs": None}}}
+    )
+    assert [generator["name"] for generator in response.json()] == [
+        "cifar_gan",
+        "mnist_gan",
+    ]
+    response = client.get(
+        "/generators/search", params={"q": "mnist", "extra": "dataset_shape=[28,28]"}
+    )
+    assert [generator["name"] for generator in response.json()] == ["mnist_gan"]
+
+
+def test_index_generator_extras(client, db_session, onnx_file, json_file):
+    token = register_and_login(client)
+    upload_batch(
+        client,
+        token,
+        {
+            "bar_gan.json": json.dumps({**foo_gan, "name": "bar_gan", "latent_dim": 8}),
+            "bar_gan_gen.onnx": onnx_file.well_formatted,
+        },
+    )
+    upload_foo_gan(client, token, onnx_file, json_file)
+    GeneratorExtraTable.__table__.drop(db_session.bind)
+    GeneratorExtraTable.__table__.create(db_session.bind)
+    response = client.get("/generators", params={"extra": "latent_dim=8"})
+    assert [generator["name"] for generator in response.json()] == ["bar_gan"]
+
+
+def test_add_generator_created_at(client, db_session, onnx_file, json_file):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    db_session.execute(text("ALTER TABLE generators DROP COLUMN created_at"))
+    db_session.commit()
+    Base.metadata.create_all(db_session.bind)
+    response = client.get("/generators")
+    assert response.status_code == status.HTTP_200_OK
+    assert [generator["name"] for generator in response.json()] == ["foo_gan"]
+    assert "last-modified" in response.headers
+
+
+def test_get_generators_invalid_extra_filter(client):
+    for extra in ["=1", 'dataset_shape={"a": 1}', "dataset_shape=[[1]]"]:
+        response = client.get("/generators", params={"extra": extra})
+        assert response.status_code == InvalidExtraFilterError.STATUS_CODE
+        assert response.json()["detail"] == InvalidExtraFilterError.DETAIL
+
+
+def test_generator_variants(client, onnx_file, json_file, monkeypatch):
+    pytest.importorskip("onnxruntime")
+    monkeypatch.setattr(settings, "ONNX_VARIANTS", [GeneratorVariant.optimized])
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    response = client.get("/generators/foo_gan/variants")
+    assert response.status_code == status.HTTP_200_OK
+    [variant] = response.json()
+    assert variant["artifact"] == "gen" and variant["variant"] == "optimized"
+    assert variant["max_abs_error"] == 0.0 and variant["parity_ok"]
+
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get(
+        "/generators/foo_gan/download/gen?variant=optimized", headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert (
+        "foobar_foo_gan_gen_optimized.onnx" in response.headers["content-disposition"]
+    )
+    onnx.checker.check_model(onnx.load_from_string(response.content))
+    response = client.get(
+        "/generators/foo_gan/download/metadata?variant=optimized", headers=headers
+    )
+    assert response.status_code == VariantNotFound.STATUS_CODE
+    assert response.json()["detail"] == VariantNotFound.DETAIL
+    response = client.get(
+        "/generators/foo_gan/download/gen?variant=quantized", headers=headers
+    )
+    assert response.status_code == UnsupportedVariantError.STATUS_CODE
+    assert response.json()["detail"] == UnsupportedVariantError.DETAIL
+
+
+def test_quantized_variants_rejected():
+    with pytest.raises(ValueError):
+        Config(ONNX_VARIANTS=[GeneratorVariant.quantized])
+
+
+def test_generator_variants_disabled(client, onnx_file, json_file):
+    token = register_and_login(client)
+    upload_foo_gan(client, token, onnx_file, json_file)
+    response = client.get("/generators/foo_gan/variants")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
+    response = client.get("/generators/bar_gan/variants")
+    assert response.status_code == GeneratorNotFound.STATUS_CODE
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sgde_api.exceptions import ServiceUnavailable
+from sgde_api.executors import BoundedExecutor, validation_executor
+from sgde_api.tests.conftest import register_and_login
+
+
+def test_bounded_executor_rejects_when_full():
+    release = threading.Event()
+    executor = BoundedExecutor(
+        "test_bounded",
+        max_workers=1,
+        max_queue=1,
+        retry_after=7,
+        executor_factory=lambda workers: ThreadPoolExecutor(max_workers=workers),
+    )
+    futures = [executor.submit(release.wait) for _ in range(2)]
+    assert executor.in_flight == 1
+    assert executor.queue_depth == 1
+    with pytest.raises(ServiceUnavailable) as exc_info:
+        executor.submit(release.wait)
+    assert exc_info.value.headers["Retry-After"] == "7"
+
+    release.set()
+    executor.shutdown()
+    assert all(future.done() for future in futures)
+    assert executor.in_flight == 0
+    assert executor.queue_depth == 0
+    assert asyncio.run(executor.run(sum, [1, 2])) == 3
+    executor.shutdown()
+
+
+def test_bounded_executor_replaces_broken_pool():
+    executor = BoundedExecutor("test_broken", max_workers=1, max_queue=1, retry_after=3)
+    with pytest.raises(ServiceUnavailable) as exc_info:
+        asyncio.run(executor.run(os._exit, 1))
+    assert exc_info.value.headers["Retry-After"] == "3"
+    assert executor.in_flight == 0
+    assert asyncio.run(executor.run(sum, [1, 2])) == 3
+    executor.shutdown()
+
+
+def test_upload_generator_validation_busy(client, onnx_file, json_file, monkeypatch):
+    token = register_and_login(client)
+    monkeypatch.setattr(validation_executor, "max_workers", 0)
+    monkeypatch.setattr(validation_executor, "max_queue", 0)
+    files = {
+        "gen_onnx_file": onnx_file.well_formatted,
+        "json_file": json_file.well_formatted,
+    }
+    response = client.post(
+        "/exchange/upload",
+        headers={"Authorization": f"Bearer {token}"},
+        files=files,
+    )
+    assert response.status_code == ServiceUnavailable.STATUS_CODE
+    assert response.json()["detail"] == ServiceUnavailable.DETAIL
+    assert response.headers["retry-after"] == str(validation_executor.retry_after)
+    assert client.get("/generators/foo_gan").status_code == 404
+
+
+def test_metrics(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "sgde_validation_in_flight 0" in response.text
+    assert "sgde_validation_queue_depth 0" in response.text
+    assert "# TYPE sgde_validation_rejected_total counter" in response.text
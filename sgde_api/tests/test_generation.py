@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import json
+import os
+
+import numpy as np
+import pytest
+from onnx import TensorProto
+from onnx.helper import (
+    make_graph,
+    make_model,
+    make_node,
+    make_opsetid,
+    make_tensor_value_info,
+)
+from onnx.numpy_helper import from_array
+from starlette import status
+
+from sgde_api.auth.exceptions import LoginRequired
+from sgde_api.config import settings
+from sgde_api.database import GeneratorTable, GeneratorUsageTable
+from sgde_api.executors import generation_executor
+from sgde_api.generation.exceptions import (
+    UnsupportedGeneratorError,
+    GenerationTooLargeError,
+    InvalidClassCountsError,
+    ModelFileNotFound,
+)
+from sgde_api.exchange.storage import find_blob
+from sgde_api.generation.batching import MicroBatcher
+from sgde_api.generation.pool import SessionPool, session_pool
+from sgde_api.generation.sampling import create_session, make_inputs
+from sgde_api.generation.utils import warm_up_sessions
+from sgde_api.tests.conftest import register_and_login, foo_gan, AsyncSessionTesting
+
+pytest.importorskip("onnxruntime")
+
+LATENT_DIM = 2
+NUM_CLASSES = 3
+
+
+def make_linear_model(weights: np.ndarray, input_name: str, output_name: str) -> bytes:
+    _input = make_tensor_value_info(
+        input_name, TensorProto.FLOAT, [None, weights.shape[0]]
+    )
+    _output = make_tensor_value_info(
+        output_name, TensorProto.FLOAT, [None, weights.shape[1]]
+    )
+    node = make_node("MatMul", [input_name, "W"], [output_name])
+    graph = make_graph(
+        [node], "linear", [_input], [_output], [from_array(weights, "W")]
+    )
+    model = make_model(graph, opset_imports=[make_opsetid("", 13)])
+    model.ir_version = 8
+    return model.SerializeToString()
+
+
+@pytest.fixture(scope="module")
+def generation_models():
+    # the first features of the samples are their one-hot labels, plus noise
+    gen_weights = np.zeros((LATENT_DIM + NUM_CLASSES, NUM_CLASSES + 1), np.float32)
+    gen_weights[:LATENT_DIM] = 0.01
+    gen_weights[LATENT_DIM:, :NUM_CLASSES] = np.eye(NUM_CLASSES)
+    cls_weights = np.eye(NUM_CLASSES + 1, NUM_CLASSES, dtype=np.float32)
+
+    class Models:
+        gen = make_linear_model(gen_weights, "z", "output_1")
+        cls = make_linear_model(cls_weights, "input_layer", "output_layer")
+        wrong_cls = make_linear_model(
+            np.roll(cls_weights, 1, axis=1), "input_layer", "output_layer"
+        )
+
+    return Models()
+
+
+def upload_generator(client, token, gen, cls=None, **metadata):
+    files = {
+        "gen_onnx_file": ("gen.onnx", gen),
+        "json_file": ("gen.json", json.dumps({**foo_gan, **metadata})),
+    }
+    if cls is not None:
+        files["cls_onnx_file"] = ("cls.onnx", cls)
+    response = client.post(
+        "/exchange/upload", headers={"Authorization": f"Bearer {token}"}, files=files
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+
+
+def generate(client, token, name="foo_gan", **body):
+    return client.post(
+        f"/generators/{name}/generate",
+        headers={"Authorization": f"Bearer {token}"},
+        json=body,
+    )
+
+
+def read_lines(response) -> list[dict]:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_generate_samples(client, generation_models):
+    token = register_and_login(client)
+    upload_generator(
+        client,
+        token,
+        generation_models.gen,
+        generation_models.cls,
+        latent_dim=LATENT_DIM,
+        labels_shape=[NUM_CLASSES],
+    )
+    response = generate(client, token, num_samples=7, seed=1)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = read_lines(response)
+    assert [line["label"] for line in lines] == [0, 1, 2, 0, 1, 2, 0]
+    for line in lines:
+        assert len(line["sample"]) == NUM_CLASSES + 1
+        assert np.argmax(line["sample"][:NUM_CLASSES]) == line["label"]
+    assert read_lines(generate(client, token, num_samples=7, seed=1)) == lines
+    assert read_lines(generate(client, token, num_samples=7, seed=2)) != lines
+
+    response = generate(client, token, class_counts=[2, 0, 1])
+    assert [line["label"] for line in read_lines(response)] == [0, 2, 0]
+
+
+def test_generate_samples_rejected(client, generation_models, monkeypatch):
+    monkeypatch.setattr(settings, "GENERATION_MAX_ATTEMPTS", 2)
+    token = register_and_login(client)
+    upload_generator(
+        client,
+        token,
+        generation_models.gen,
+        generation_models.wrong_cls,
+        latent_dim=LATENT_DIM,
+        labels_shape=[NUM_CLASSES],
+    )
+    response = generate(client, token, num_samples=5)
+    assert response.status_code == status.HTTP_200_OK
+    assert read_lines(response) == [
+        {"detail": "5 samples were rejected by the classifier 2 times"}
+    ]
+    response = generate(client, token, num_samples=5, filter=False)
+    assert len(read_lines(response)) == 5
+
+
+def test_generate_samples_invalid(client, generation_models, monkeypatch):
+    token = register_and_login(client)
+    upload_generator(
+        client,
+        token,
+        generation_models.gen,
+        latent_dim=LATENT_DIM,
+        labels_shape=[NUM_CLASSES],
+    )
+    response = generate(client, token, class_counts=[1, 2])
+    assert response.status_code == InvalidClassCountsError.STATUS_CODE
+    assert response.json()["detail"] == InvalidClassCountsError.DETAIL
+    monkeypatch.setattr(settings, "GENERATION_MAX_SAMPLES", 10)
+    response = generate(client, token, num_samples=11)
+    assert response.status_code == GenerationTooLargeError.STATUS_CODE
+    assert response.json()["detail"] == GenerationTooLargeError.DETAIL
+    for body in [{}, {"num_samples": 2, "class_counts": [1, 0, 0]}]:
+        response = generate(client, token, **body)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    response = client.post("/generators/foo_gan/generate", json={"num_samples": 1})
+    assert response.status_code == LoginRequired.STATUS_CODE
+
+
+def test_generate_samples_unsupported_generator(client, generation_models):
+    token = register_and_login(client)
+    upload_generator(client, token, generation_models.gen)
+    response = generate(client, token, num_samples=1)
+    assert response.status_code == UnsupportedGeneratorError.STATUS_CODE
+    assert response.json()["detail"] == UnsupportedGeneratorError.DETAIL
+    response = generate(client, token, name="bar_gan", num_samples=1)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_generate_samples_missing_blob(client, db_session, generation_models):
+    session_pool.clear()
+    token = register_and_login(client)
+    upload_generator(
+        client,
+        token,
+        generation_models.gen,
+        latent_dim=LATENT_DIM,
+        labels_shape=[NUM_CLASSES],
+    )
+    os.unlink(find_blob(db_session.query(GeneratorTable.gen_onnx_file).scalar())[0])
+    response = generate(client, token, num_samples=1)
+    assert response.status_code == ModelFileNotFound.STATUS_CODE
+    assert response.json()["detail"] == ModelFileNotFound.DETAIL
+    os.unlink(find_blob(db_session.query(GeneratorTable.json_file).scalar())[0])
+    response = generate(client, token, num_samples=1)
+    assert response.status_code == ModelFileNotFound.STATUS_CODE
+
+
+async def warm_up(session_maker):
+    async with session_maker() as db:
+        await warm_up_sessions(db)
+
+
+def test_generation_sessions_pooled(client, db_session, generation_models):
+    session_pool.clear()
+    token = register_and_login(client)
+    upload_generator(
+        client,
+        token,
+        generation_models.gen,
+        generation_models.cls,
+        latent_dim=LATENT_DIM,
+        labels_shape=[NUM_CLASSES],
+    )
+    hits, misses = session_pool.hits, session_pool.misses
+    assert generate(client, token, num_samples=3).status_code == status.HTTP_200_OK
+    assert (session_pool.hits, session_pool.misses) == (hits, misses + 2)
+    assert session_pool.resident_bytes == len(generation_models.gen) + len(
+        generation_models.cls
+    )
+    assert generate(client, token, num_samples=3).status_code == status.HTTP_200_OK
+    assert (session_pool.hits, session_pool.misses) == (hits + 2, misses + 2)
+    usage = db_session.query(GeneratorUsageTable).one()
+    assert usage.generations == 2
+
+    session_pool.clear()
+    asyncio.run(warm_up(AsyncSessionTesting))
+    hits = session_pool.hits
+    assert generate(client, token, num_samples=3).status_code == status.HTTP_200_OK
+    assert session_pool.hits == hits + 2
+
+
+def test_session_pool_eviction(client, db_session, generation_models):
+    token = register_and_login(client)
+    upload_generator(client, token, generation_models.gen, generation_models.cls)
+    gen_digest = hashlib.sha256(generation_models.gen).hexdigest()
+    cls_digest = hashlib.sha256(generation_models.cls).hexdigest()
+    pool = SessionPool(
+        "test_session",
+        max_bytes=len(generation_models.gen) + len(generation_models.cls) - 1,
+        executor=generation_executor,
+    )
+    asyncio.run(pool.get(gen_digest))
+    asyncio.run(pool.get(cls_digest))
+    assert gen_digest not in pool
+    assert cls_digest in pool
+    assert pool.resident_bytes == len(generation_models.cls)
+    asyncio.run(pool.get(cls_digest))
+    assert (pool.hits, pool.misses) == (1, 2)
+    with pytest.raises(ValueError):
+        asyncio.run(pool.get(db_session.query(GeneratorTable.json_file).scalar()))
+
+
+@pytest.mark.parametrize("max_wait,runs", [(60.0, 2), (0.0, 3)])
+def test_micro_batching(generation_models, max_wait, runs):
+    models = (
+        create_session(generation_models.gen),
+        create_session(generation_models.cls),
+    )
+    batcher = MicroBatcher(
+        "test_batcher",
+        max_batch_size=9,
+        max_wait=max_wait,
+        executor=generation_executor,
+    )
+    rng = np.random.default_rng(0)
+    batches = []
+    for size in [2, 3, 4]:
+        labels = np.arange(size) % NUM_CLASSES
+        batches.append((make_inputs(labels, LATENT_DIM, rng, NUM_CLASSES), labels))
+
+    async def run_concurrently():
+        return await asyncio.gather(
+            *[batcher.run("foo_gan", models, *batch) for batch in batches]
+        )
+
+    results = asyncio.run(run_concurrently())
+    assert (batcher.runs, batcher.batches) == (runs, 3)
+    for (lines, rejected), (_, labels) in zip(results, batches):
+        assert [json.loads(line)["label"] for line in lines.splitlines()] == list(
+            labels
+        )
+        assert not len(rejected)
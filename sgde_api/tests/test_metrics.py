@@ -0,0 +1,78 @@
+from starlette import status
+
+from sgde_api.database import query_duration
+from sgde_api.metrics import (
+    MetricsRegistry,
+    operation_duration,
+    http_request_duration,
+    http_requests,
+    http_response_bytes,
+)
+from sgde_api.tests.conftest import register_and_login
+from sgde_api.tests.test_exchange import upload_foo_gan
+
+
+def test_histogram_render():
+    registry = MetricsRegistry()
+    histogram = registry.histogram(
+        "test_duration_seconds", "Test durations", labels=("op",), buckets=(0.1, 1.0)
+    )
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(5, "a")
+    counter = registry.labeled_counter("test_total", "Test counter", labels=("op",))
+    counter.inc('say "hi"', amount=2)
+    lines = registry.render().splitlines()
+    assert "# TYPE test_duration_seconds histogram" in lines
+    assert 'test_duration_seconds_bucket{op="a",le="0.1"} 1' in lines
+    assert 'test_duration_seconds_bucket{op="a",le="1.0"} 2' in lines
+    assert 'test_duration_seconds_bucket{op="a",le="+Inf"} 3' in lines
+    assert 'test_duration_seconds_count{op="a"} 3' in lines
+    assert 'test_duration_seconds_sum{op="a"} 5.55' in lines
+    assert 'test_total{op="say \\"hi\\""} 2' in lines
+
+
+def test_request_metrics(client):
+    route = "/generators/{name}"
+    count = http_request_duration.count("GET", route)
+    not_found = http_requests.value("GET", route, "404")
+    response_bytes = http_response_bytes.value("GET", route)
+    response = client.get("/generators/foo_gan")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert http_request_duration.count("GET", route) == count + 1
+    assert http_requests.value("GET", route, "404") == not_found + 1
+    assert http_response_bytes.value("GET", route) == response_bytes + len(
+        response.content
+    )
+
+    unmatched = http_requests.value("GET", "unmatched", "404")
+    client.get("/no/such/route")
+    assert http_requests.value("GET", "unmatched", "404") == unmatched + 1
+
+
+def test_upload_operation_metrics(client, onnx_file, json_file):
+    token = register_and_login(client)
+    operations = [
+        "save_generator_file",
+        "stage_upload_file",
+        "onnx_check_model",
+        "store_blob",
+        "commit_generator",
+    ]
+    counts = [operation_duration.count(operation) for operation in operations]
+    inserts = query_duration.count("INSERT")
+    response = upload_foo_gan(client, token, onnx_file, json_file)
+    assert response.status_code == status.HTTP_201_CREATED
+    for operation, count in zip(operations, counts):
+        assert operation_duration.count(operation) == count + 1
+    assert query_duration.count("INSERT") > inserts
+
+    bundles = operation_duration.count("build_bundle")
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/generators/foo_gan/download", headers=headers)
+    client.get("/generators/foo_gan/download", headers=headers)
+    assert operation_duration.count("build_bundle") == bundles + 1
+
+    text = client.get("/metrics").text
+    assert 'sgde_operation_duration_seconds_count{operation="build_bundle"}' in text
+    assert "# TYPE sgde_http_request_duration_seconds histogram" in text
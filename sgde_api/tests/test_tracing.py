@@ -0,0 +1,77 @@
+import json
+import logging
+
+from starlette import status
+
+from sgde_api.admin.exceptions import AdminRequired
+from sgde_api.auth.exceptions import LoginRequired
+from sgde_api.config import settings
+from sgde_api.tracing import slow_traces
+from sgde_api.tests.conftest import register_and_login, foobar
+from sgde_api.tests.test_exchange import upload_foo_gan
+
+
+def find_spans(span: dict, name: str) -> list[dict]:
+    spans = [span] if span["name"] == name else []
+    for child in span.get("children", []):
+        spans.extend(find_spans(child, name))
+    return spans
+
+
+def test_slow_request_traced(client, onnx_file, json_file, monkeypatch, caplog):
+    token = register_and_login(client)
+    slow_traces.clear()
+    monkeypatch.setattr(settings, "TRACE_SLOW_REQUEST_THRESHOLD", 0.0)
+    with caplog.at_level(logging.WARNING, logger="sgde_api.tracing"):
+        response = upload_foo_gan(client, token, onnx_file, json_file)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    trace = slow_traces[-1]
+    assert json.loads(caplog.records[-1].getMessage()) == trace
+    assert trace["name"] == "request"
+    assert trace["attributes"]["path"] == "/exchange/upload"
+    assert trace["attributes"]["status"] == status.HTTP_201_CREATED
+    assert trace["attributes"]["dropped_spans"] == 0
+    assert find_spans(trace, "verify_token")
+    [save] = find_spans(trace, "save_generator_file")
+    assert [child["name"] for child in save["children"]][:2] == [
+        "stage_upload_file",
+        "onnx_check_model",
+    ]
+    assert not find_spans(save, "db_query")
+    [commit] = find_spans(trace, "commit_generator")
+    assert find_spans(commit, "db_query")
+
+
+def test_traces_bounded(client, monkeypatch):
+    register_and_login(client)
+    slow_traces.clear()
+    monkeypatch.setattr(settings, "TRACE_SLOW_REQUEST_THRESHOLD", None)
+    client.get("/generators/")
+    assert not slow_traces
+
+    monkeypatch.setattr(settings, "TRACE_SLOW_REQUEST_THRESHOLD", 0.0)
+    monkeypatch.setattr(settings, "TRACE_MAX_SPANS", 1)
+    client.get("/users/")
+    assert "children" not in slow_traces[-1]
+    assert slow_traces[-1]["attributes"]["dropped_spans"] > 0
+
+
+def test_admin_traces(client, monkeypatch):
+    token = register_and_login(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    slow_traces.clear()
+    response = client.get("/admin/traces")
+    assert response.status_code == LoginRequired.STATUS_CODE
+    response = client.get("/admin/traces", headers=headers)
+    assert response.status_code == AdminRequired.STATUS_CODE
+    assert response.json()["detail"] == AdminRequired.DETAIL
+
+    monkeypatch.setattr(settings, "ADMIN_USERS", [foobar["username"]])
+    monkeypatch.setattr(settings, "TRACE_SLOW_REQUEST_THRESHOLD", 0.0)
+    client.get("/generators/")
+    client.get("/generators/foo_gan")
+    response = client.get("/admin/traces", headers=headers, params={"limit": 1})
+    assert response.status_code == status.HTTP_200_OK
+    [trace] = response.json()
+    assert trace["attributes"]["path"] == "/generators/foo_gan"
@@ -0,0 +1,188 @@
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Iterator
+
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+from sgde_api.config import settings
+from sgde_api.metrics import operation_duration
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """
+    Timed step of a request, with the steps it is made of. The spans of a
+    request share a budget of TRACE_MAX_SPANS spans; the spans beyond it are
+    only counted, so that bulk requests cannot grow a trace without bound.
+    """
+
+    __slots__ = ("name", "attributes", "start", "end", "children", "root")
+
+    def __init__(self, name: str, attributes: dict[str, Any], root: "Span" = None):
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.end: float | None = None
+        self.children: list[Span] = []
+        self.root = root or self
+        if root is None:
+            self.attributes.update(spans=1, dropped_spans=0)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def child(self, name: str, attributes: dict[str, Any]) -> "Span | None":
+        """
+        Start a child span.
+        :param name: name of the span
+        :param attributes: attributes of the span
+        :return: Span object, or None if the trace is full
+        """
+        root_attributes = self.root.attributes
+        if root_attributes["spans"] >= settings.TRACE_MAX_SPANS:
+            root_attributes["dropped_spans"] += 1
+            return None
+        root_attributes["spans"] += 1
+        span = Span(name, attributes, self.root)
+        self.children.append(span)
+        return span
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    def to_dict(self, origin: float | None = None) -> dict:
+        """
+        Convert the span and its children to a dictionary, with times in
+        milliseconds relative to the start of the trace.
+        :param origin: start time of the trace
+        :return: dictionary of the span
+        """
+        origin = self.start if origin is None else origin
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            **({"attributes": self.attributes} if self.attributes else {}),
+            **(
+                {"children": [child.to_dict(origin) for child in self.children]}
+                if self.children
+                else {}
+            ),
+        }
+
+
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+slow_traces: deque[dict] = deque(maxlen=settings.TRACE_BUFFER_SIZE)
+
+
+def start_span(name: str, **attributes: Any) -> Span | None:
+    """
+    Start a child of the current span, without making it current. The caller
+    must finish it.
+    :param name: name of the span
+    :param attributes: attributes of the span
+    :return: Span object, or None if no request is traced or the trace is full
+    """
+    parent = current_span.get()
+    if parent is None:
+        return None
+    return parent.child(name, attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    """
+    Trace a block of code as a child of the current span, and make it the
+    current span inside the block. Exceptions are recorded in its attributes.
+    It does nothing if no request is traced.
+    :param name: name of the span
+    :param attributes: attributes of the span
+    :return: Span object, or None
+    """
+    child = start_span(name, **attributes)
+    if child is None:
+        yield None
+        return
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.attributes["error"] = type(exc).__name__
+        raise
+    finally:
+        current_span.reset(token)
+        child.finish()
+
+
+@contextmanager
+def operation(name: str) -> Iterator[Span | None]:
+    """
+    Trace an internal operation of the server as a span, and observe its
+    duration in the operation metrics.
+    :param name: name of the operation
+    :return: Span object, or None
+    """
+    with operation_duration.time(name), span(name) as child:
+        yield child
+
+
+def record_slow_request(root: Span):
+    """
+    Log the trace of a slow request as JSON, and keep it in the ring buffer of
+    the last TRACE_BUFFER_SIZE slow requests.
+    :param root: root span of the request
+    """
+    trace = {
+        "trace_id": uuid.uuid4().hex,
+        "timestamp": datetime.utcnow().isoformat(),
+        **root.to_dict(),
+    }
+    logger.warning(json.dumps(trace))
+    slow_traces.append(trace)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware giving each HTTP request a tree of spans, filled by the
+    steps it goes through, e.g. authentication, SQL statements, file I/O and
+    validation. Requests slower than TRACE_SLOW_REQUEST_THRESHOLD seconds are
+    recorded by record_slow_request; no request is traced if the threshold is
+    None.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        threshold = settings.TRACE_SLOW_REQUEST_THRESHOLD
+        if scope["type"] != "http" or threshold is None:
+            await self.app(scope, receive, send)
+            return
+
+        root = Span("request", {"method": scope["method"], "path": scope["path"]})
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = current_span.set(root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_span.reset(token)
+            root.finish()
+            root.attributes["status"] = status_code
+            if root.duration >= threshold:
+                record_slow_request(root)
@@ -7,6 +7,8 @@ class Config(BaseSettings):
     API_IP: str = "127.0.0.1"
     API_PORT: int = 8000
     DEBUG_MODE: bool = False
+    DOWNLOAD_RETRIES: int = 5
+    DOWNLOAD_CHUNK_SIZE: int = 1024 * 1024
 
     class Config:
         env_file = ".client.env"
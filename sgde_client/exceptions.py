@@ -23,3 +23,8 @@ class ServerUnreachable(ClientException):
         super(ServerUnreachable, self).__init__(
             f"Server unreachable ({settings.API_IP}:{settings.API_PORT})"
         )
+
+
+class GenerationError(ClientException):
+    def __init__(self, detail: str):
+        super(GenerationError, self).__init__(f"Sample generation failed: {detail}")
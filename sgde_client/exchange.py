@@ -1,29 +1,104 @@
+import io
 import json
 import os.path
+import tarfile
+import tempfile
 import zipfile
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Iterator
 
 import pandas as pd
 
 from sgde_client.config import logger
-from sgde_utils.schemas import Generator, GeneratorExtended
-from sgde_client.utils import get_request, post_request
+from sgde_utils.schemas import (
+    Generator,
+    GeneratorExtended,
+    GeneratorFilter,
+    GeneratorSort,
+    GeneratorArtifact,
+    GeneratorUploadResult,
+    GeneratorLookup,
+    GeneratorVariant,
+    GeneratorVariantInfo,
+)
+from sgde_client.utils import get_request, post_request, download_file
 
 
-@get_request()
-def get_generators_request():
-    """Get all generators HTTP request"""
-    return f"generators", {}
+def get_filter_params(**filters) -> dict:
+    """Get the query parameters of a generator filter"""
+    params = GeneratorFilter(**filters).dict(exclude_none=True)
+    if "extra" in params:
+        params["extra"] = [
+            key if value is None else f"{key}={json.dumps(value)}"
+            for key, value in params["extra"].items()
+        ]
+    return params
+
+
+@get_request(conditional=True)
+def get_generators_request(params: dict):
+    """Get a page of generators HTTP request"""
+    return f"generators", {"params": params}
+
+
+def iter_generator_pages(
+    sort: Optional[str] = None, page_size: Optional[int] = None, **filters
+) -> Iterator[pd.DataFrame]:
+    """Lazily iterate over the pages of generators matching the given filters"""
+    params = get_filter_params(**filters)
+    if sort:
+        params["sort"] = GeneratorSort(sort).value
+    if page_size:
+        params["limit"] = page_size
+    while True:
+        response = get_generators_request(params=params)
+        yield pd.DataFrame(response.json())
+        if "x-next-cursor" not in response.headers:
+            break
+        params = {**params, "cursor": response.headers["x-next-cursor"]}
 
 
-def get_generators() -> pd.DataFrame:
-    """Get all generators"""
-    response = get_generators_request()
-    return pd.DataFrame(response.json())
+def get_generators(
+    sort: Optional[str] = None, page_size: Optional[int] = None, **filters
+) -> pd.DataFrame:
+    """Get all generators matching the given filters"""
+    pages = list(iter_generator_pages(sort=sort, page_size=page_size, **filters))
+    return pd.concat(pages, ignore_index=True)
+
+
+@post_request()
+def lookup_generators_request(lookup: GeneratorLookup):
+    """Look up many generators HTTP request"""
+    return f"generators/lookup", {"json": lookup.dict(exclude_none=True)}
+
+
+def lookup_generators(names: Optional[list[str]] = None, **filters) -> pd.DataFrame:
+    """Get the metadata of many generators, by name and/or filter, in one request"""
+    lookup = GeneratorLookup(
+        names=names, filter=GeneratorFilter(**filters) if filters else None
+    )
+    response = lookup_generators_request(lookup=lookup)
+    return pd.DataFrame(response.json(), columns=list(Generator.__fields__))
 
 
 @get_request()
+def search_generators_request(params: dict):
+    """Search generators HTTP request"""
+    return f"generators/search", {"params": params}
+
+
+def search_generators(
+    query: str, limit: Optional[int] = None, **filters
+) -> pd.DataFrame:
+    """Search the generators matching a full-text query, most relevant first"""
+    params = {"q": query, **get_filter_params(**filters)}
+    if limit:
+        params["limit"] = limit
+    response = search_generators_request(params=params)
+    return pd.DataFrame(response.json(), columns=list(Generator.__fields__))
+
+
+@get_request(conditional=True)
 def get_generator_request(generator_name: str):
     """Get a single generator metadata HTTP request"""
     return f"generators/{generator_name}", {}
@@ -36,19 +111,17 @@ def get_generator_metadata(generator_name: str) -> Generator:
 
 
 @get_request(authenticate=True)
-def download_generator_request(generator_name: str):
+def download_generator_request(generator_name: str, headers: dict):
     """Download a single generator HTTP request"""
-    return f"generators/{generator_name}/download", {}
+    return f"generators/{generator_name}/download", {"headers": headers, "stream": True}
 
 
 def download_generator(generator_name: str) -> dict:
     """Download a single generator (both ONNX and JSON files with metadata)"""
-    response = download_generator_request(generator_name=generator_name)
     t = datetime.utcnow().strftime("%y%m%d%H%M%S")
     zip_filename = f"{generator_name}_{t}.zip"
     zip_path = os.path.join(os.getcwd(), zip_filename)
-    with open(zip_path, "wb") as f:
-        f.write(response.content)
+    download_file(download_generator_request, zip_path, generator_name=generator_name)
     logger.info(f"Generator downloaded at {zip_path}")
     gen_onnx_filename = f"{generator_name}_gen_{t}.onnx"
     cls_onnx_filename = f"{generator_name}_cls_{t}.onnx"
@@ -75,6 +148,73 @@ def download_generator(generator_name: str) -> dict:
     return metadata
 
 
+@get_request(authenticate=True)
+def download_generator_artifact_request(
+    generator_name: str, artifact: str, params: dict, headers: dict
+):
+    """Download a single artifact of a generator HTTP request"""
+    return f"generators/{generator_name}/download/{artifact}", {
+        "params": params,
+        "headers": headers,
+        "stream": True,
+    }
+
+
+def download_generator_artifact(
+    generator_name: str,
+    artifact: str,
+    path: Optional[str] = None,
+    variant: Optional[str] = None,
+) -> str:
+    """Download a single artifact of a generator ("gen", "cls", or "metadata"), or one of its variants"""
+    artifact = GeneratorArtifact(artifact).value
+    params = {"variant": GeneratorVariant(variant).value} if variant else {}
+    if path is None:
+        extension = "json" if artifact == GeneratorArtifact.metadata else "onnx"
+        suffix = f"_{params['variant']}" if variant else ""
+        t = datetime.utcnow().strftime("%y%m%d%H%M%S")
+        path = os.path.join(
+            os.getcwd(), f"{generator_name}_{artifact}{suffix}_{t}.{extension}"
+        )
+    download_file(
+        download_generator_artifact_request,
+        path,
+        generator_name=generator_name,
+        artifact=artifact,
+        params=params,
+    )
+    logger.info(f"Generator {artifact} downloaded at {path}")
+    return path
+
+
+@get_request()
+def get_generator_variants_request(generator_name: str):
+    """Get the variants of a generator HTTP request"""
+    return f"generators/{generator_name}/variants", {}
+
+
+def get_generator_variants(generator_name: str) -> list[GeneratorVariantInfo]:
+    """Get the ONNX variants derived by the server from a generator's artifacts"""
+    response = get_generator_variants_request(generator_name=generator_name)
+    return [GeneratorVariantInfo(**variant) for variant in response.json()]
+
+
+def download_generator_files(generator_name: str, include_cls: bool = False) -> dict:
+    """Download the generator ONNX file, and optionally the classifier, without the zip bundle"""
+    json_path = download_generator_artifact(generator_name, GeneratorArtifact.metadata)
+    with open(json_path, "r") as f:
+        metadata = json.load(f)
+    os.remove(json_path)
+    metadata["generator_path"] = download_generator_artifact(
+        generator_name, GeneratorArtifact.gen
+    )
+    if include_cls:
+        metadata["real_predictor_path"] = download_generator_artifact(
+            generator_name, GeneratorArtifact.cls
+        )
+    return metadata
+
+
 @post_request(authenticate=True)
 def upload_generator_request(metadata: dict, gen_path: str, cls_path: str):
     """Upload a generator HTTP request"""
@@ -105,3 +245,50 @@ def upload_generator(metadata: dict) -> Generator:
     generator = Generator(**response.json())
     logger.info(f"Generator uploaded as {response.json()['name']}")
     return generator
+
+
+def get_onnx_path(path: str) -> str:
+    """Get the ONNX file of a model given as a file or as a folder"""
+    return os.path.join(path, "model.onnx") if os.path.isdir(path) else path
+
+
+def write_generators_archive(metadata_list: list[dict], archive_file):
+    """Write the generators to a tar stream, named as in the download bundles"""
+    with tarfile.open(fileobj=archive_file, mode="w") as archive:
+        for metadata in metadata_list:
+            parsed_metadata = GeneratorExtended(**metadata)
+            name = parsed_metadata.name
+            archive.add(get_onnx_path(metadata["generator_path"]), f"{name}_gen.onnx")
+            if "real_predictor_path" in metadata:
+                cls_path = get_onnx_path(metadata["real_predictor_path"])
+                archive.add(cls_path, f"{name}_cls.onnx")
+            json_file = parsed_metadata.json().encode()
+            info = tarfile.TarInfo(f"{name}.json")
+            info.size = len(json_file)
+            archive.addfile(info, io.BytesIO(json_file))
+    archive_file.seek(0)
+
+
+@post_request(authenticate=True)
+def upload_generators_request(archive_file, atomic: bool):
+    """Upload many generators HTTP request"""
+    return f"exchange/upload/batch", {
+        "files": {"archive": ("generators.tar", archive_file)},
+        "params": {"atomic": atomic},
+    }
+
+
+def upload_generators(
+    metadata_list: list[dict], atomic: bool = False
+) -> list[GeneratorUploadResult]:
+    """Upload many generators in a single request and transaction"""
+    with tempfile.TemporaryFile() as archive_file:
+        write_generators_archive(metadata_list, archive_file)
+        response = upload_generators_request(archive_file=archive_file, atomic=atomic)
+    results = [GeneratorUploadResult(**result) for result in response.json()]
+    for result in results:
+        if result.created:
+            logger.info(f"Generator uploaded as {result.generator.name}")
+        else:
+            logger.warning(f"Generator {result.key} not uploaded: {result.detail}")
+    return results
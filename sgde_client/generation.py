@@ -0,0 +1,50 @@
+import json
+from typing import Optional
+
+import numpy as np
+
+from sgde_client.config import logger
+from sgde_client.exceptions import GenerationError
+from sgde_client.utils import post_request
+from sgde_utils.schemas import GenerationRequest
+
+
+@post_request(authenticate=True)
+def generate_samples_request(generator_name: str, request: GenerationRequest):
+    """Generate samples on the server HTTP request"""
+    return f"generators/{generator_name}/generate", {
+        "json": request.dict(exclude_none=True),
+        "stream": True,
+    }
+
+
+def generate_samples(
+    generator_name: str,
+    num_samples: Optional[int] = None,
+    class_counts: Optional[list[int]] = None,
+    seed: Optional[int] = None,
+    filter_model: bool = True,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Generate synthetic samples on the server, without downloading the generator"""
+    request = GenerationRequest(
+        num_samples=num_samples,
+        class_counts=class_counts,
+        seed=seed,
+        filter=filter_model,
+    )
+    response = generate_samples_request(generator_name=generator_name, request=request)
+    samples, labels = [], []
+    for line in response.iter_lines():
+        if not line:
+            continue
+        record = json.loads(line)
+        if "detail" in record:
+            raise GenerationError(record["detail"])
+        samples.append(record["sample"])
+        labels.append(record["label"])
+    logger.info(f"{len(samples)} samples generated with {generator_name}")
+    num_classes = len(class_counts) if class_counts else max(labels, default=-1) + 1
+    return (
+        np.array(samples, dtype=np.float32),
+        np.eye(num_classes, dtype=np.float32)[labels],
+    )
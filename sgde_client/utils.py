@@ -1,8 +1,12 @@
 import functools
+import gzip
 import os
+import shutil
+import time
 from json import JSONDecodeError
 
 import requests
+import urllib3
 
 from sgde_client.exceptions import (
     ResponseException,
@@ -11,12 +15,15 @@ from sgde_client.exceptions import (
 )
 from sgde_client.config import settings, logger
 
+conditional_cache: dict[str, requests.Response] = {}
 
-def send_request(method: str, authenticate: bool = False):
+
+def send_request(method: str, authenticate: bool = False, conditional: bool = False):
     """
     Decorator for sending requests to the API.
     :param method: GET or POST
     :param authenticate: Whether to authenticate the request
+    :param conditional: Whether to revalidate a local copy of the last response
     """
 
     def decorator_fn(fn):
@@ -40,6 +47,19 @@ def send_request(method: str, authenticate: bool = False):
                 payload["headers"]["Authorization"] = f"Bearer {token}"
 
             url = f"http://{settings.API_IP}:{settings.API_PORT}/{uri}"
+            cache_key = requests.Request(method, url, params=payload.get("params"))
+            cache_key = cache_key.prepare().url
+            cached_resp = conditional_cache.get(cache_key) if conditional else None
+            if cached_resp is not None:
+                if "headers" not in payload:
+                    payload["headers"] = {}
+                if "etag" in cached_resp.headers:
+                    payload["headers"]["If-None-Match"] = cached_resp.headers["etag"]
+                if "last-modified" in cached_resp.headers:
+                    payload["headers"]["If-Modified-Since"] = cached_resp.headers[
+                        "last-modified"
+                    ]
+
             if settings.DEBUG_MODE:
                 logger.info(f"Sending {method} request to {url}")
             try:
@@ -47,7 +67,15 @@ def send_request(method: str, authenticate: bool = False):
             except requests.ConnectionError:
                 raise ServerUnreachable()
 
-            if resp.status_code not in [200, 201]:
+            if resp.status_code == 304 and cached_resp is not None:
+                if settings.DEBUG_MODE:
+                    logger.info(f"Received 304, using local copy of {url}")
+                return cached_resp
+            if conditional and resp.status_code == 200:
+                if "etag" in resp.headers or "last-modified" in resp.headers:
+                    conditional_cache[cache_key] = resp
+
+            if resp.status_code not in [200, 201, 206]:
                 try:
                     raise ResponseException(resp.status_code, str(resp.json()))
                 except JSONDecodeError:
@@ -56,12 +84,20 @@ def send_request(method: str, authenticate: bool = False):
                     )
 
             if settings.DEBUG_MODE:
-                try:
-                    logger.info(f"Received {resp.status_code}, {resp.json()}")
-                except JSONDecodeError:
-                    logger.warning(
-                        f"Received {resp.status_code}, but cannot decode JSON response"
-                    )
+                content_type = resp.headers.get("content-type", "")
+                if payload.get("stream") or not content_type.startswith(
+                    "application/json"
+                ):
+                    # reading the body would consume streamed downloads
+                    logger.info(f"Received {resp.status_code}, {content_type}")
+                else:
+                    try:
+                        logger.info(f"Received {resp.status_code}, {resp.json()}")
+                    except JSONDecodeError:
+                        logger.warning(
+                            f"Received {resp.status_code}, "
+                            f"but cannot decode JSON response"
+                        )
             return resp
 
         return wrapped_fn
@@ -69,12 +105,15 @@ def send_request(method: str, authenticate: bool = False):
     return decorator_fn
 
 
-def get_request(authenticate: bool = False):
+def get_request(authenticate: bool = False, conditional: bool = False):
     """
     Decorator for sending GET requests to the API.
     :param authenticate: Whether to authenticate the request
+    :param conditional: Whether to revalidate a local copy of the last response
     """
-    return send_request(method="GET", authenticate=authenticate)
+    return send_request(
+        method="GET", authenticate=authenticate, conditional=conditional
+    )
 
 
 def post_request(authenticate: bool = False):
@@ -83,3 +122,63 @@ def post_request(authenticate: bool = False):
     :param authenticate: Whether to authenticate the request
     """
     return send_request(method="POST", authenticate=authenticate)
+
+
+def download_file(request_fn, path: str, **kwargs):
+    """
+    Download a file through a decorated GET request, resuming the download with
+    a Range request if the connection drops. The If-Range header makes the
+    server send the whole file again if it changed in the meantime.
+    If the server rejects the range (416), e.g. because the partial file is
+    not shorter than the file on the server, the partial file is deleted and
+    the download starts again from the beginning.
+    The body is written as received, since ranges refer to the encoded bytes,
+    and decoded once complete if the server sent it compressed.
+    :param request_fn: GET request function accepting extra headers
+    :param path: destination path of the downloaded file
+    :param kwargs: arguments of the request function
+    """
+    part_path = f"{path}.part"
+    etag, encoding = None, None
+    attempt, restarted = 0, False
+    while True:
+        headers = {}
+        if etag and os.path.exists(part_path):
+            headers["Range"] = f"bytes={os.path.getsize(part_path)}-"
+            headers["If-Range"] = etag
+        try:
+            resp = request_fn(headers=headers, **kwargs)
+            etag = resp.headers.get("etag")
+            if resp.status_code != 206:
+                encoding = resp.headers.get("content-encoding")
+            mode = "ab" if resp.status_code == 206 else "wb"
+            with open(part_path, mode) as f:
+                for chunk in resp.raw.stream(
+                    settings.DOWNLOAD_CHUNK_SIZE, decode_content=False
+                ):
+                    f.write(chunk)
+            break
+        except ResponseException as exc:
+            if exc.status_code != 416 or "Range" not in headers or restarted:
+                raise
+            logger.warning("Cannot resume the download, restarting it")
+            os.unlink(part_path)
+            etag, restarted = None, True
+        except (
+            ServerUnreachable,
+            requests.ConnectionError,
+            requests.exceptions.ChunkedEncodingError,
+            urllib3.exceptions.HTTPError,
+        ):
+            if attempt == settings.DOWNLOAD_RETRIES:
+                raise
+            attempt += 1
+            logger.warning(f"Download interrupted, resuming ({attempt})")
+            time.sleep(min(2 ** (attempt - 1), 30))
+    if encoding == "gzip":
+        with gzip.open(part_path, "rb") as src, open(f"{path}.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst, settings.DOWNLOAD_CHUNK_SIZE)
+        os.replace(f"{path}.tmp", path)
+        os.unlink(part_path)
+    else:
+        os.replace(part_path, path)
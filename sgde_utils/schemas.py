@@ -1,5 +1,7 @@
 import re
+from datetime import datetime
 from enum import Enum
+from typing import Any
 
 from pydantic import BaseModel, Field, EmailStr, validator, root_validator
 
@@ -144,3 +146,149 @@ class Generator(GeneratorBase):
 
     owner: str = Field()
     has_cls: bool = Field()
+
+
+class GeneratorUploadResult(SGDEBaseModel):
+    """
+    Class for the outcome of a generator in a batch upload.
+    """
+
+    key: str = Field()
+    created: bool = Field()
+    detail: str | None = Field(default=None)
+    generator: Generator | None = Field(default=None)
+
+
+class GeneratorArtifact(str, Enum):
+    """
+    Enum class for the artifacts of a generator that can be downloaded alone.
+    """
+
+    gen = "gen"
+    cls = "cls"
+    metadata = "metadata"
+
+
+class GeneratorVariant(str, Enum):
+    """
+    Enum class for the variants of the ONNX artifacts derived by the server:
+    offline-optimized graphs and dynamically quantized int8 models, which the
+    server does not support yet.
+    """
+
+    optimized = "optimized"
+    quantized = "quantized"
+
+
+class GeneratorVariantInfo(SGDEBaseModel):
+    """
+    Class for a variant of a generator's ONNX artifact, with the outcome of its
+    numerical parity check against the original model.
+    """
+
+    artifact: GeneratorArtifact = Field()
+    variant: GeneratorVariant = Field()
+    max_abs_error: float = Field()
+    parity_ok: bool = Field()
+    created_at: datetime = Field()
+
+
+class GeneratorSort(str, Enum):
+    """
+    Enum class for the sorting orders of the generator catalog. A leading dash
+    sorts in descending order.
+    """
+
+    created = "created"
+    created_desc = "-created"
+    name = "name"
+    name_desc = "-name"
+    best_score = "best_score"
+    best_score_desc = "-best_score"
+    best_score_real = "best_score_real"
+    best_score_real_desc = "-best_score_real"
+
+
+class GeneratorFilterBase(SGDEBaseModel):
+    """
+    Base class for filtering the generator catalog by its columns. Unset fields
+    are ignored.
+    """
+
+    data_structure: DataStructure = Field(default=None)
+    data_length: int = Field(default=None)
+    task: Task = Field(default=None)
+    metric: str = Field(default=None)
+    owner: str = Field(default=None)
+    has_cls: bool = Field(default=None)
+    min_best_score: float = Field(default=None)
+    max_best_score: float = Field(default=None)
+    min_best_score_real: float = Field(default=None)
+    max_best_score_real: float = Field(default=None)
+
+
+class GeneratorFilter(GeneratorFilterBase):
+    """
+    Class for filtering the generator catalog. Extra keys of the generators'
+    metadata are matched by value, or by presence if the value is None.
+    """
+
+    extra: dict[str, Any] = Field(default=None)
+
+    @validator("extra")
+    def valid_extra(cls, extra: dict[str, Any]) -> dict[str, Any]:
+        for key, value in extra.items():
+            if value is not None and not isinstance(value, (str, int, float, list)):
+                raise ValueError(f"Value of {key} is not of allowed type.")
+            if isinstance(value, list):
+                if not all(isinstance(item, (str, int, float)) for item in value):
+                    raise ValueError(
+                        f"Items in the list of {key} are not of allowed type."
+                    )
+        return extra
+
+
+class GeneratorLookup(SGDEBaseModel):
+    """
+    Class for looking up many generators at once, by name and/or by filter.
+    """
+
+    names: list[str] = Field(default=None)
+    filter: GeneratorFilter = Field(default=None)
+
+    @root_validator(skip_on_failure=True)
+    def validate_lookup(cls, values):
+        if values.get("names") is None and values.get("filter") is None:
+            raise ValueError("Either names or filter must be given.")
+        return values
+
+
+class GenerationRequest(SGDEBaseModel):
+    """
+    Class for generating synthetic samples on the server. Samples are spread
+    evenly over the classes, unless the number of samples of each class is
+    given.
+    """
+
+    num_samples: int = Field(default=None, ge=1)
+    class_counts: list[int] = Field(default=None, min_items=1)
+    seed: int = Field(default=None, ge=0)
+    filter: bool = Field(default=True)
+
+    @validator("class_counts")
+    def valid_class_counts(cls, class_counts: list[int]) -> list[int]:
+        if any(count < 0 for count in class_counts) or not sum(class_counts):
+            raise ValueError("Class counts must be non-negative, and not all zero.")
+        return class_counts
+
+    @root_validator(skip_on_failure=True)
+    def validate_generation(cls, values):
+        num_samples, class_counts = values.get("num_samples"), values.get(
+            "class_counts"
+        )
+        if num_samples is None and class_counts is None:
+            raise ValueError("Either num_samples or class_counts must be given.")
+        if num_samples is not None and class_counts is not None:
+            if num_samples != sum(class_counts):
+                raise ValueError("num_samples must be the sum of class_counts.")
+        return values